@@ -1,10 +1,12 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 from .models import (
     TextbookSection, TextbookPage, TextbookSlide,
     RevisionQuestion, RevisionQuestionAttempt, RevisionQuestionAttemptDetail,
     WritingInteraction, UserSlideRead, UserSlideReadSession
 )
-from .models import StudyEngagementFact, ContentDimension
+from .models import StudyEngagementFact, ContentDimension, SyncState, Job, PayloadSnapshot, ModelVersion, EngagementPrediction
+from .models import StudentSectionEngagement, StudentSubjectEngagement, SectionEngagement, LatestWritingGrade
 
 @admin.register(StudyEngagementFact)
 class StudyEngagementFactAdmin(admin.ModelAdmin):
@@ -86,20 +88,47 @@ class RevisionQuestionAttemptDetailAdmin(admin.ModelAdmin):
         self.message_user(request, "Selected attempts have been marked as unprocessed.")
     mark_as_unprocessed.short_description = "Mark selected attempts as unprocessed"
 
+class WritingInteractionForm(forms.ModelForm):
+    # The text lives in WritingInteractionText; these edit it through the model's properties
+    user_input = forms.CharField(widget=forms.Textarea)
+    openai_response = forms.CharField(widget=forms.Textarea)
+
+    class Meta:
+        model = WritingInteraction
+        fields = ['user_id', 'page_id', 'user_input', 'openai_response', 'grade', 'timestamp', 'processed']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            for name in WritingInteraction.TEXT_FIELDS:
+                self.initial.setdefault(name, getattr(self.instance, name))
+
+    def save(self, commit=True):
+        for name in WritingInteraction.TEXT_FIELDS:
+            setattr(self.instance, name, self.cleaned_data[name])
+        return super().save(commit)
+
 @admin.register(WritingInteraction)
 class WritingInteractionAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user_id', 'page_id', 'timestamp')
+    form = WritingInteractionForm
+    list_display = ('id', 'user_id', 'page_id', 'timestamp', 'processed')
+    list_filter = ('processed',)
+    search_fields = ('user_id', 'page_id')
+
+@admin.register(LatestWritingGrade)
+class LatestWritingGradeAdmin(admin.ModelAdmin):
+    list_display = ('user_id', 'page_id', 'grade', 'timestamp', 'interaction')
     search_fields = ('user_id', 'page_id')
 
 @admin.register(UserSlideRead)
 class UserSlideReadAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'slide', 'slide_status')
-    list_filter = ('slide_status',)
+    list_display = ('id', 'user', 'slide', 'slide_status', 'processed')
+    list_filter = ('slide_status', 'processed')
 
 @admin.register(UserSlideReadSession)
 class UserSlideReadSessionAdmin(admin.ModelAdmin):
-    list_display = ('id', 'slide_read', 'formatted_expanded', 'formatted_collapsed', 'formatted_read')
-    list_filter = ('expanded', 'collapsed', 'read')
+    list_display = ('id', 'slide_read', 'formatted_expanded', 'formatted_collapsed', 'formatted_read', 'processed')
+    list_filter = ('expanded', 'collapsed', 'read', 'processed')
 
     def formatted_expanded(self, obj):
         return obj.expanded.strftime("%Y-%m-%d %H:%M:%S") if obj.expanded else "N/A"
@@ -111,4 +140,55 @@ class UserSlideReadSessionAdmin(admin.ModelAdmin):
 
     def formatted_read(self, obj):
         return obj.read.strftime("%Y-%m-%d %H:%M:%S") if obj.read else "N/A"
-    formatted_read.short_description = "Read (Full Time)"
\ No newline at end of file
+    formatted_read.short_description = "Read (Full Time)"
+
+@admin.register(SyncState)
+class SyncStateAdmin(admin.ModelAdmin):
+    list_display = ('entity', 'max_id', 'max_timestamp', 'last_synced')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'progress', 'created', 'finished')
+    list_filter = ('kind', 'status')
+
+@admin.register(PayloadSnapshot)
+class PayloadSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'size', 'compressed_size', 'fetched', 'imported')
+
+@admin.register(ModelVersion)
+class ModelVersionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'sha256', 'size', 'trained', 'active', 'activated')
+    list_filter = ('name', 'active')
+    readonly_fields = ('name', 'sha256', 'size', 'features', 'metrics', 'training_set_sha256', 'trained', 'active', 'activated')
+    actions = ['activate']
+
+    @admin.action(description="Activate selected version")
+    def activate(self, request, queryset):
+        from .registry import activate_version  # Keeps joblib and pandas out of admin start-up
+        if queryset.count() != 1:
+            self.message_user(request, "Select exactly one version to activate.", messages.ERROR)
+            return
+        version = activate_version(queryset.get())
+        self.message_user(request, f"{version} is now active.")
+
+@admin.register(EngagementPrediction)
+class EngagementPredictionAdmin(admin.ModelAdmin):
+    list_display = ('fact', 'score', 'label', 'model_version', 'predicted')
+    list_filter = ('label', 'model_version')
+    list_select_related = ('fact__student', 'fact__content_dim__page', 'model_version')
+
+@admin.register(StudentSectionEngagement)
+class StudentSectionEngagementAdmin(admin.ModelAdmin):
+    list_display = ('student', 'section', 'pages', 'total_slide_time', 'slides_opened_ratio', 'overall_accuracy', 'average_score')
+    list_filter = ('section',)
+    search_fields = ('student__username',)
+
+@admin.register(StudentSubjectEngagement)
+class StudentSubjectEngagementAdmin(admin.ModelAdmin):
+    list_display = ('student', 'subject', 'pages', 'total_slide_time', 'slides_opened_ratio', 'overall_accuracy', 'average_score')
+    list_filter = ('subject',)
+    search_fields = ('student__username',)
+
+@admin.register(SectionEngagement)
+class SectionEngagementAdmin(admin.ModelAdmin):
+    list_display = ('section', 'students', 'pages', 'total_slide_time', 'slides_opened_ratio', 'overall_accuracy', 'average_score')
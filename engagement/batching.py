@@ -0,0 +1,89 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .datasets import FEATURES
+logger = logging.getLogger(__name__)
+
+# Seconds a batch stays open for more requests after its first one
+BATCH_WINDOW = getattr(settings, "PREDICT_BATCH_WINDOW", 0.003)
+MAX_BATCH_ROWS = 4096
+# Seconds a caller waits for its batch to be predicted before giving up with a TimeoutError
+TIMEOUT = getattr(settings, "PREDICT_TIMEOUT", 10)
+
+class MicroBatcher:
+    """Merges predict calls that arrive within ``window`` seconds of each other into one call per model.
+
+    Callers block in predict() while a single background thread collects
+    the rows of every waiting request, predicts each model's rows in one
+    vectorized call and hands every caller its slice of the result.
+    """
+
+    def __init__(self, window=BATCH_WINDOW, max_rows=MAX_BATCH_ROWS, timeout=TIMEOUT):
+        self.window = window
+        self.max_rows = max_rows
+        self.timeout = timeout
+        self.stats = {"batches": 0, "requests": 0, "rows": 0}
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+
+    def predict(self, key, model, X):
+        """``model.predict(X)`` batched with other calls for the same ``key`` (the model version).
+
+        Raises what ``model.predict`` raised, or TimeoutError after ``timeout`` seconds.
+        """
+        future = Future()
+        self._requests().put((key, model, np.asarray(X, dtype=np.float64), future))
+        return future.result(timeout=self.timeout)
+
+    def _requests(self):
+        with self._lock:
+            # A forked worker inherits the queue but not the thread serving it
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                threading.Thread(target=self._serve, args=(self._queue,), daemon=True, name="predict-batcher").start()
+            return self._queue
+
+    def _serve(self, requests):
+        while True:
+            batch = [requests.get()]
+            rows = len(batch[0][2])
+            deadline = time.perf_counter() + self.window
+            while rows < self.max_rows:
+                try:
+                    batch.append(requests.get(timeout=max(0, deadline - time.perf_counter())))
+                except queue.Empty:
+                    break
+                rows += len(batch[-1][2])
+            self._predict(batch)
+
+    def _predict(self, batch):
+        by_key = {}
+        for request in batch:
+            by_key.setdefault(request[0], []).append(request)
+        for requests in by_key.values():
+            model = requests[0][1]
+            try:
+                X = pd.DataFrame(np.vstack([request[2] for request in requests]), columns=FEATURES)
+                scores = model.predict(X)
+            except Exception as e:
+                for request in requests:
+                    request[3].set_exception(e)
+                continue
+            offset = 0
+            for _, _, rows, future in requests:
+                future.set_result(scores[offset:offset + len(rows)])
+                offset += len(rows)
+            with self._lock:
+                self.stats["batches"] += 1
+                self.stats["requests"] += len(requests)
+                self.stats["rows"] += offset
+
+batcher = MicroBatcher()
@@ -0,0 +1,98 @@
+import numpy as np
+
+# NumPy only: serving a compiled model must not import scikit-learn
+LEVELS = 8  # Tree levels walked between dropping the entries that reached a leaf
+
+def compile_model(model):
+    """Flatten a fitted tree, forest or linear regressor into a dict of contiguous arrays.
+
+    The nodes of every tree are stored end to end, with children as
+    indices into the shared arrays and ``roots`` giving each tree's first
+    node.
+    """
+    features = getattr(model, "feature_names_in_", None)
+    arrays = {"features": np.asarray(features if features is not None else [], dtype=str)}
+    if hasattr(model, "coef_"):
+        return {**arrays, "kind": np.array("linear"),
+                "coef": np.ascontiguousarray(model.coef_, dtype=np.float64),
+                "intercept": np.asarray(model.intercept_, dtype=np.float64)}
+    if hasattr(model, "estimators_"):
+        kind, trees = "forest", [estimator.tree_ for estimator in model.estimators_]
+    elif hasattr(model, "tree_"):
+        kind, trees = "tree", [model.tree_]
+    else:
+        raise ValueError(f"Can't compile a {type(model).__name__}.")
+    if any(tree.n_outputs != 1 for tree in trees):
+        raise ValueError("Only single-output trees can be compiled.")
+    offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+    children = []
+    for offset, tree in zip(offsets, trees):
+        nodes = np.arange(tree.node_count)
+        leaf = tree.children_left < 0
+        # Right child then left, so a node's next node is children[2 * node + went_left]
+        pairs = np.stack([np.where(leaf, nodes, tree.children_right), np.where(leaf, nodes, tree.children_left)], axis=1)
+        children.append(pairs.ravel() + offset)
+    return {
+        **arrays,
+        "kind": np.array(kind),
+        "roots": offsets[:-1].astype(np.intp),
+        "children": np.concatenate(children).astype(np.intp),
+        "feature": np.concatenate([np.maximum(tree.feature, 0) for tree in trees]).astype(np.intp),
+        "threshold": np.concatenate([tree.threshold for tree in trees]).astype(np.float64),
+        "missing_left": np.concatenate([
+            getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=np.uint8)) for tree in trees
+        ]).astype(bool),
+        "value": np.concatenate([tree.value[:, 0, 0] for tree in trees]).astype(np.float64),
+    }
+
+def save_compiled(arrays, f):
+    np.savez(f, **arrays)
+
+def load_compiled(f):
+    with np.load(f, allow_pickle=False) as data:
+        return CompiledModel({name: data[name] for name in data.files})
+
+class CompiledModel:
+    """Predicts from compile_model's arrays exactly as the scikit-learn model would."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.kind = str(arrays["kind"])
+        self.features = arrays["features"].tolist()
+        if self.kind != "linear":
+            # Leaves are their own children, so stepping past one is harmless
+            self.leaf = arrays["children"][1::2] == np.arange(len(arrays["value"]))
+
+    def predict(self, X):
+        if hasattr(X, "columns") and self.features:
+            X = X[self.features]
+        a = self.arrays
+        if self.kind == "linear":
+            X = np.asarray(X, dtype=np.float64)
+            return X @ a["coef"] + a["intercept"]
+        # Trees compare float32 features with float64 thresholds, as scikit-learn does
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_trees = len(X), len(a["roots"])
+        missing = np.isnan(X).any()
+        children, feature, threshold = a["children"], a["feature"], a["threshold"]
+        # One entry per (tree, row), tree by tree, each stepped LEVELS nodes down at a time;
+        # entries that have reached a leaf are then dropped
+        nodes = np.repeat(a["roots"], n_rows)
+        entries = np.arange(len(nodes))
+        node, cell = nodes.copy(), np.tile(np.arange(n_rows) * X.shape[1], n_trees)
+        X = X.ravel()
+        while len(entries):
+            for _ in range(LEVELS):
+                x = X[cell + feature[node]]
+                went_left = x <= threshold[node]
+                if missing:
+                    went_left |= np.isnan(x) & a["missing_left"][node]
+                node = children[2 * node + went_left]
+            nodes[entries] = node
+            walking = ~self.leaf[node]
+            entries, node, cell = entries[walking], node[walking], cell[walking]
+        # Add the trees up one at a time, in order, so rounding matches the forest's own average
+        total = np.zeros(n_rows)
+        for values in a["value"][nodes].reshape(n_trees, n_rows):
+            total += values
+        return total / n_trees
@@ -0,0 +1,310 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+import django
+from django.db import connection, transaction
+from django.db.models import Count, Min, Sum
+from .models import (
+    TextbookPage, TextbookSlide,
+    RevisionQuestionAttempt, RevisionQuestionAttemptDetail,
+    UserSlideRead, UserSlideReadSession,
+    WritingInteraction,
+    LatestWritingGrade,
+    StudyEngagementFact, ContentDimension,
+    read_duration_expression,
+)
+from .ingest import refresh_latest_grades
+from .rollups import rebuild_rollups
+
+SUBJECT = "Software Engineering"
+SHARD_SIZE = 500  # Students per shard; keeps the id lists well under SQLite's parameter limit
+BATCH_SIZE = 500
+IN_CHUNK = 400  # Slide or page ids per query; with a shard's students this stays under SQLite's 999 variables
+FACT_METRICS = [
+    "total_slide_time", "slides_opened_ratio", "first_attempt_accuracy",
+    "overall_accuracy", "score", "total_slides",
+]
+# Models with a processed flag: (model, student lookup, page or slide lookup, looked up via a slide)
+CUBE_INPUTS = [
+    (UserSlideRead, "user_id", "slide_id", True),
+    (UserSlideReadSession, "slide_read__user_id", "slide_read__slide_id", True),
+    (RevisionQuestionAttempt, "user_id", "question__textbook_page_id", False),
+    (RevisionQuestionAttemptDetail, "attempt__user_id", "attempt__question__textbook_page_id", False),
+    (WritingInteraction, "user_id", "page_id", False),
+]
+
+def slide_pages():
+    # A slide counts towards the lowest-id page it is linked to, as slide.pages.first() did
+    return dict(
+        TextbookSlide.pages.through.objects
+        .values("textbookslide_id")
+        .annotate(page_id=Min("textbookpage_id"))
+        .values_list("textbookslide_id", "page_id")
+    )
+
+def _count_by(queryset, *keys):
+    rows = queryset.values(*keys).annotate(n=Count("id")).values_list(*keys, "n")
+    if len(keys) == 1:
+        return {row[0]: row[1] for row in rows}
+    return {row[:-1]: row[-1] for row in rows}
+
+def _content_dims(page_ids):
+    dims = {}
+    for dim in ContentDimension.objects.filter(subject=SUBJECT, page_id__in=page_ids).order_by("id"):
+        dims.setdefault(dim.page_id, dim)
+    missing = [ContentDimension(subject=SUBJECT, page_id=page_id) for page_id in page_ids if page_id not in dims]
+    if missing:
+        ContentDimension.objects.bulk_create(missing)
+        for dim in ContentDimension.objects.filter(subject=SUBJECT, page_id__in=page_ids).order_by("id"):
+            dims.setdefault(dim.page_id, dim)
+    # Mirror each page's sections onto its dimension (pages without sections keep what they have)
+    page_sections = defaultdict(list)
+    for page_id, section_id in TextbookPage.sections.through.objects.filter(
+        textbookpage_id__in=page_ids
+    ).values_list("textbookpage_id", "textbooksection_id"):
+        page_sections[page_id].append(section_id)
+    through = ContentDimension.sections.through
+    relinked = [dims[page_id].id for page_id in page_sections]
+    through.objects.filter(contentdimension_id__in=relinked).delete()
+    through.objects.bulk_create([
+        through(contentdimension_id=dims[page_id].id, textbooksection_id=section_id)
+        for page_id, section_ids in page_sections.items() for section_id in section_ids
+    ])
+    return dims
+
+def _shards(student_ids, workers, shard_size):
+    count = max(workers, -(-len(student_ids) // shard_size), 1)
+    size = -(-len(student_ids) // count) or 1
+    return [student_ids[start:start + size] for start in range(0, len(student_ids), size)]
+
+def shard_metrics(student_ids, slide_page, total_slides, page_ids=None):
+    """Compute the fact metrics of every (student, page) cell for one shard of students.
+
+    Runs in a worker process, so it only takes and returns plain data.
+    A cell needs slide reads on the page and a latest writing grade.
+    ``page_ids`` limits the cells to those pages.
+    """
+    if page_ids is None:
+        slide_chunks = page_chunks = [None]
+    else:
+        slide_ids = [slide_id for slide_id, page_id in slide_page.items() if page_id in page_ids]
+        slide_chunks = [slide_ids[start:start + IN_CHUNK] for start in range(0, len(slide_ids), IN_CHUNK)]
+        page_ids = sorted(page_ids)
+        page_chunks = [page_ids[start:start + IN_CHUNK] for start in range(0, len(page_ids), IN_CHUNK)]
+
+    # Slides and pages are disjoint between chunks, so their results just add up
+    slides_opened = defaultdict(set)
+    slide_time = defaultdict(int)
+    for slide_ids in slide_chunks:
+        reads = UserSlideRead.objects.filter(user_id__in=student_ids)
+        sessions = UserSlideReadSession.objects.filter(slide_read__user_id__in=student_ids)
+        if slide_ids is not None:
+            reads = reads.filter(slide_id__in=slide_ids)
+            sessions = sessions.filter(slide_read__slide_id__in=slide_ids)
+        for student_id, slide_id in reads.values_list("user_id", "slide_id").distinct():
+            if slide_id in slide_page:
+                slides_opened[student_id, slide_page[slide_id]].add(slide_id)
+        for student_id, slide_id, seconds in sessions.values(
+            "slide_read__user_id", "slide_read__slide_id"
+        ).annotate(seconds=Sum(read_duration_expression())).values_list(
+            "slide_read__user_id", "slide_read__slide_id", "seconds"
+        ):
+            if slide_id in slide_page:
+                slide_time[student_id, slide_page[slide_id]] += seconds
+    attempts, correct, latest_grade = {}, {}, {}
+    for pages in page_chunks:
+        page_attempts = RevisionQuestionAttempt.objects.filter(user_id__in=student_ids)
+        details = RevisionQuestionAttemptDetail.objects.filter(is_correct=True, attempt__user_id__in=student_ids)
+        grades = LatestWritingGrade.objects.filter(user_id__in=student_ids)
+        if pages is not None:
+            page_attempts = page_attempts.filter(question__textbook_page_id__in=pages)
+            details = details.filter(attempt__question__textbook_page_id__in=pages)
+            grades = grades.filter(page_id__in=pages)
+        attempts.update(_count_by(page_attempts, "user_id", "question__textbook_page_id"))
+        # Counted per correct detail row, as the old details__is_correct join did
+        correct.update(_count_by(details, "attempt__user_id", "attempt__question__textbook_page_id"))
+        latest_grade.update(
+            ((student_id, page_id), grade)
+            for student_id, page_id, grade in grades.values_list("user_id", "page_id", "grade")
+        )
+
+    cells = {}
+    for cell, opened in slides_opened.items():
+        if cell not in latest_grade:
+            continue
+        page_slides = total_slides.get(cell[1], 0)
+        cell_attempts = attempts.get(cell, 0)
+        accuracy = correct.get(cell, 0) / cell_attempts if cell_attempts > 0 else 0
+        cells[cell] = {
+            "total_slide_time": slide_time.get(cell, 0),
+            "slides_opened_ratio": len(opened) / page_slides if page_slides > 0 else 0,
+            "first_attempt_accuracy": accuracy,
+            "overall_accuracy": accuracy,
+            "score": latest_grade[cell],
+            "total_slides": page_slides,
+        }
+    return cells
+
+def _compute_cells(student_ids, workers, shard_size, progress):
+    slide_page = slide_pages()
+    total_slides = _count_by(TextbookSlide.pages.through.objects, "textbookpage_id")
+    shards = _shards(student_ids, workers, shard_size)
+    cells = {}
+    if workers <= 1 or len(shards) <= 1:
+        for done, shard in enumerate(shards):
+            if progress:
+                progress(0.8 * done / len(shards), f"Aggregating shard {done + 1} of {len(shards)}")
+            cells.update(shard_metrics(shard, slide_page, total_slides))
+        return cells
+    # Spawned, not forked: the parent may be a threaded job worker holding database connections
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), initializer=django.setup) as pool:
+        futures = [pool.submit(shard_metrics, shard, slide_page, total_slides) for shard in shards]
+        for done, future in enumerate(as_completed(futures)):
+            cells.update(future.result())
+            if progress:
+                progress(0.8 * (done + 1) / len(shards), f"Aggregated {done + 1} of {len(shards)} shards")
+    return cells
+
+def default_workers():
+    # An in-memory SQLite database (as in tests) is invisible to other processes
+    if connection.vendor == "sqlite" and connection.is_in_memory_db():
+        return 1
+    return os.cpu_count() or 1
+
+def build_olap_cube(progress=None, workers=None, shard_size=SHARD_SIZE):
+    """Rebuild StudyEngagementFact with one row per (student, page) cell.
+
+    Students who have read slides are split into shards whose metrics are
+    computed in parallel worker processes with a fixed number of grouped
+    queries each; the results are then merged into the fact table in one
+    transaction, and facts for cells that no longer qualify are removed.
+    The cube inputs that were unprocessed when the rebuild started are
+    flagged processed in that same transaction (see ``refresh_olap_cube``),
+    so a failed rebuild leaves them for the next refresh; so is any of them
+    that an import changed while the shards were being read. The roll-up
+    tables are rebuilt in that transaction too.
+    """
+    student_ids = sorted(UserSlideRead.objects.values_list("user_id", flat=True).distinct())
+    if not student_ids:
+        raise ValueError("No slide reads found for any student.")
+    workers = default_workers() if workers is None else workers
+    # Collected before the shards are read, so rows imported during the rebuild are left for the next refresh
+    inputs = {}
+    for model, *_ in CUBE_INPUTS:
+        rows = model.objects.filter(processed=False).values_list("id", *_input_fields(model))
+        inputs[model] = {row[0]: row[1:] for row in rows}
+    cells = _compute_cells(student_ids, workers, shard_size, progress)
+
+    if progress:
+        progress(0.8, "Writing facts")
+    with transaction.atomic():
+        counts = _write_facts(cells)
+        rebuild_rollups()
+        _flag_processed(inputs)
+    return {"students": len(student_ids), **counts}
+
+def _write_facts(cells, touched=None):
+    """Upsert the facts of ``cells`` and remove facts for cells that no longer qualify.
+
+    Without ``touched`` the cells are the whole cube; otherwise only facts
+    for the ``touched`` (student, page) cells are considered.
+    """
+    pages = {page_id for _, page_id in cells} | {page_id for _, page_id in touched or ()}
+    dims = _content_dims(sorted(pages))
+    facts = StudyEngagementFact.objects.order_by("id")
+    if touched is not None:
+        dim_pages = {dim.id: page_id for page_id, dim in dims.items()}
+        facts = facts.filter(
+            student_id__in={student_id for student_id, _ in touched}, content_dim_id__in=dim_pages,
+        )
+    existing = {}
+    for fact in facts:
+        if touched is None or (fact.student_id, dim_pages[fact.content_dim_id]) in touched:
+            existing.setdefault((fact.student_id, fact.content_dim_id), fact)
+    created, updated, kept = [], [], set()
+    for (student_id, page_id), metrics in cells.items():
+        fact = existing.get((student_id, dims[page_id].id))
+        if fact is None:
+            created.append(StudyEngagementFact(student_id=student_id, content_dim=dims[page_id], **metrics))
+            continue
+        for name, value in metrics.items():
+            setattr(fact, name, value)
+        updated.append(fact)
+        kept.add(fact.id)
+    stale = [fact.id for fact in existing.values() if fact.id not in kept]
+    for start in range(0, len(stale), BATCH_SIZE):
+        StudyEngagementFact.objects.filter(id__in=stale[start:start + BATCH_SIZE]).delete()
+    StudyEngagementFact.objects.bulk_create(created, batch_size=BATCH_SIZE)
+    StudyEngagementFact.objects.bulk_update(updated, FACT_METRICS, batch_size=BATCH_SIZE)
+    return {
+        "pages": len(dims),
+        "facts_created": len(created),
+        "facts_updated": len(updated),
+        "facts_removed": len(stale),
+    }
+
+def _input_fields(model):
+    return [field.attname for field in model._meta.concrete_fields if field.attname not in ("id", "processed")]
+
+def _unprocessed_inputs(slide_page):
+    """Snapshot the unprocessed cube inputs and collect the (student, page) cells each model's rows feed."""
+    touched, inputs = {}, {}
+    for model, student, target, via_slide in CUBE_INPUTS:
+        rows = model.objects.filter(processed=False)
+        inputs[model], touched[model] = {}, set()
+        for row_id, student_id, target_id, *values in rows.values_list(
+            "id", student, target, *_input_fields(model)
+        ).iterator(chunk_size=2000):
+            inputs[model][row_id] = tuple(values)
+            page_id = slide_page.get(target_id) if via_slide else target_id
+            if student_id is not None and page_id is not None:
+                touched[model].add((student_id, page_id))
+    return touched, inputs
+
+def _flag_processed(inputs):
+    """Flag the ``{model: {id: values}}`` rows processed, unless they no longer hold the values that were read."""
+    for model, snapshot in inputs.items():
+        row_ids = list(snapshot)
+        for start in range(0, len(row_ids), BATCH_SIZE):
+            rows = model.objects.filter(id__in=row_ids[start:start + BATCH_SIZE], processed=False)
+            model.objects.filter(id__in=[
+                row[0] for row in rows.values_list("id", *_input_fields(model)) if row[1:] == snapshot[row[0]]
+            ]).update(processed=True)
+
+def refresh_olap_cube(progress=None):
+    """Recompute only the facts fed by unprocessed rows and flag those rows processed.
+
+    Import resets the flag on every row it changes, so after a small import
+    only the few affected (student, page) cells are aggregated again. As in
+    ``build_olap_cube`` the cells are computed outside the transaction that
+    writes the facts and flags, so progress is visible while they are, and
+    a row changed in the meantime keeps its flag. Moving slides between
+    pages changes every student's cell and needs ``build_olap_cube``.
+    Roll-ups of the touched students and pages are refreshed with the facts.
+    """
+    if progress:
+        progress(0.0, "Collecting changed cube inputs")
+    slide_page = slide_pages()
+    touched_by, inputs = _unprocessed_inputs(slide_page)
+    # Import keeps the latest grades current; this also catches interactions edited outside it
+    with transaction.atomic():
+        refresh_latest_grades(touched_by[WritingInteraction])
+    touched = set().union(*touched_by.values())
+    if progress:
+        progress(0.1, f"Recomputing {len(touched)} cells")
+    student_ids = sorted({student_id for student_id, _ in touched})
+    page_ids = {page_id for _, page_id in touched}
+    total_slides = _count_by(
+        TextbookSlide.pages.through.objects.filter(textbookpage_id__in=page_ids), "textbookpage_id"
+    )
+    cells = {}
+    for shard in _shards(student_ids, 1, SHARD_SIZE):
+        cells.update(shard_metrics(shard, slide_page, total_slides, page_ids))
+    if progress:
+        progress(0.8, "Writing facts")
+    with transaction.atomic():
+        counts = _write_facts({cell: cells[cell] for cell in touched if cell in cells}, touched)
+        rebuild_rollups(student_ids, page_ids)
+        _flag_processed(inputs)
+    return {"cells": len(touched), "students": len(student_ids), **counts}
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .features import records
+from .models import StudyEngagementFact
+logger = logging.getLogger(__name__)
+
+DATASET_DIR = Path(settings.BASE_DIR) / "datasets"
+LEGACY_TRAINING_CSV = Path(settings.BASE_DIR) / "training_data.csv"
+ENGAGEMENT = "engagement"
+TRAINING = "training"
+MATRIX = "features.npy"
+FEATURES = [
+    "total_slide_time", "slides_opened_ratio", "first_attempt_accuracy",
+    "overall_accuracy", "recall_fluency", "total_slides",
+]
+TARGET = "score"
+# Stored column types; columns not listed are float64
+SCHEMA = {
+    "student_id": np.int64,
+    "page_id": np.int64,
+    "total_slide_time": np.int32,
+    "total_slides": np.int32,
+    "score": np.int16,
+}
+
+def dataset_path(name):
+    return DATASET_DIR / name
+
+def write_dataset(name, frame, matrix=None):
+    """Store ``frame`` as dataset ``name``: one typed ``.npy`` file per column and a schema.
+
+    ``matrix`` lists columns to store once more as a row-major float64
+    matrix for read_matrix(). The schema's ``sha256`` covers the column
+    files, so models can record which data they were trained on. The new dataset replaces the old one whole,
+    so readers never see a half-written one.
+    """
+    DATASET_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(tempfile.mkdtemp(dir=DATASET_DIR, suffix=".tmp"))
+    try:
+        columns = {}
+        for column in frame.columns:
+            dtype = np.dtype(SCHEMA.get(column, np.float64))
+            if dtype.kind == "i" and frame[column].isna().any():
+                raise ValueError(f"Column {column} has missing values and cannot be stored as {dtype}.")
+            values = frame[column].to_numpy(dtype=dtype)
+            np.save(tmp_path / f"{column}.npy", values)
+            columns[column] = values.dtype.str
+        if matrix:
+            np.save(tmp_path / MATRIX, np.ascontiguousarray(frame[matrix].to_numpy(dtype=np.float64)))
+        digest = hashlib.sha256()
+        for column in columns:
+            digest.update((tmp_path / f"{column}.npy").read_bytes())
+        schema = {"rows": len(frame), "columns": columns, "matrix": list(matrix or []), "sha256": digest.hexdigest()}
+        (tmp_path / "schema.json").write_text(json.dumps(schema))
+        path = dataset_path(name)
+        if path.exists():
+            old_path = Path(tempfile.mkdtemp(dir=DATASET_DIR, suffix=".old"))
+            os.replace(path, old_path)
+            os.replace(tmp_path, path)
+            shutil.rmtree(old_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    logger.info("Wrote %s dataset: %d rows", name, len(frame))
+    return schema
+
+def read_schema(name):
+    path = dataset_path(name) / "schema.json"
+    if not path.exists():
+        raise FileNotFoundError(f"No {name} dataset has been written yet.")
+    return json.loads(path.read_text())
+
+def read_dataset(name, columns=None):
+    """Dataset ``name`` as a DataFrame over the memory-mapped column files; nothing is copied."""
+    schema = read_schema(name)
+    columns = list(schema["columns"]) if columns is None else columns
+    path = dataset_path(name)
+    return pd.DataFrame(
+        {column: np.load(path / f"{column}.npy", mmap_mode="r") for column in columns}, copy=False,
+    )
+
+def read_matrix(name):
+    """The memory-mapped float64 matrix of dataset ``name`` and its column names."""
+    schema = read_schema(name)
+    if not schema["matrix"]:
+        raise ValueError(f"The {name} dataset has no feature matrix.")
+    return np.load(dataset_path(name) / MATRIX, mmap_mode="r"), schema["matrix"]
+
+def export_engagement():
+    """Write every StudyEngagementFact to the engagement dataset; returns the row count."""
+    columns = ["student_id", "page_id"] + FEATURES + [TARGET]
+    frame = records(
+        StudyEngagementFact.objects.order_by("id"),
+        ["student_id", "content_dim__page_id"] + FEATURES + [TARGET],
+        columns,
+    )
+    return write_dataset(ENGAGEMENT, frame)["rows"]
+
+def select_training_set():
+    """Write the features and target of the engagement dataset as the training dataset."""
+    return write_dataset(TRAINING, read_dataset(ENGAGEMENT, FEATURES + [TARGET]), matrix=FEATURES)["rows"]
+
+def load_training_set():
+    """``(X, y)`` for the trainers, both memory-mapped from the training dataset.
+
+    A training_data.csv left by the old CSV pipeline is converted once
+    when no training dataset exists yet.
+    """
+    if not dataset_path(TRAINING).exists() and LEGACY_TRAINING_CSV.exists():
+        logger.info("Converting %s to the training dataset", LEGACY_TRAINING_CSV)
+        write_dataset(TRAINING, pd.read_csv(LEGACY_TRAINING_CSV)[FEATURES + [TARGET]], matrix=FEATURES)
+    matrix, features = read_matrix(TRAINING)
+    X = pd.DataFrame(matrix, columns=features, copy=False)
+    y = read_dataset(TRAINING, [TARGET])[TARGET]
+    return X, y
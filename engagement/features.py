@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+from django.db import connection
+from .cube import slide_pages
+from .models import (
+    TextbookSlide, RevisionQuestionAttempt, RevisionQuestionAttemptDetail,
+    UserSlideRead, UserSlideReadSession, LatestWritingGrade,
+)
+
+KEYS = ["student_id", "page_id"]
+RECALL_WINDOW = np.timedelta64(120, "s")  # Slower correct answers are left out of recall fluency
+CHUNK_SIZE = 10000
+
+def records(queryset, columns, names):
+    """``queryset``'s ``columns`` as a DataFrame with the column ``names``, read in chunks."""
+    # Rows skip Django's per-value converters; timestamps are parsed a column at a time by _timestamps
+    sql, params = queryset.values_list(*columns).query.sql_with_params()
+    frames = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(CHUNK_SIZE):
+            frames.append(pd.DataFrame.from_records(rows, columns=names))
+    if not frames:
+        return pd.DataFrame(columns=names)
+    return pd.concat(frames, ignore_index=True)
+
+def _timestamps(values):
+    # SQLite hands back ISO strings and other backends aware datetimes; naive values are UTC either way
+    return pd.to_datetime(values, utc=True, format="ISO8601").astype("datetime64[ns, UTC]")
+
+def round4(values):
+    """Round to 4 decimals exactly as Python's round(x, 4) does, element-wise."""
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, 4)
+    # np.round scales by 10**4 first, which can tip values sitting on a rounding boundary the other way
+    scaled = values * 1e4
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    rounded[near_tie] = [round(value, 4) for value in values[near_tie].tolist()]
+    return rounded
+
+def scale_recall_fluency(seconds):
+    """Vectorized views.scale_recall_fluency; NaN stands in for None."""
+    seconds = np.asarray(seconds, dtype=float)
+    scaled = round4((1 - ((seconds - 5) / 55)) * 0.1)
+    scaled = np.where(seconds <= 5, 0.1, scaled)
+    return np.where(np.isnan(seconds) | (seconds > 60), 0.0, scaled)
+
+def scale_slide_time_with_slide_count(total_seconds, num_slides):
+    """Vectorized views.scale_slide_time_with_slide_count; NaN stands in for None."""
+    total_seconds = np.asarray(total_seconds, dtype=float)
+    num_slides = np.asarray(num_slides, dtype=float)
+    missing = np.isnan(total_seconds) | np.isnan(num_slides) | (num_slides == 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        seconds_per_slide = total_seconds / num_slides
+    min_time, max_time = 10, 180
+    scaled = round4(((seconds_per_slide - min_time) / (max_time - min_time)) * 0.2)
+    scaled = np.where(seconds_per_slide >= max_time, 0.2, scaled)
+    return np.where(missing | (seconds_per_slide <= min_time), 0.0, scaled)
+
+def attempt_frame(attempts=None):
+    """One row per attempt with its student, page, timestamps and whether it has any detail rows."""
+    attempts = RevisionQuestionAttempt.objects.all() if attempts is None else attempts
+    frame = records(
+        attempts, ["id", "user_id", "question__textbook_page_id", "viewed", "correct"],
+        ["attempt_id", "student_id", "page_id", "viewed", "correct"],
+    )
+    frame["viewed"] = _timestamps(frame["viewed"])
+    frame["correct"] = _timestamps(frame["correct"])
+    retried = RevisionQuestionAttemptDetail.objects.values_list("attempt_id", flat=True).distinct()
+    frame["has_detail"] = frame["attempt_id"].isin(np.fromiter(retried, dtype=np.int64))
+    return frame
+
+def attempt_metrics(attempts):
+    """Accuracy and recall metrics per (student, page) from an attempt_frame.
+
+    Matches calculate_first_attempt_accuracy, calculate_overall_accuracy and
+    calculate_recall_fluency applied to each cell's attempts.
+    """
+    answered = attempts["correct"].notna()
+    first_try = answered & ~attempts["has_detail"]
+    response = attempts["correct"] - attempts["viewed"]
+    recalled = first_try & attempts["viewed"].notna() & (response <= RECALL_WINDOW)
+    columns = pd.DataFrame({
+        "student_id": attempts["student_id"],
+        "page_id": attempts["page_id"],
+        "first_try": first_try,
+        "answered": answered,
+        # Averaged in microseconds and rounded back to whole ones, as the database Avg over a duration is
+        "recall_us": (response / np.timedelta64(1, "us")).where(recalled),
+    })
+    grouped = columns.groupby(KEYS)
+    attempted = grouped.size()
+    metrics = pd.DataFrame({
+        "total_questions_attempted": attempted,
+        "first_attempt_accuracy": grouped["first_try"].sum() / attempted,
+        "overall_accuracy": grouped["answered"].sum() / attempted,
+        "recall_fluency": (np.round(grouped["recall_us"].mean()) / 1e6).fillna(0),
+    })
+    return metrics
+
+def _on_pages(frame, slide_page):
+    # Slides linked to no page don't count anywhere
+    frame["page_id"] = frame.pop("slide_id").map(slide_page)
+    frame = frame.dropna(subset=["page_id"])
+    return frame.astype({"page_id": np.int64})
+
+def slide_metrics(student_ids=None):
+    """Slide time and slides opened per (student, page), as the cube counts them."""
+    slide_page = slide_pages()
+    reads = UserSlideRead.objects.all()
+    sessions = UserSlideReadSession.objects.with_read_duration()
+    if student_ids is not None:
+        reads = reads.filter(user_id__in=student_ids)
+        sessions = sessions.filter(slide_read__user_id__in=student_ids)
+    opened = records(reads, ["user_id", "slide_id"], ["student_id", "slide_id"])
+    opened["opened"] = opened["slide_id"]
+    times = records(
+        sessions, ["slide_read__user_id", "slide_read__slide_id", "duration"], ["student_id", "slide_id", "duration"],
+    )
+    metrics = pd.DataFrame({
+        "slides_opened": _on_pages(opened, slide_page).groupby(KEYS)["opened"].nunique(),
+        "total_slide_time": _on_pages(times, slide_page).groupby(KEYS)["duration"].sum(),
+    })
+    metrics = metrics.dropna(subset=["slides_opened"])
+    return metrics.fillna({"total_slide_time": 0}).astype(np.int64)
+
+def latest_grades():
+    grades = records(
+        LatestWritingGrade.objects.all(), ["user_id", "page_id", "grade"], ["student_id", "page_id", "score"],
+    )
+    return grades.set_index(KEYS)["score"]
+
+def fact_frame(attempts=None):
+    """Every (student, page) cell with slide reads and a graded writing interaction, as one DataFrame.
+
+    ``total_slide_time``, ``slides_opened_ratio``, ``total_slides`` and
+    ``score`` hold the cube's StudyEngagementFact values. The attempt
+    metrics follow the calculate_* definitions instead, which the cube
+    doesn't use, so they are named ``calculated_first_attempt_accuracy``,
+    ``calculated_overall_accuracy`` and ``calculated_recall_fluency``;
+    they are taken over ``attempts`` (every attempt by default) and are
+    zero for cells without attempts. ``slide_time_score`` and
+    ``recall_fluency_score`` are the scaled slide time and recall.
+    """
+    frame = slide_metrics().join(latest_grades(), how="inner")
+    total_slides = pd.Series(
+        TextbookSlide.pages.through.objects.values_list("textbookpage_id", flat=True)
+    ).value_counts()
+    frame["total_slides"] = frame.index.get_level_values("page_id").map(total_slides).fillna(0).astype(np.int64)
+    frame["slides_opened_ratio"] = (frame["slides_opened"] / frame["total_slides"].replace(0, np.nan)).fillna(0.0)
+    calculated = attempt_metrics(attempt_frame(attempts)).rename(columns={
+        name: f"calculated_{name}" for name in ["first_attempt_accuracy", "overall_accuracy", "recall_fluency"]
+    })
+    frame = frame.join(calculated, how="left")
+    columns = ["calculated_first_attempt_accuracy", "calculated_overall_accuracy", "calculated_recall_fluency"]
+    frame[columns] = frame[columns].fillna(0)
+    frame["total_questions_attempted"] = frame["total_questions_attempted"].fillna(0).astype(np.int64)
+    frame["slide_time_score"] = scale_slide_time_with_slide_count(frame["total_slide_time"], frame["total_slides"])
+    frame["recall_fluency_score"] = scale_recall_fluency(frame["calculated_recall_fluency"])
+    frame["score"] = frame["score"].astype(np.int64)
+    return frame.drop(columns="slides_opened").reset_index()
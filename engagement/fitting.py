@@ -0,0 +1,53 @@
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.tree import DecisionTreeRegressor
+
+# No Django imports here: pool workers are spawned and unpickle fit() by importing this module alone
+ESTIMATORS = {
+    "forest": lambda: RandomForestRegressor(n_estimators=100, random_state=42),
+    "linear": LinearRegression,
+    "tree": lambda: DecisionTreeRegressor(max_depth=4, random_state=42),
+}
+
+def summary(name, model, features):
+    if name == "forest":
+        return {"importances": dict(zip(features, model.feature_importances_.round(4).tolist()))}
+    if name == "linear":
+        return {"coefficients": dict(zip(features, model.coef_.round(4).tolist())), "intercept": float(model.intercept_)}
+    return {"depth": int(model.get_depth()), "leaves": int(model.get_n_leaves())}
+
+def fit(name, matrix_path, target_path, features, train_index, test_index, artifact):
+    """Fit estimator ``name`` on the training rows of the stored matrix and save it to ``artifact``.
+
+    The matrix and target are memory-mapped, so every worker shares the
+    same pages instead of receiving its own pickled copy, and the model is
+    written by the worker rather than sent back. Returns the test metrics.
+    """
+    X = np.load(matrix_path, mmap_mode="r")
+    y = np.load(target_path, mmap_mode="r")
+    X_train = pd.DataFrame(X[train_index], columns=features)
+    X_test = pd.DataFrame(X[test_index], columns=features)
+    start = time.perf_counter()
+    model = ESTIMATORS[name]()
+    model.fit(X_train, y[train_index])
+    fit_seconds = time.perf_counter() - start
+    y_pred = model.predict(X_test)
+    joblib.dump(model, artifact)
+    return {
+        "mse": float(mean_squared_error(y[test_index], y_pred)),
+        "r2": float(r2_score(y[test_index], y_pred)),
+        "fit_seconds": round(fit_seconds, 3),
+        **summary(name, model, features),
+    }
+
+def fold_error(name, params, X, y, features, train_index, test_index):
+    """Test MSE of estimator ``name`` with ``params`` on one cross-validation fold."""
+    model = ESTIMATORS[name]().set_params(**params)
+    model.fit(pd.DataFrame(X[train_index], columns=features), y[train_index])
+    y_pred = model.predict(pd.DataFrame(X[test_index], columns=features))
+    return float(mean_squared_error(y[test_index], y_pred))
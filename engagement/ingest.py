@@ -0,0 +1,467 @@
+import json
+import logging
+import tempfile
+from datetime import timedelta
+from itertools import islice
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from .models import (
+    TextbookSection, TextbookPage, TextbookSlide,
+    RevisionQuestion, RevisionQuestionAttempt, RevisionQuestionAttemptDetail,
+    UserSlideRead, UserSlideReadSession,
+    WritingInteraction, WritingInteractionText, LatestWritingGrade,
+)
+from .json_stream import iter_arrays
+from .sync import WATERMARK_FIELDS, parse_timestamp, record_timestamp, save_watermarks
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+# Entities in dependency order: every entity only references ids from the ones before it.
+ENTITY_ORDER = (
+    "sections", "pages", "slides",
+    "user_slide_reads", "user_slide_sessions",
+    "questions", "attempts", "attempt_details",
+    "writing_interactions",
+)
+
+def clean_grade(raw):
+    try:
+        return int(float(raw))  # handles "1", 1.0, "1.0"
+    except (TypeError, ValueError):
+        return None
+
+def _chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def refresh_latest_grades(keys, batch_size=BATCH_SIZE):
+    """Recompute LatestWritingGrade for the given (user_id, page_id) keys.
+
+    Reads only the indexed graded rows of those keys, never the text columns.
+    Keys left without a graded interaction lose their row.
+    """
+    for chunk in _chunks(set(keys), batch_size):
+        chunk = set(chunk)
+        users = {user_id for user_id, _ in chunk}
+        pages = {page_id for _, page_id in chunk}
+        latest = {}
+        graded = WritingInteraction.objects.filter(
+            grade__isnull=False, user_id__in=users, page_id__in=pages,
+        ).order_by("user_id", "page_id", "-timestamp", "-id")
+        for interaction_id, user_id, page_id, grade, timestamp in graded.values_list(
+            "id", "user_id", "page_id", "grade", "timestamp"
+        ):
+            if (user_id, page_id) in chunk and (user_id, page_id) not in latest:
+                latest[user_id, page_id] = LatestWritingGrade(
+                    user_id=user_id, page_id=page_id, grade=grade, timestamp=timestamp, interaction_id=interaction_id,
+                )
+        current = LatestWritingGrade.objects.filter(user_id__in=users, page_id__in=pages)
+        LatestWritingGrade.objects.filter(id__in=[
+            row_id for row_id, user_id, page_id in current.values_list("id", "user_id", "page_id")
+            if (user_id, page_id) in chunk
+        ]).delete()
+        # An interaction moved to another user or page no longer stands for its old key
+        LatestWritingGrade.objects.filter(
+            interaction_id__in=[row.interaction_id for row in latest.values()]
+        ).delete()
+        LatestWritingGrade.objects.bulk_create(latest.values(), batch_size=batch_size)
+
+def _field_values(obj, fields):
+    # The values as the database returns them, so a record can be compared with its stored row
+    return tuple(
+        parse_timestamp(getattr(obj, field.attname)) if isinstance(field, models.DateTimeField)
+        else field.to_python(getattr(obj, field.attname))
+        for field in fields
+    )
+
+class TextbookIngestor:
+    """Upserts textbook API records with a few bulk statements per entity.
+
+    Ids are resolved from in-memory sets of what has been written so far
+    (falling back to the database), so ``ingest`` can be called repeatedly
+    with batches of the same entity. When ``watermarks`` are given, rows of
+    WATERMARK_FIELDS entities at or below them are counted as unchanged and
+    not written. ``high_water`` only moves past rows that were written: it is
+    held below any row skipped for a missing parent, so the next
+    incremental sync asks for that row again. Rows identical to the stored
+    ones are counted as unchanged and not written either. Every row of a
+    cube input that is written is flagged as unprocessed again, so
+    ``refresh_olap_cube`` picks it up.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, watermarks=None):
+        self.batch_size = batch_size
+        self.watermarks = watermarks or {}
+        self.high_water = {}
+        self.held = {}  # entity -> (id, timestamp) the watermark must stay below, from skipped rows
+        self.stats = {
+            entity: {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+            for entity in ("users",) + ENTITY_ORDER
+        }
+        self.user_ids = set()
+        self.section_ids = set()
+        self.page_ids = set()
+        self.slide_ids = set()
+        self.slide_read_ids = set()
+        self.question_ids = set()
+        self.attempt_ids = set()
+
+    def ingest(self, entity, records):
+        handler = getattr(self, f"_ingest_{entity}", None)
+        if entity not in ENTITY_ORDER or handler is None:
+            raise ValueError(f"Unknown entity: {entity}")
+        records = list(records)
+        if entity in WATERMARK_FIELDS:
+            records = self._after_watermark(entity, records)
+        if records:
+            handler(records)
+
+    # Helpers
+
+    def _skip(self, entity, record):
+        self.stats[entity]["skipped"] += 1
+        if entity in WATERMARK_FIELDS:
+            held_id, held_timestamp = self.held.get(entity, (record["id"], None))
+            stamp = record_timestamp(entity, record)
+            if stamp and (held_timestamp is None or stamp < held_timestamp):
+                held_timestamp = stamp
+            self.held[entity] = (min(held_id, record["id"]), held_timestamp)
+
+    def safe_high_water(self):
+        """The high-water marks that are safe to save: below every skipped row."""
+        marks = {}
+        for entity, (seen_id, seen_timestamp) in self.high_water.items():
+            held_id, held_timestamp = self.held.get(entity, (None, None))
+            if held_id is not None:
+                seen_id = min(seen_id, held_id - 1)
+            if held_timestamp and seen_timestamp and seen_timestamp >= held_timestamp:
+                seen_timestamp = held_timestamp - timedelta(microseconds=1)
+            marks[entity] = (seen_id, seen_timestamp)
+        return marks
+
+    def _after_watermark(self, entity, records):
+        max_id, max_timestamp = self.watermarks.get(entity, (0, None))
+        seen_id, seen_timestamp = self.high_water.get(entity, (max_id, max_timestamp))
+        fresh, stale = [], []
+        for r in records:
+            stamp = record_timestamp(entity, r)
+            seen_id = max(seen_id, r["id"])
+            if stamp and (seen_timestamp is None or stamp > seen_timestamp):
+                seen_timestamp = stamp
+            if r["id"] > max_id or (stamp and (max_timestamp is None or stamp > max_timestamp)):
+                fresh.append(r)
+            else:
+                stale.append(r)
+        self.high_water[entity] = (seen_id, seen_timestamp)
+        if entity == "writing_interactions" and stale:
+            # Grades are assigned after the interaction is stamped, so pick up newly graded rows too
+            fresh += self._newly_graded(stale)
+        self.stats[entity]["unchanged"] += len(records) - len(fresh)
+        return fresh
+
+    def _newly_graded(self, records):
+        graded = {r["id"]: r for r in records if clean_grade(r.get("grade")) is not None}
+        ungraded = set()
+        for chunk in _chunks(graded, self.batch_size):
+            ungraded.update(WritingInteraction.objects.filter(
+                id__in=chunk, grade__isnull=True,
+            ).values_list("id", flat=True))
+        return [graded[interaction_id] for interaction_id in ungraded]
+
+    def _resolve(self, model, ids, known):
+        # References to rows outside this payload (e.g. older rows in an incremental sync) are checked in the database
+        missing = set(ids) - known - {None}
+        if missing:
+            known |= self._existing_ids(model, missing)
+        return known
+
+    def _existing_ids(self, model, ids):
+        found = set()
+        for chunk in _chunks(ids, self.batch_size):
+            found.update(model.objects.filter(id__in=chunk).values_list("id", flat=True))
+        return found
+
+    def _stored_values(self, model, ids, fields):
+        stored = {}
+        for chunk in _chunks(ids, self.batch_size):
+            for row in model.objects.filter(id__in=chunk).values_list("id", *[field.attname for field in fields]):
+                stored[row[0]] = row[1:]
+        return stored
+
+    def _upsert(self, entity, model, objs, update_fields):
+        by_id = {obj.id: obj for obj in objs}  # last occurrence wins, as with sequential update_or_create
+        if not by_id:
+            return set()
+        # Unchanged rows keep their processed flag; full-sync entities are sent again on every import
+        fields = [model._meta.get_field(name) for name in update_fields if name != "processed"]
+        stored = self._stored_values(model, by_id, fields)
+        changed = [obj for obj_id, obj in by_id.items() if stored.get(obj_id) != _field_values(obj, fields)]
+        model.objects.bulk_create(
+            changed,
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=update_fields,
+        )
+        updated = sum(obj.id in stored for obj in changed)
+        self.stats[entity]["updated"] += updated
+        self.stats[entity]["inserted"] += len(changed) - updated
+        self.stats[entity]["unchanged"] += len(by_id) - len(changed)
+        return set(by_id)
+
+    def _replace_links(self, m2m_field, links):
+        # Same result as calling .set() on every owner, but with one delete and one insert per chunk.
+        if not links:
+            return
+        through = m2m_field.through
+        owner = f"{m2m_field.field.m2m_field_name()}_id"
+        target = f"{m2m_field.field.m2m_reverse_field_name()}_id"
+        for chunk in _chunks(links, self.batch_size):
+            through.objects.filter(**{f"{owner}__in": chunk}).delete()
+        through.objects.bulk_create(
+            [through(**{owner: owner_id, target: target_id})
+             for owner_id, target_ids in links.items() for target_id in target_ids],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def _ensure_users(self, ids):
+        missing = set(ids) - self.user_ids
+        if not missing:
+            return
+        created = missing - self._existing_ids(User, missing)
+        User.objects.bulk_create(
+            [User(id=user_id, username=f"user_{user_id}") for user_id in sorted(created)],
+            batch_size=self.batch_size,
+        )
+        self.stats["users"]["inserted"] += len(created)
+        self.user_ids |= missing
+
+    def _known_users(self, ids):
+        return set(ids) & self._resolve(User, ids, self.user_ids)
+
+    def _linked(self, owner_label, owner_id, target_label, target_ids, known):
+        linked = []
+        for target_id in dict.fromkeys(target_ids):
+            if target_id in known:
+                linked.append(target_id)
+            else:
+                logger.warning("%s ID %s not found for %s ID %s", target_label, target_id, owner_label, owner_id)
+        return linked
+
+    # Entities
+
+    def _ingest_sections(self, records):
+        self.section_ids |= self._upsert(
+            "sections", TextbookSection,
+            [TextbookSection(id=r["id"], section_title=r["section_title"]) for r in records],
+            ["section_title"],
+        )
+
+    def _ingest_pages(self, records):
+        self.page_ids |= self._upsert(
+            "pages", TextbookPage,
+            [TextbookPage(id=r["id"], page_title=r["page_title"]) for r in records],
+            ["page_title"],
+        )
+        self._resolve(TextbookSection, {s for r in records for s in r.get("sections", [])}, self.section_ids)
+        links = {}
+        for r in records:
+            if "sections" in r:  # Only relink when the API provides section links
+                linked = self._linked("Page", r["id"], "Section", r["sections"], self.section_ids)
+                if linked:
+                    links[r["id"]] = linked
+        self._replace_links(TextbookPage.sections, links)
+
+    def _ingest_slides(self, records):
+        self.slide_ids |= self._upsert(
+            "slides", TextbookSlide,
+            [TextbookSlide(id=r["id"], slide_title=r["slide_title"]) for r in records],
+            ["slide_title"],
+        )
+        self._resolve(TextbookPage, {p for r in records for p in r.get("pages", [])}, self.page_ids)
+        links = {}
+        for r in records:
+            if "pages" in r:
+                linked = self._linked("Slide", r["id"], "Page", r["pages"], self.page_ids)
+                if linked:
+                    links[r["id"]] = linked
+        self._replace_links(TextbookSlide.pages, links)
+
+    def _ingest_user_slide_reads(self, records):
+        self._ensure_users({r["user"] for r in records})
+        self._resolve(TextbookSlide, {r["slide"] for r in records}, self.slide_ids)
+        objs = []
+        for r in records:
+            if r["slide"] not in self.slide_ids:
+                self._skip("user_slide_reads", r)
+                continue
+            objs.append(UserSlideRead(
+                id=r["id"], user_id=r["user"], slide_id=r["slide"], slide_status=r["slide_status"],
+            ))
+        self.slide_read_ids |= self._upsert(
+            "user_slide_reads", UserSlideRead, objs, ["user", "slide", "slide_status", "processed"],
+        )
+
+    def _ingest_user_slide_sessions(self, records):
+        self._resolve(UserSlideRead, {r["slide_read"] for r in records}, self.slide_read_ids)
+        objs = []
+        for r in records:
+            if r["slide_read"] not in self.slide_read_ids:
+                self._skip("user_slide_sessions", r)
+                continue
+            objs.append(UserSlideReadSession(
+                id=r["id"], slide_read_id=r["slide_read"],
+                expanded=r["expanded"], collapsed=r["collapsed"], read=r["read"],
+            ))
+        self._upsert(
+            "user_slide_sessions", UserSlideReadSession, objs,
+            ["slide_read", "expanded", "collapsed", "read", "processed"],
+        )
+
+    def _ingest_questions(self, records):
+        self._resolve(TextbookPage, {r.get("textbook_page") for r in records}, self.page_ids)
+        objs = []
+        for r in records:
+            if r.get("textbook_page") not in self.page_ids:
+                self._skip("questions", r)
+                continue
+            objs.append(RevisionQuestion(id=r["id"], textbook_page_id=r["textbook_page"]))
+        self.question_ids |= self._upsert("questions", RevisionQuestion, objs, ["textbook_page"])
+
+    def _ingest_attempts(self, records):
+        self._ensure_users({r["user"] for r in records})
+        self._resolve(RevisionQuestion, {r.get("question") for r in records}, self.question_ids)
+        objs = []
+        for r in records:
+            if r.get("question") not in self.question_ids:
+                self._skip("attempts", r)
+                continue
+            objs.append(RevisionQuestionAttempt(
+                id=r["id"], user_id=r["user"], question_id=r["question"],
+                viewed=r["viewed"], correct=r["correct"],
+            ))
+        self.attempt_ids |= self._upsert(
+            "attempts", RevisionQuestionAttempt, objs, ["user", "question", "viewed", "correct", "processed"],
+        )
+
+    def _ingest_attempt_details(self, records):
+        self._resolve(RevisionQuestionAttempt, {r.get("attempt") for r in records}, self.attempt_ids)
+        objs = []
+        for r in records:
+            if r.get("attempt") not in self.attempt_ids:
+                self._skip("attempt_details", r)
+                continue
+            objs.append(RevisionQuestionAttemptDetail(
+                id=r["id"], attempt_id=r["attempt"],
+                is_correct=r["is_correct"], timestamp=r["timestamp"],
+            ))
+        self._upsert(
+            "attempt_details", RevisionQuestionAttemptDetail, objs,
+            ["attempt", "is_correct", "timestamp", "processed"],
+        )
+
+    def _ingest_writing_interactions(self, records):
+        known = self._known_users({r["user_id"] for r in records})
+        objs, texts = [], {}
+        for r in records:
+            if r["user_id"] not in known:
+                self._skip("writing_interactions", r)
+                continue
+            objs.append(WritingInteraction(
+                id=r["id"], user_id=r["user_id"], page_id=r["page_id"],
+                grade=clean_grade(r.get("grade")), timestamp=r["timestamp"],
+            ))
+            texts[r["id"]] = WritingInteractionText.pack(r["id"], r["user_input"], r["openai_response"])
+        # Keys these interactions stood for before the update may lose their latest grade
+        keys = set(LatestWritingGrade.objects.filter(
+            interaction_id__in=[obj.id for obj in objs]
+        ).values_list("user_id", "page_id"))
+        self._upsert(
+            "writing_interactions", WritingInteraction, objs,
+            ["user_id", "page_id", "grade", "timestamp", "processed"],
+        )
+        WritingInteractionText.objects.bulk_create(
+            list(texts.values()),
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=["interaction"],
+            update_fields=WritingInteractionText.DATA_FIELDS,
+        )
+        refresh_latest_grades(keys | {(obj.user_id, obj.page_id) for obj in objs}, self.batch_size)
+
+def _spool(records):
+    spool = tempfile.TemporaryFile("w+", encoding="utf-8")
+    for record in records:
+        spool.write(json.dumps(record, default=str) + "\n")
+    return spool
+
+def _unspool(spool):
+    spool.seek(0)
+    for line in spool:
+        yield json.loads(line)
+
+def ingest_pages(pages, batch_size=BATCH_SIZE, watermarks=None, progress=None):
+    """Import one or more pages of ``(entity, records)`` pairs in a single transaction.
+
+    Records are written in batches of at most ``batch_size``, so a page can be
+    a lazily parsed stream. An array is applied as it arrives once every
+    entity before it in ENTITY_ORDER has been; one that arrives earlier is
+    spooled to a temporary file and applied as soon as they have, or at the
+    end, in ENTITY_ORDER, if some never arrive. ``progress(fraction,
+    message)`` is called as each entity starts.
+    """
+    ingestor = TextbookIngestor(batch_size, watermarks)
+    applied, spooled = set(), {}
+
+    def ready(entity):
+        return applied.issuperset(ENTITY_ORDER[:ENTITY_ORDER.index(entity)])
+
+    def apply(entity, records):
+        if progress:
+            progress(ENTITY_ORDER.index(entity) / len(ENTITY_ORDER), f"Importing {entity}")
+        for batch in _batched(records, batch_size):
+            ingestor.ingest(entity, batch)
+        applied.add(entity)
+
+    def apply_spooled(force=False):
+        for entity in ENTITY_ORDER:
+            if entity in spooled and (force or ready(entity)):
+                for spool in spooled.pop(entity):
+                    with spool:
+                        apply(entity, _unspool(spool))
+
+    try:
+        with transaction.atomic():
+            for page in pages:
+                for entity, records in page:
+                    if entity not in ENTITY_ORDER:
+                        continue
+                    if ready(entity) and entity not in spooled:
+                        apply(entity, records)
+                    else:
+                        logger.info("'%s' arrived before the entities it references; applying it after them", entity)
+                        spooled.setdefault(entity, []).append(_spool(records))
+                    apply_spooled()
+            apply_spooled(force=True)
+            save_watermarks(ingestor.safe_high_water())
+    finally:
+        for spools in spooled.values():
+            for spool in spools:
+                spool.close()
+    return ingestor.stats
+
+def ingest_payload(data, batch_size=BATCH_SIZE, watermarks=None, progress=None):
+    page = [(entity, data.get(entity, [])) for entity in ENTITY_ORDER]
+    return ingest_pages([page], batch_size, watermarks, progress)
+
+def ingest_stream(chunks, batch_size=BATCH_SIZE, watermarks=None):
+    # Memory use does not depend on the size of the payload, only on batch_size
+    return ingest_pages([iter_arrays(chunks)], batch_size, watermarks)
@@ -0,0 +1,76 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection, transaction
+from django.utils.timezone import now
+from .models import Job
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+PROCESS_STARTED = now()
+
+def worker_count():
+    # SQLite only allows one writer at a time, so jobs queue up behind each other there
+    return 1 if connection.vendor == "sqlite" else 4
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            fail_interrupted_jobs()
+            _executor = ThreadPoolExecutor(max_workers=worker_count(), thread_name_prefix="engagement-job")
+        return _executor
+
+def fail_interrupted_jobs():
+    """Mark jobs left queued or running by an earlier server process as failed.
+
+    Jobs only run in the process that queued them, and their arguments are
+    never stored, so nothing else will ever finish them.
+    """
+    interrupted = Job.objects.filter(status__in=[Job.QUEUED, Job.RUNNING], created__lt=PROCESS_STARTED)
+    count = interrupted.update(
+        status=Job.FAILED, message="Interrupted: the server stopped before the job finished.", finished=now(),
+    )
+    if count:
+        logger.warning("Marked %s interrupted jobs as failed", count)
+    return count
+
+def submit_job(kind, func, *args, **kwargs):
+    """Record a queued Job and run ``func(*args, job=job, **kwargs)`` on the worker pool.
+
+    Arguments stay in memory (session tokens are never written to the job
+    table) and the job is only handed to a worker once the row is committed.
+    """
+    job = Job.objects.create(kind=kind)
+    transaction.on_commit(lambda: get_executor().submit(_run_in_worker, job.id, func, args, kwargs))
+    return job
+
+def run_job(job_id, func, args=(), kwargs=None):
+    job = Job.objects.get(id=job_id)
+    job.status = Job.RUNNING
+    job.started = now()
+    job.save(update_fields=["status", "started"])
+    try:
+        job.result = func(*args, job=job, **(kwargs or {}))
+        job.status = Job.SUCCEEDED
+        job.progress = 1.0
+        job.finished = now()
+        with transaction.atomic():  # A failed save mustn't break a transaction the job runs in
+            job.save()
+    except Exception as e:
+        # Includes a result that can't be stored: the job must not be left running
+        logger.exception("Job %s (%s) failed", job.id, job.kind)
+        job.refresh_from_db(fields=["progress"])  # As last reported, not the 1.0 of a save that failed
+        job.status = Job.FAILED
+        job.message = str(e)
+        job.result = None
+        job.finished = now()
+        job.save(update_fields=["status", "message", "result", "finished"])
+    return job
+
+def _run_in_worker(job_id, func, args, kwargs):
+    try:
+        run_job(job_id, func, args, kwargs)
+    finally:
+        connection.close()  # Worker threads get their own connection; don't leak it
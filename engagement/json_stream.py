@@ -0,0 +1,117 @@
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+DELIMITERS = WHITESPACE + ",]}:"
+
+class JSONStream:
+    """Incremental reader over an iterable of byte (or str) chunks.
+
+    Only the text of the value currently being decoded is kept in memory, so
+    arbitrarily large documents can be walked element by element.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            chunk = self.utf8.decode(b"", final=True)
+        elif isinstance(chunk, bytes):
+            chunk = self.utf8.decode(chunk)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _skip_ws(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return
+
+    def peek(self):
+        self._skip_ws()
+        return self.buf[self.pos] if self.pos < len(self.buf) else ""
+
+    def consume(self, char):
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, char):
+        if not self.consume(char):
+            found = self.peek() or "end of input"
+            raise ValueError(f"Expected {char!r} in JSON stream, found {found!r}")
+
+    def _buffer_scalar(self):
+        # Numbers and literals have no closing bracket, so read on until a delimiter is buffered.
+        start = self.pos
+        while not any(char in DELIMITERS for char in self.buf[start:]):
+            start = len(self.buf) - self.pos
+            if not self._fill():
+                return
+            start += self.pos
+
+    def read_value(self):
+        if self.peek() not in '{["':
+            self._buffer_scalar()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        self.expect("[")
+        if self.consume("]"):
+            return
+        while True:
+            yield self.read_value()
+            if self.consume(","):
+                continue
+            self.expect("]")
+            return
+
+def iter_arrays(chunks, meta=None):
+    """Yield ``(key, records)`` for every top-level array of a JSON object.
+
+    ``records`` is a generator sharing the underlying stream, so it has to be
+    consumed before the next key is requested; anything left unread is skipped.
+    Top-level values that are not arrays are stored in ``meta`` if given.
+    """
+    stream = JSONStream(chunks)
+    stream.expect("{")
+    if stream.consume("}"):
+        return
+    while True:
+        key = stream.read_value()
+        stream.expect(":")
+        if stream.peek() == "[":
+            records = stream.iter_array()
+            yield key, records
+            for _ in records:
+                pass
+        else:
+            value = stream.read_value()
+            if meta is not None:
+                meta[key] = value
+        if stream.consume(","):
+            continue
+        stream.expect("}")
+        return
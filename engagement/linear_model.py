@@ -1,26 +1,21 @@
-import pandas as pd
 from sklearn.linear_model import LinearRegression
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score
-import joblib
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import os
+from .datasets import FEATURES, TRAINING, load_training_set, read_schema
+from .registry import register_model
 
 
 def train_linear_model():
     # Step 1: Load the training data
-    df = pd.read_csv("training_data.csv")
-    print("Dataset shape:", df.shape)
+    X, y = load_training_set()
+    print("Dataset shape:", X.shape)
 
     # Step 2: Select features and target
-    features = [
-        "total_slide_time", "slides_opened_ratio", "first_attempt_accuracy",
-        "overall_accuracy", "recall_fluency", "total_slides"
-    ]
-    target = "score"
-
-    X = df[features]
-    y = df[target]
+    features = FEATURES
 
     # Step 3: Split the data
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -43,9 +38,11 @@ def train_linear_model():
         print(f"  {name}: {coef:.4f}")
     print(f"Intercept: {model.intercept_:.2f}")
 
-    # Step 7: Save model to disk
-    joblib.dump(model, "linear_model.joblib")
-    print("Model saved as linear_model.joblib")
+    # Step 7: Register the model and make it the active one
+    version = register_model(
+        "linear", model, metrics={"mse": mse, "r2": r2}, training_set_sha256=read_schema(TRAINING).get("sha256", ""),
+    )
+    print(f"Model registered as {version}")
 
     # Step 8: Generate and save plots
     plot_linear_visuals(X, y, model, features, model.predict(X))
@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.urls import reverse
+from engagement.batching import BATCH_WINDOW, batcher
+from engagement.datasets import FEATURES
+
+# Latency targets for single-row requests from 16 clients sharing one CPU with the server
+P50_TARGET_MS = 100
+P99_TARGET_MS = 250
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+class LoadTestServer(ThreadedWSGIServer):
+    # runserver's backlog of 10 resets connections once more clients than that connect at once
+    request_queue_size = 128
+
+def random_instance(rng):
+    values = [rng.uniform(0, 600), rng.random(), rng.random(), rng.random(), rng.uniform(5, 60), 10.0]
+    return dict(zip(FEATURES, values))
+
+class Command(BaseCommand):
+    help = (
+        "Load-test POST /engagement/predict/ with concurrent single-row clients, with the batcher on, off or both, "
+        f"and fail unless p50 and p99 latency meet the targets (default {P50_TARGET_MS} and {P99_TARGET_MS} ms)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=16)
+        parser.add_argument("--requests", type=int, default=800, help="Requests per run, split across the clients.")
+        parser.add_argument("--batching", choices=["on", "off", "both"], default="both")
+        parser.add_argument("--model", default="forest")
+        parser.add_argument("--p50", type=float, default=P50_TARGET_MS, help="p50 target in ms.")
+        parser.add_argument("--p99", type=float, default=P99_TARGET_MS, help="p99 target in ms.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        server = LoadTestServer(("127.0.0.1", 0), QuietHandler)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}{reverse('engagement:predict_api')}"
+        modes = ["off", "on"] if options["batching"] == "both" else [options["batching"]]
+        window = batcher.window
+        missed = []
+        try:
+            for mode in modes:
+                batcher.window = BATCH_WINDOW if mode == "on" else 0
+                p50, p99, rps = self.run(url, options)
+                self.stdout.write(
+                    f"clients={options['clients']} batching={mode} requests={options['requests']} "
+                    f"p50={p50:.1f}ms p99={p99:.1f}ms rps={rps:.0f}"
+                )
+                if p50 > options["p50"]:
+                    missed.append(f"batching {mode}: p50 {p50:.1f}ms > {options['p50']:g}ms")
+                if p99 > options["p99"]:
+                    missed.append(f"batching {mode}: p99 {p99:.1f}ms > {options['p99']:g}ms")
+        finally:
+            batcher.window = window
+            server.shutdown()
+            server.server_close()
+        if missed:
+            raise CommandError("Missed latency targets: " + "; ".join(missed))
+        self.stdout.write(self.style.SUCCESS("All latency targets met."))
+
+    def run(self, url, options):
+        rng = np.random.default_rng(options["seed"])
+        clients = options["clients"]
+        per_client = max(1, options["requests"] // clients)
+        bodies = [
+            [{"model": options["model"], "instances": [random_instance(rng)]} for _ in range(per_client)]
+            for _ in range(clients)
+        ]
+
+        def post(body):
+            request = urllib.request.Request(url, json.dumps(body).encode(), {"Content-Type": "application/json"})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+            except urllib.error.HTTPError as e:
+                raise CommandError(f"{url} answered {e.code}: {e.read().decode()}")
+            return time.perf_counter() - start
+
+        # Warm up: the first request loads the model
+        for body in bodies[0][:20]:
+            post(body)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(clients) as pool:
+            latencies = np.concatenate(list(pool.map(lambda client: [post(body) for body in client], bodies))) * 1000
+        wall = time.perf_counter() - start
+        return np.percentile(latencies, 50), np.percentile(latencies, 99), len(latencies) / wall
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0002_contentdimension_studyengagementfact'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='writinginteraction',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0003_writinginteraction_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=50, unique=True)),
+                ('max_id', models.BigIntegerField(default=0)),
+                ('max_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('last_synced', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
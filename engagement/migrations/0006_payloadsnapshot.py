@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0005_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayloadSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('compressed_size', models.BigIntegerField(default=0)),
+                ('meta', models.JSONField(blank=True, default=dict)),
+                ('fetched', models.DateTimeField(auto_now_add=True)),
+                ('imported', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0006_payloadsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userslideread',
+            name='processed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='userslidereadsession',
+            name='processed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='writinginteraction',
+            name='processed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
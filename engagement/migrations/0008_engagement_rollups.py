@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0007_cube_processed_flags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SectionEngagement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pages', models.IntegerField(default=0)),
+                ('total_slides', models.IntegerField(default=0)),
+                ('total_slide_time', models.IntegerField(default=0)),
+                ('slides_opened_ratio', models.FloatField(default=0.0)),
+                ('first_attempt_accuracy', models.FloatField(default=0.0)),
+                ('overall_accuracy', models.FloatField(default=0.0)),
+                ('recall_fluency', models.FloatField(default=0.0)),
+                ('average_score', models.FloatField(default=0.0)),
+                ('students', models.IntegerField(default=0)),
+                ('section', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='engagement.textbooksection')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentSectionEngagement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pages', models.IntegerField(default=0)),
+                ('total_slides', models.IntegerField(default=0)),
+                ('total_slide_time', models.IntegerField(default=0)),
+                ('slides_opened_ratio', models.FloatField(default=0.0)),
+                ('first_attempt_accuracy', models.FloatField(default=0.0)),
+                ('overall_accuracy', models.FloatField(default=0.0)),
+                ('recall_fluency', models.FloatField(default=0.0)),
+                ('average_score', models.FloatField(default=0.0)),
+                ('section', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='engagement.textbooksection')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('student', 'section')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentSubjectEngagement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pages', models.IntegerField(default=0)),
+                ('total_slides', models.IntegerField(default=0)),
+                ('total_slide_time', models.IntegerField(default=0)),
+                ('slides_opened_ratio', models.FloatField(default=0.0)),
+                ('first_attempt_accuracy', models.FloatField(default=0.0)),
+                ('overall_accuracy', models.FloatField(default=0.0)),
+                ('recall_fluency', models.FloatField(default=0.0)),
+                ('average_score', models.FloatField(default=0.0)),
+                ('subject', models.CharField(max_length=200)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('student', 'subject')},
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0008_engagement_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contentdimension',
+            index=models.Index(fields=['subject', 'page'], name='contentdim_subject_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['kind', 'status'], name='job_kind_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['-created'], name='job_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='revisionquestionattempt',
+            index=models.Index(condition=models.Q(('processed', False)), fields=['question'], name='attempt_unprocessed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='revisionquestionattemptdetail',
+            index=models.Index(condition=models.Q(('processed', False)), fields=['attempt'], name='detail_unprocessed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userslideread',
+            index=models.Index(condition=models.Q(('processed', False)), fields=['user'], name='slideread_unprocessed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userslidereadsession',
+            index=models.Index(condition=models.Q(('processed', False)), fields=['slide_read'], name='session_unprocessed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='writinginteraction',
+            index=models.Index(condition=models.Q(('grade__isnull', False)), fields=['user_id', 'page_id', '-timestamp'], name='writing_latest_grade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='writinginteraction',
+            index=models.Index(condition=models.Q(('processed', False)), fields=['user_id'], name='writing_unprocessed_idx'),
+        ),
+    ]
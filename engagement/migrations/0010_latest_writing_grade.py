@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_latest_grades(apps, schema_editor):
+    WritingInteraction = apps.get_model('engagement', 'WritingInteraction')
+    LatestWritingGrade = apps.get_model('engagement', 'LatestWritingGrade')
+    latest = {}
+    graded = WritingInteraction.objects.filter(grade__isnull=False).order_by('user_id', 'page_id', '-timestamp', '-id')
+    for interaction_id, user_id, page_id, grade, timestamp in graded.values_list(
+        'id', 'user_id', 'page_id', 'grade', 'timestamp'
+    ).iterator(chunk_size=2000):
+        if user_id is not None:
+            latest.setdefault((user_id, page_id), LatestWritingGrade(
+                user_id=user_id, page_id=page_id, grade=grade, timestamp=timestamp, interaction_id=interaction_id,
+            ))
+    LatestWritingGrade.objects.bulk_create(latest.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0009_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestWritingGrade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('page_id', models.IntegerField()),
+                ('grade', models.IntegerField()),
+                ('timestamp', models.DateTimeField()),
+                ('interaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='latest_grade_for', to='engagement.writinginteraction')),
+            ],
+            options={
+                'unique_together': {('user_id', 'page_id')},
+            },
+        ),
+        migrations.RunPython(backfill_latest_grades, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:37
+
+import zlib
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def pack_text(text):
+    # Frozen copy of engagement.models.pack_text
+    data = (text or '').encode()
+    if getattr(settings, 'WRITING_TEXT_COMPRESSION', True):
+        packed = zlib.compress(data)
+        if len(packed) < len(data):
+            return b'z' + packed
+    return b't' + data
+
+
+def unpack_text(blob):
+    blob = bytes(blob)
+    return zlib.decompress(blob[1:]).decode() if blob[:1] == b'z' else blob[1:].decode()
+
+
+def move_text_out(apps, schema_editor):
+    WritingInteraction = apps.get_model('engagement', 'WritingInteraction')
+    WritingInteractionText = apps.get_model('engagement', 'WritingInteractionText')
+    batch = []
+    rows = WritingInteraction.objects.order_by('id').values_list('id', 'user_input', 'openai_response')
+    for interaction_id, user_input, openai_response in rows.iterator(chunk_size=500):
+        batch.append(WritingInteractionText(
+            interaction_id=interaction_id,
+            user_input_data=pack_text(user_input),
+            openai_response_data=pack_text(openai_response),
+        ))
+        if len(batch) == 500:
+            WritingInteractionText.objects.bulk_create(batch)
+            batch = []
+    WritingInteractionText.objects.bulk_create(batch)
+
+
+def move_text_back(apps, schema_editor):
+    WritingInteraction = apps.get_model('engagement', 'WritingInteraction')
+    WritingInteractionText = apps.get_model('engagement', 'WritingInteractionText')
+    for text in WritingInteractionText.objects.iterator(chunk_size=500):
+        WritingInteraction.objects.filter(id=text.interaction_id).update(
+            user_input=unpack_text(text.user_input_data),
+            openai_response=unpack_text(text.openai_response_data),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0010_latest_writing_grade'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WritingInteractionText',
+            fields=[
+                ('interaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text', serialize=False, to='engagement.writinginteraction')),
+                ('user_input_data', models.BinaryField()),
+                ('openai_response_data', models.BinaryField()),
+            ],
+        ),
+        migrations.RunPython(move_text_out, move_text_back),
+        # Defaults so that, migrating back, the columns can be re-added to existing rows before the text is copied in
+        migrations.AlterField(
+            model_name='writinginteraction',
+            name='openai_response',
+            field=models.TextField(default=''),
+        ),
+        migrations.AlterField(
+            model_name='writinginteraction',
+            name='user_input',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='writinginteraction',
+            name='openai_response',
+        ),
+        migrations.RemoveField(
+            model_name='writinginteraction',
+            name='user_input',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0012_job_train_all'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('import', 'Import Data'), ('populate_cube', 'Populate OLAP Cube'), ('train_forest', 'Train Random Forest'), ('train_tree', 'Train Decision Tree'), ('train_linear', 'Train Linear Regression'), ('train_all', 'Train All Models'), ('tune', 'Tune Hyperparameters')], max_length=20),
+        ),
+    ]
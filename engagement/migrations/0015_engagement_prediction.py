@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engagement', '0014_model_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('import', 'Import Data'), ('populate_cube', 'Populate OLAP Cube'), ('train_forest', 'Train Random Forest'), ('train_tree', 'Train Decision Tree'), ('train_linear', 'Train Linear Regression'), ('train_all', 'Train All Models'), ('tune', 'Tune Hyperparameters'), ('score', 'Score Engagement Facts')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='EngagementPrediction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('label', models.CharField(max_length=20)),
+                ('predicted', models.DateTimeField()),
+                ('fact', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='prediction', to='engagement.studyengagementfact')),
+                ('model_version', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='engagement.modelversion')),
+            ],
+        ),
+    ]
@@ -1,4 +1,8 @@
+import zlib
+from django.conf import settings
 from django.db import models
+from django.db.models import ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Coalesce, Greatest, Least
 from django.contrib.auth.models import User
 from django.utils.timezone import now
 import logging
@@ -9,6 +13,8 @@ class ContentDimension(models.Model):
     subject = models.CharField(max_length=200)
     page = models.ForeignKey('TextbookPage', on_delete=models.CASCADE, related_name='content_pages')
     sections = models.ManyToManyField('TextbookSection', related_name='content_sections')  # Add sections
+    class Meta:
+        indexes = [models.Index(fields=['subject', 'page'], name='contentdim_subject_page_idx')]
     def __str__(self):
         section_titles = ", ".join([section.section_title for section in self.sections.all()])
         return f"{self.subject} - {self.page.page_title} (Sections: {section_titles})"
@@ -31,6 +37,42 @@ class StudyEngagementFact(models.Model):
     def __str__(self):
         return f"{self.student.username} - Page {self.content_dim.page}"
 
+# Roll-ups of the fact table, rebuilt from it whenever the cube changes.
+# Slide time and slide counts are summed; ratios are weighted by total_slides.
+class EngagementRollup(models.Model):
+    pages = models.IntegerField(default=0)  # Fact rows rolled up
+    total_slides = models.IntegerField(default=0)
+    total_slide_time = models.IntegerField(default=0)  # Viewing time in seconds
+    slides_opened_ratio = models.FloatField(default=0.0)
+    first_attempt_accuracy = models.FloatField(default=0.0)
+    overall_accuracy = models.FloatField(default=0.0)
+    recall_fluency = models.FloatField(default=0.0)
+    average_score = models.FloatField(default=0.0)  # Mean of the page scores
+    class Meta:
+        abstract = True
+
+class StudentSectionEngagement(EngagementRollup):
+    student = models.ForeignKey(User, on_delete=models.CASCADE)
+    section = models.ForeignKey('TextbookSection', on_delete=models.CASCADE)
+    class Meta:
+        unique_together = ('student', 'section')
+    def __str__(self):
+        return f"{self.student.username} - {self.section}"
+
+class StudentSubjectEngagement(EngagementRollup):
+    student = models.ForeignKey(User, on_delete=models.CASCADE)
+    subject = models.CharField(max_length=200)
+    class Meta:
+        unique_together = ('student', 'subject')
+    def __str__(self):
+        return f"{self.student.username} - {self.subject}"
+
+class SectionEngagement(EngagementRollup):
+    section = models.OneToOneField('TextbookSection', on_delete=models.CASCADE)
+    students = models.IntegerField(default=0)
+    def __str__(self):
+        return f"{self.section} ({self.students} students)"
+
 # Textbook Structure Models
 class TextbookSection(models.Model):
     section_title = models.CharField(max_length=200)
@@ -59,6 +101,10 @@ class RevisionQuestionAttempt(models.Model):
     viewed = models.DateTimeField(null=True, blank=True)  # Timestamp when the user first viewed the question
     correct = models.DateTimeField(null=True, blank=True)  # Timestamp when the correct answer was submitted
     processed = models.BooleanField(default=False) # Flag to mark processed attempts
+    class Meta:
+        indexes = [
+            models.Index(fields=['question'], condition=Q(processed=False), name='attempt_unprocessed_idx'),
+        ]
     def __str__(self):
         return f"Attempt by {self.user.username} on Question {self.question}"
 class RevisionQuestionAttemptDetail(models.Model):
@@ -66,21 +112,137 @@ class RevisionQuestionAttemptDetail(models.Model):
     is_correct = models.BooleanField()  
     timestamp = models.DateTimeField(default=now)  # Timestamp when the answer was submitted
     processed = models.BooleanField(default=False)  # Flag to mark processed incorrect attempts
+    class Meta:
+        indexes = [
+            models.Index(fields=['attempt'], condition=Q(processed=False), name='detail_unprocessed_idx'),
+        ]
     def __str__(self):
         result = "Correct" if self.is_correct else "Incorrect"
         return f"{result} at {self.timestamp}"
 
 # Writing Interaction Model
 class WritingInteraction(models.Model):
+    """A graded piece of writing; the essay and feedback text live in WritingInteractionText.
+
+    ``user_input`` and ``openai_response`` read and write that side row, which
+    is only loaded when one of them is accessed (or with select_related("text")).
+    """
+    TEXT_FIELDS = ('user_input', 'openai_response')
     user_id = models.IntegerField(null=True, blank=True)
     page_id = models.IntegerField()
-    user_input = models.TextField()
-    openai_response = models.TextField()
     grade = models.IntegerField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=now)  # Set from the textbook API on import
+    processed = models.BooleanField(default=False)  # Flag to mark interactions folded into the cube
+    class Meta:
+        indexes = [
+            # Latest graded interaction per (user, page)
+            models.Index(
+                fields=['user_id', 'page_id', '-timestamp'], condition=Q(grade__isnull=False),
+                name='writing_latest_grade_idx',
+            ),
+            models.Index(fields=['user_id'], condition=Q(processed=False), name='writing_unprocessed_idx'),
+        ]
     def __str__(self):
         return f"Interaction - Page {self.page_id}"
 
+    def _get_text(self, name):
+        pending = self.__dict__.get('_pending_text', {})
+        if name in pending:
+            return pending[name]
+        if self.pk is None:
+            return ''
+        try:
+            return getattr(self.text, name)
+        except WritingInteractionText.DoesNotExist:
+            return ''
+
+    def _set_text(self, name, value):
+        self.__dict__.setdefault('_pending_text', {})[name] = value
+
+    @property
+    def user_input(self):
+        return self._get_text('user_input')
+
+    @user_input.setter
+    def user_input(self, value):
+        self._set_text('user_input', value)
+
+    @property
+    def openai_response(self):
+        return self._get_text('openai_response')
+
+    @openai_response.setter
+    def openai_response(self, value):
+        self._set_text('openai_response', value)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        pending = self.__dict__.pop('_pending_text', None)
+        if pending:
+            texts = {name: pending.get(name, self._get_text(name)) for name in self.TEXT_FIELDS}
+            WritingInteractionText.objects.bulk_create(
+                [WritingInteractionText.pack(self.pk, **texts)],
+                update_conflicts=True, unique_fields=['interaction'], update_fields=WritingInteractionText.DATA_FIELDS,
+            )
+            self._state.fields_cache.pop('text', None)
+
+TEXT_PLAIN = b't'
+TEXT_ZLIB = b'z'
+
+def pack_text(text, compress=None):
+    """Encode text for storage, zlib-compressed when WRITING_TEXT_COMPRESSION is on and it saves space."""
+    data = (text or '').encode()
+    if compress is None:
+        compress = getattr(settings, 'WRITING_TEXT_COMPRESSION', True)
+    if compress:
+        packed = zlib.compress(data)
+        if len(packed) < len(data):
+            return TEXT_ZLIB + packed
+    return TEXT_PLAIN + data
+
+def unpack_text(blob):
+    blob = bytes(blob)
+    if blob[:1] == TEXT_ZLIB:
+        return zlib.decompress(blob[1:]).decode()
+    return blob[1:].decode()
+
+class WritingInteractionText(models.Model):
+    DATA_FIELDS = ['user_input_data', 'openai_response_data']
+    interaction = models.OneToOneField(WritingInteraction, on_delete=models.CASCADE, primary_key=True, related_name='text')
+    user_input_data = models.BinaryField()  # pack_text output: a one-byte format marker, then the text
+    openai_response_data = models.BinaryField()
+
+    @classmethod
+    def pack(cls, interaction_id, user_input, openai_response):
+        return cls(
+            interaction_id=interaction_id,
+            user_input_data=pack_text(user_input),
+            openai_response_data=pack_text(openai_response),
+        )
+
+    @property
+    def user_input(self):
+        return unpack_text(self.user_input_data)
+
+    @property
+    def openai_response(self):
+        return unpack_text(self.openai_response_data)
+
+    def __str__(self):
+        return f"Text of interaction {self.interaction_id}"
+
+# Latest graded writing per (user, page): the cube's score target, kept current at import
+class LatestWritingGrade(models.Model):
+    user_id = models.IntegerField()
+    page_id = models.IntegerField()
+    grade = models.IntegerField()
+    timestamp = models.DateTimeField()
+    interaction = models.OneToOneField(WritingInteraction, on_delete=models.CASCADE, related_name='latest_grade_for')
+    class Meta:
+        unique_together = ('user_id', 'page_id')
+    def __str__(self):
+        return f"User {self.user_id} - Page {self.page_id}: {self.grade}"
+
 # Tracking User Engagement with Slides
 class UserSlideRead(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -90,16 +252,57 @@ class UserSlideRead(models.Model):
         choices=[('read', 'Read'), ('unread', 'Unread'), ('revise', 'Revise')],
         default='unread'
     )
+    processed = models.BooleanField(default=False)  # Flag to mark reads folded into the cube
     class Meta:
         unique_together = ('user', 'slide')
+        indexes = [
+            models.Index(fields=['user'], condition=Q(processed=False), name='slideread_unprocessed_idx'),
+        ]
     def __str__(self):
         return f'{self.user.username} - {self.slide.slide_title} - Status:{self.slide_status}'
 
+class DurationSeconds(models.Func):
+    """Whole seconds of a duration expression, truncated like int(timedelta.total_seconds())."""
+    template = "FLOOR(EXTRACT(EPOCH FROM %(expressions)s))"
+    output_field = models.IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite durations are integer microseconds, and integer division truncates
+        return self.as_sql(compiler, connection, template="(%(expressions)s / 1000000)", **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="(%(expressions)s DIV 1000000)", **extra_context)
+
+def read_duration_expression(prefix="", cap=None):
+    """SQL version of UserSlideReadSession.read_duration, optionally capped at ``cap`` seconds.
+
+    ``prefix`` is the lookup path to the session, e.g. "review_sessions__"
+    when aggregating over UserSlideRead.
+    """
+    end = Coalesce(F(f"{prefix}read"), F(f"{prefix}collapsed"))
+    seconds = Greatest(
+        DurationSeconds(ExpressionWrapper(end - F(f"{prefix}expanded"), output_field=models.DurationField())),
+        Value(0),
+    )
+    if cap is not None:
+        seconds = Least(seconds, Value(cap))
+    return Coalesce(seconds, Value(0), output_field=models.IntegerField())
+
+class UserSlideReadSessionQuerySet(models.QuerySet):
+    def with_read_duration(self, cap=None):
+        return self.annotate(duration=read_duration_expression(cap=cap))
+
 class UserSlideReadSession(models.Model):
     slide_read = models.ForeignKey('UserSlideRead', on_delete=models.CASCADE, related_name='review_sessions')
     expanded = models.DateTimeField(default=now)
     collapsed = models.DateTimeField(null=True, blank=True)
     read = models.DateTimeField(null=True, blank=True)
+    processed = models.BooleanField(default=False)  # Flag to mark sessions folded into the cube
+    objects = UserSlideReadSessionQuerySet.as_manager()
+    class Meta:
+        indexes = [
+            models.Index(fields=['slide_read'], condition=Q(processed=False), name='session_unprocessed_idx'),
+        ]
     def read_duration(self):
         if self.expanded:
             if self.read:
@@ -113,4 +316,111 @@ class UserSlideReadSession(models.Model):
                 return total_seconds
             else:
                 return 0
-        return 0  
\ No newline at end of file
+        return 0  
+
+# Incremental Sync State: high-water marks for each imported entity
+class SyncState(models.Model):
+    entity = models.CharField(max_length=50, unique=True)
+    max_id = models.BigIntegerField(default=0)
+    max_timestamp = models.DateTimeField(null=True, blank=True)
+    last_synced = models.DateTimeField(auto_now=True)
+    def __str__(self):
+        return f"{self.entity} - up to ID {self.max_id}"
+
+# Background Jobs: import, cube population and training run outside the request cycle
+class Job(models.Model):
+    IMPORT = 'import'
+    POPULATE_CUBE = 'populate_cube'
+    TRAIN_FOREST = 'train_forest'
+    TRAIN_TREE = 'train_tree'
+    TRAIN_LINEAR = 'train_linear'
+    TRAIN_ALL = 'train_all'
+    TUNE = 'tune'
+    SCORE = 'score'
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    kind = models.CharField(
+        max_length=20,
+        choices=[
+            (IMPORT, 'Import Data'), (POPULATE_CUBE, 'Populate OLAP Cube'),
+            (TRAIN_FOREST, 'Train Random Forest'), (TRAIN_TREE, 'Train Decision Tree'),
+            (TRAIN_LINEAR, 'Train Linear Regression'), (TRAIN_ALL, 'Train All Models'),
+            (TUNE, 'Tune Hyperparameters'), (SCORE, 'Score Engagement Facts'),
+        ]
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=[(QUEUED, 'Queued'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')],
+        default=QUEUED
+    )
+    progress = models.FloatField(default=0.0)  # Fraction of the job completed, 0 to 1
+    message = models.TextField(blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'status'], name='job_kind_status_idx'),
+            models.Index(fields=['-created'], name='job_created_idx'),
+        ]
+    def report(self, progress, message=''):
+        self.progress = progress
+        self.message = message
+        Job.objects.filter(id=self.id).update(progress=progress, message=message)
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "message": self.message,
+            "result": self.result,
+            "created": self.created.isoformat() if self.created else None,
+            "started": self.started.isoformat() if self.started else None,
+            "finished": self.finished.isoformat() if self.finished else None,
+        }
+    def __str__(self):
+        return f"Job {self.id} - {self.get_kind_display()} ({self.status})"
+
+# Raw Payload Snapshots: compressed copies of fetched API pages, keyed by content hash
+class PayloadSnapshot(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField(default=0)  # Uncompressed bytes
+    compressed_size = models.BigIntegerField(default=0)
+    meta = models.JSONField(default=dict, blank=True)  # Top-level values that are not arrays, e.g. total_pages
+    fetched = models.DateTimeField(auto_now_add=True)
+    imported = models.DateTimeField(null=True, blank=True)
+    def __str__(self):
+        return f"Snapshot {self.sha256[:12]} ({self.size} bytes)"
+
+# Model Registry: trained model files keyed by content hash; one active version per model name
+class ModelVersion(models.Model):
+    name = models.CharField(max_length=20)  # "forest", "linear" or "tree"
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField(default=0)
+    features = models.JSONField(default=list)
+    metrics = models.JSONField(default=dict, blank=True)
+    training_set_sha256 = models.CharField(max_length=64, blank=True, default='')
+    trained = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    active = models.BooleanField(default=False)
+    activated = models.DateTimeField(null=True, blank=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name'], condition=Q(active=True), name='one_active_model_version'),
+        ]
+    def __str__(self):
+        return f"{self.name} {self.sha256[:12]}{' (active)' if self.active else ''}"
+
+# Batch Predictions: the active model's score for every fact, so dashboards don't call the model
+class EngagementPrediction(models.Model):
+    fact = models.OneToOneField(StudyEngagementFact, on_delete=models.CASCADE, related_name='prediction')
+    model_version = models.ForeignKey(ModelVersion, on_delete=models.PROTECT)
+    score = models.FloatField()
+    label = models.CharField(max_length=20)
+    predicted = models.DateTimeField()
+    def __str__(self):
+        return f"{self.fact}: {self.score} ({self.label})"
@@ -1,21 +1,19 @@
-import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import joblib
 import os
+from .datasets import FEATURES, load_training_set
+from .registry import load_model
 
 def plot_linear_relationships():
-    df = pd.read_csv("training_data.csv")
-    model = joblib.load("linear_model.joblib")
-    features = [
-        "total_slide_time", "slides_opened_ratio", "first_attempt_accuracy",
-        "overall_accuracy", "recall_fluency", "total_slides"
-    ]
+    X_all, y = load_training_set()
+    model = load_model("linear")
+    features = FEATURES
     output_dir = os.path.join(os.path.dirname(__file__), "static", "images")
     os.makedirs(output_dir, exist_ok=True)
     for i, feature in enumerate(features):
         plt.figure(figsize=(6, 4))
-        X = df[feature].values.reshape(-1, 1)
-        y = df["score"].values
+        X = X_all[feature].to_numpy().reshape(-1, 1)
         y_pred = model.intercept_ + model.coef_[i] * X
         plt.scatter(X, y, alpha=0.6, label="Actual")
         plt.plot(X, y_pred, color="red", label="Regression Line")
@@ -29,15 +27,8 @@ def plot_linear_relationships():
         plt.close()
 
 def plot_actual_vs_predicted():
-    df = pd.read_csv("training_data.csv")
-    model = joblib.load("linear_model.joblib")
-
-    features = [
-        "total_slide_time", "slides_opened_ratio", "first_attempt_accuracy",
-        "overall_accuracy", "recall_fluency", "total_slides"
-    ]
-    X = df[features]
-    y_actual = df["score"]
+    X, y_actual = load_training_set()
+    model = load_model("linear")
     y_pred = model.predict(X)
 
     plt.figure(figsize=(6, 6))
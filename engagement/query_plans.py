@@ -0,0 +1,56 @@
+import re
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# A SCAN reads every row of the table, or of the index it names
+SCAN = re.compile(r"^SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?$")
+# Catalogue link tables are small and aggregated whole on purpose (see cube.slide_pages)
+SCANNABLE = {"engagement_textbookslide_pages"}
+
+def explain(sql):
+    """The EXPLAIN QUERY PLAN detail lines for an SQLite statement."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [row[-1] for row in cursor.fetchall()]
+
+def partial_indexes():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'")
+        return {row[0] for row in cursor.fetchall()}
+
+def full_scans(plan, allowed=SCANNABLE, partial=frozenset()):
+    """The steps of ``plan`` that read a whole table; scanning a partial index only reads the rows it covers."""
+    scans = []
+    for detail in plan:
+        match = SCAN.match(detail)
+        if match and match.group(1) not in allowed and match.group(2) not in partial:
+            scans.append(detail)
+    return scans
+
+def capture_plans(func, *args, **kwargs):
+    """Run ``func`` and return ``(sql, plan)`` for every SELECT, UPDATE and DELETE it issued.
+
+    Only SQLite is supported, and ImproperlyConfigured is raised on other
+    backends; their planners need table statistics before their plans mean
+    anything.
+    """
+    if connection.vendor != "sqlite":
+        raise ImproperlyConfigured("Query plans are only checked on SQLite.")
+    with CaptureQueriesContext(connection) as queries:
+        func(*args, **kwargs)
+    return [
+        (query["sql"], explain(query["sql"]))
+        for query in queries.captured_queries
+        if query["sql"].lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE"))
+    ]
+
+def find_full_scans(func, *args, **kwargs):
+    """``{sql: [full table scans]}`` for the queries ``func`` runs that scan a whole table."""
+    found = {}
+    partial = partial_indexes()
+    for sql, plan in capture_plans(func, *args, **kwargs):
+        scans = full_scans(plan, partial=partial)
+        if scans:
+            found[sql] = scans
+    return found
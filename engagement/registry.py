@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+import joblib
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+from .compiled import compile_model, load_compiled, save_compiled
+from .datasets import FEATURES
+from .models import ModelVersion
+logger = logging.getLogger(__name__)
+
+REGISTRY_DIR = Path(settings.BASE_DIR) / "model_registry"
+# Where each model was saved before the registry existed, relative to the working directory
+LEGACY_ARTIFACTS = {"forest": "ml_model.joblib", "linear": "linear_model.joblib", "tree": "tree_model.joblib"}
+CHUNK_SIZE = 1 << 20
+MMAP_MODE = getattr(settings, "MODEL_MMAP_MODE", None)
+# Largest batch a compiled tree or forest predicts; scikit-learn's Cython walk wins on bigger ones
+COMPILED_MAX_ROWS = 64
+
+_cache = {}  # name -> (sha256, model): the active version of each model, loaded once per process; compiled ones under name.compiled, serving ones under name.serving
+_stats = {}
+_cache_lock = threading.Lock()
+
+def artifact_path(sha256):
+    return REGISTRY_DIR / f"{sha256}.joblib"
+
+def compiled_path(sha256):
+    return REGISTRY_DIR / f"{sha256}.npz"
+
+def _umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+def staging_path(name):
+    """A new empty file in the registry directory to dump a model into before registering it."""
+    REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=REGISTRY_DIR, prefix=f"{name}-", suffix=".tmp")
+    os.close(fd)
+    # mkstemp's 0600 would survive the rename and hide the model from other users of the registry
+    os.chmod(path, 0o644 & ~_umask())
+    return path
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def register_file(name, path, features=FEATURES, metrics=None, training_set_sha256="", activate=True, move=True):
+    """Store the model file at ``path`` under its SHA-256 and record it as a version of ``name``.
+
+    The file is moved into the registry, or copied when ``move`` is False;
+    stored files are never written again, so a reader can't see one half
+    replaced. Identical content is stored once. The version is made
+    active unless ``activate`` is False.
+    """
+    sha256 = _sha256(path)
+    size = os.path.getsize(path)
+    if move:
+        os.replace(path, artifact_path(sha256))
+    elif not artifact_path(sha256).exists():
+        copy_path = staging_path(name)
+        shutil.copyfile(path, copy_path)
+        os.replace(copy_path, artifact_path(sha256))
+    version, created = ModelVersion.objects.get_or_create(sha256=sha256, defaults={
+        "name": name, "size": size, "features": list(features), "metrics": metrics or {},
+        "training_set_sha256": training_set_sha256 or "", "trained": now(),
+    })
+    if created:
+        logger.info("Registered %s", version)
+        try:
+            compile_version(version)
+        except ValueError as e:
+            logger.info("Not compiling %s: %s", version, e)
+    if activate:
+        activate_version(version)
+    return version
+
+def register_model(name, model, **kwargs):
+    """Dump ``model`` and register it as a version of ``name``; see register_file."""
+    path = staging_path(name)
+    try:
+        joblib.dump(model, path)
+        return register_file(name, path, **kwargs)
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+def compile_version(version):
+    """Save the NumPy-only form of ``version`` (see compiled.compile_model) next to its model file."""
+    compiled = compile_model(joblib.load(artifact_path(version.sha256)))
+    path = staging_path(version.name)
+    try:
+        with open(path, "wb") as f:
+            save_compiled(compiled, f)
+        os.replace(path, compiled_path(version.sha256))
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+def activate_version(version):
+    """Make ``version`` the one served for its name; the swap is a single transaction."""
+    with transaction.atomic():
+        ModelVersion.objects.select_for_update().filter(name=version.name, active=True).exclude(
+            id=version.id
+        ).update(active=False)
+        version.active = True
+        version.activated = now()
+        version.save(update_fields=["active", "activated"])
+    return version
+
+def rollback(name):
+    """Reactivate the most recently active earlier version of ``name``."""
+    current = active_version(name)
+    previous = ModelVersion.objects.filter(name=name, activated__isnull=False)
+    if current is not None:
+        previous = previous.exclude(id=current.id)
+    previous = previous.order_by("-activated").first()
+    if previous is None:
+        raise ValueError(f"No earlier {name} model to roll back to.")
+    return activate_version(previous)
+
+def active_version(name):
+    """The active ModelVersion of ``name``, or None.
+
+    A model file saved before the registry existed is registered and
+    activated the first time it is asked for.
+    """
+    version = ModelVersion.objects.filter(name=name, active=True).first()
+    legacy_path = LEGACY_ARTIFACTS.get(name)
+    if version is None and legacy_path and os.path.exists(legacy_path):
+        version = register_file(name, legacy_path, metrics={"imported_from": legacy_path}, move=False)
+    return version
+
+def load_active(name, compiled=False):
+    """``(version, model)`` for the active version of ``name``, loaded at most once per process.
+
+    Versions are immutable, so a cached model stays valid until another
+    version is activated; the next call then loads that one instead.
+    ``compiled`` loads the version's CompiledModel, which predicts the
+    same values without scikit-learn, compiling it first if need be.
+    """
+    version = active_version(name)
+    if version is None:
+        raise FileNotFoundError(f"No {name} model has been trained yet.")
+    key = f"{name}.compiled" if compiled else name
+    with _cache_lock:
+        stats = _stats.setdefault(key, {"hits": 0, "misses": 0, "load_seconds": 0.0, "version": None})
+        cached = _cache.get(key)
+        if cached and cached[0] == version.sha256:
+            stats["hits"] += 1
+            return version, cached[1]
+    start = time.perf_counter()
+    if not compiled:
+        model = joblib.load(artifact_path(version.sha256), mmap_mode=MMAP_MODE)
+    else:
+        if not compiled_path(version.sha256).exists():
+            compile_version(version)
+        model = load_compiled(compiled_path(version.sha256))
+    with _cache_lock:
+        _cache[key] = (version.sha256, model)
+        stats["misses"] += 1
+        stats["load_seconds"] += time.perf_counter() - start
+        stats["version"] = version.sha256
+    return version, model
+
+class ServingModel:
+    """Predicts with a version's CompiledModel, or its scikit-learn model for tree batches above ``max_rows``.
+
+    Both give the same values. The scikit-learn model is only loaded once
+    a batch needs it.
+    """
+
+    def __init__(self, version, compiled, max_rows=COMPILED_MAX_ROWS):
+        self.version = version
+        self.compiled = compiled
+        self.max_rows = max_rows
+        self._model = None
+        self._lock = threading.Lock()
+
+    def predict(self, X):
+        if self.compiled.kind == "linear" or len(X) <= self.max_rows:
+            return self.compiled.predict(X)
+        with self._lock:
+            if self._model is None:
+                self._model = joblib.load(artifact_path(self.version.sha256), mmap_mode=MMAP_MODE)
+        return self._model.predict(X)
+
+def load_serving(name):
+    """``(version, ServingModel)`` for the active version of ``name``, cached like load_active."""
+    version, compiled = load_active(name, compiled=True)
+    with _cache_lock:
+        cached = _cache.get(f"{name}.serving")
+        if cached and cached[0] == version.sha256:
+            return version, cached[1]
+        model = ServingModel(version, compiled)
+        _cache[f"{name}.serving"] = (version.sha256, model)
+    return version, model
+
+def load_model(name, compiled=False):
+    """The active model of ``name``; see load_active."""
+    return load_active(name, compiled)[1]
+
+def model_cache_stats():
+    """Hits, misses, total load time and cached version for each model loaded in this process."""
+    with _cache_lock:
+        return {name: {**stats, "load_seconds": round(stats["load_seconds"], 3)} for name, stats in _stats.items()}
+
+def clear_model_cache():
+    with _cache_lock:
+        _cache.clear()
+        _stats.clear()
@@ -0,0 +1,149 @@
+from django.db.models import Count, F, FloatField, Sum
+from .models import (
+    ContentDimension, StudyEngagementFact,
+    StudentSectionEngagement, StudentSubjectEngagement, SectionEngagement,
+)
+
+BATCH_SIZE = 500
+LEVELS = ("subject", "section", "page")
+RATIOS = ["slides_opened_ratio", "first_attempt_accuracy", "overall_accuracy", "recall_fluency"]
+
+def _sums(pages, score):
+    # Ratios are summed weighted by total_slides and divided back out in _metrics
+    sums = {
+        "n_pages": pages,
+        "n_slides": Sum("total_slides"),
+        "slide_time": Sum("total_slide_time"),
+        "score_sum": Sum(score, output_field=FloatField()),
+    }
+    for name in RATIOS:
+        sums[f"{name}_sum"] = Sum(F(name) * F("total_slides"), output_field=FloatField())
+    return sums
+
+FACT_SUMS = _sums(Count("id"), "score")
+ROLLUP_SUMS = _sums(Sum("pages"), F("average_score") * F("pages"))
+
+def _metrics(row):
+    slides = row["n_slides"] or 0
+    metrics = {
+        "pages": row["n_pages"],
+        "total_slides": slides,
+        "total_slide_time": row["slide_time"] or 0,
+        "average_score": row["score_sum"] / row["n_pages"] if row["n_pages"] else 0,
+    }
+    for name in RATIOS:
+        metrics[name] = row[f"{name}_sum"] / slides if slides > 0 else 0
+    return metrics
+
+def _grouped(queryset, keys, sums=FACT_SUMS):
+    for row in queryset.values(*keys).annotate(**sums).order_by(*keys):
+        yield row, _metrics(row)
+
+def _chunks(values):
+    values = sorted(values)
+    for start in range(0, len(values), BATCH_SIZE):
+        yield values[start:start + BATCH_SIZE]
+
+def _rebuild_students(facts, student_ids):
+    for chunk in _chunks(student_ids):
+        StudentSectionEngagement.objects.filter(student_id__in=chunk).delete()
+        StudentSubjectEngagement.objects.filter(student_id__in=chunk).delete()
+        chunk_facts = facts.filter(student_id__in=chunk)
+        StudentSectionEngagement.objects.bulk_create([
+            StudentSectionEngagement(student_id=row["student_id"], section_id=row["content_dim__sections"], **metrics)
+            for row, metrics in _grouped(
+                chunk_facts.filter(content_dim__sections__isnull=False), ["student_id", "content_dim__sections"]
+            )
+        ], batch_size=BATCH_SIZE)
+        StudentSubjectEngagement.objects.bulk_create([
+            StudentSubjectEngagement(student_id=row["student_id"], subject=row["content_dim__subject"], **metrics)
+            for row, metrics in _grouped(chunk_facts, ["student_id", "content_dim__subject"])
+        ], batch_size=BATCH_SIZE)
+
+def _rebuild_sections(facts, section_ids):
+    for chunk in _chunks(section_ids):
+        SectionEngagement.objects.filter(section_id__in=chunk).delete()
+        rows = _grouped(
+            facts.filter(content_dim__sections__in=chunk).annotate(section_id=F("content_dim__sections")),
+            ["section_id"],
+            {**FACT_SUMS, "n_students": Count("student_id", distinct=True)},
+        )
+        SectionEngagement.objects.bulk_create([
+            SectionEngagement(section_id=row["section_id"], students=row["n_students"], **metrics)
+            for row, metrics in rows
+        ], batch_size=BATCH_SIZE)
+
+def rebuild_rollups(student_ids=None, page_ids=None):
+    """Recompute the roll-up tables from StudyEngagementFact.
+
+    With no arguments every roll-up is rebuilt. Otherwise only the student
+    roll-ups of ``student_ids`` and the section roll-ups of the sections
+    linked to ``page_ids`` are, which is what a change to those facts needs.
+    Call inside the transaction that changed the facts.
+    """
+    facts = StudyEngagementFact.objects.all()
+    if student_ids is None:
+        StudentSectionEngagement.objects.all().delete()
+        StudentSubjectEngagement.objects.all().delete()
+        SectionEngagement.objects.all().delete()
+        student_ids = facts.values_list("student_id", flat=True).distinct()
+        section_ids = ContentDimension.sections.through.objects.values_list("textbooksection_id", flat=True)
+    else:
+        section_ids = ContentDimension.sections.through.objects.filter(
+            contentdimension__page_id__in=page_ids or []
+        ).values_list("textbooksection_id", flat=True)
+    _rebuild_students(facts, set(student_ids))
+    _rebuild_sections(facts, set(section_ids))
+
+def engagement_rollup(level, student_id=None, subject=None, section_id=None):
+    """Engagement metrics at ``level`` ("subject", "section" or "page"), coarsest first.
+
+    Subject and section rows come from the roll-up tables; page rows are the
+    facts themselves, so drilling down from a subject to its sections and
+    then to a section's pages is one call per level with the parent as a
+    filter. Without ``student_id`` the rows cover every student.
+    """
+    if level not in LEVELS:
+        raise ValueError(f"Unknown level: {level}")
+    if level == "subject":
+        rollups = StudentSubjectEngagement.objects.all()
+        if student_id is not None:
+            rollups = rollups.filter(student_id=student_id)
+        if subject is not None:
+            rollups = rollups.filter(subject=subject)
+        keys = ["subject"] if student_id is None else ["student_id", "subject"]
+        return [{**{key: row[key] for key in keys}, **metrics} for row, metrics in _grouped(rollups, keys, ROLLUP_SUMS)]
+    if level == "section":
+        if student_id is None:
+            rollups = SectionEngagement.objects.select_related("section")
+        else:
+            rollups = StudentSectionEngagement.objects.filter(student_id=student_id).select_related("section")
+        if subject is not None:
+            rollups = rollups.filter(
+                section_id__in=ContentDimension.sections.through.objects.filter(
+                    contentdimension__subject=subject
+                ).values("textbooksection_id")
+            )
+        if section_id is not None:
+            rollups = rollups.filter(section_id=section_id)
+        fields = ["pages", "total_slides", "total_slide_time", "average_score"] + RATIOS
+        return [
+            {
+                **({"students": rollup.students} if student_id is None else {"student_id": student_id}),
+                "section_id": rollup.section_id, "section_title": rollup.section.section_title,
+                **{name: getattr(rollup, name) for name in fields},
+            }
+            for rollup in rollups.order_by("section_id")
+        ]
+    facts = StudyEngagementFact.objects.all()
+    if student_id is not None:
+        facts = facts.filter(student_id=student_id)
+    if subject is not None:
+        facts = facts.filter(content_dim__subject=subject)
+    if section_id is not None:
+        facts = facts.filter(content_dim__sections=section_id)
+    keys = ["content_dim__page_id"] if student_id is None else ["student_id", "content_dim__page_id"]
+    return [
+        {**{key.replace("content_dim__", ""): row[key] for key in keys}, **metrics}
+        for row, metrics in _grouped(facts, keys)
+    ]
@@ -0,0 +1,59 @@
+import logging
+import numpy as np
+import pandas as pd
+from django.utils.timezone import now
+from .datasets import FEATURES
+from .models import EngagementPrediction, StudyEngagementFact
+from .registry import load_active
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 10000
+# The score each label after the first starts at, as in views.categorise_score
+SCORE_BANDS = [1.0, 2.0, 2.8]
+LABELS = np.array(["Needs Improvement", "Developing", "Competent", "Excellent"], dtype=object)
+
+def score_labels(scores):
+    """views.categorise_score's label for each score, vectorized."""
+    return LABELS[np.searchsorted(SCORE_BANDS, scores, side="right")]
+
+def filter_facts(facts, student_id=None, section_id=None, subject=None):
+    if student_id is not None:
+        facts = facts.filter(student_id=student_id)
+    if section_id is not None:
+        facts = facts.filter(content_dim__sections=section_id)
+    if subject is not None:
+        facts = facts.filter(content_dim__subject=subject)
+    return facts
+
+def score_facts(model_name="forest", student_id=None, section_id=None, subject=None, chunk_size=CHUNK_SIZE, job=None):
+    """Score every StudyEngagementFact matching the filters with the active model and store the results.
+
+    Facts are read in id order ``chunk_size`` at a time. Each chunk is
+    predicted in one call, rounded to 2 places and labelled as the predict
+    form does, then upserted into EngagementPrediction with the model
+    version. Memory use depends on ``chunk_size``, not on the table size.
+    """
+    version, model = load_active(model_name)
+    facts = filter_facts(StudyEngagementFact.objects.all(), student_id, section_id, subject).order_by("id")
+    total = facts.count() if job else None
+    predicted = now()
+    last_id, scored = 0, 0
+    while rows := list(facts.filter(id__gt=last_id).values_list("id", *FEATURES)[:chunk_size]):
+        chunk = np.array(rows, dtype=np.float64)
+        ids = chunk[:, 0].astype(np.int64).tolist()
+        scores = np.round(model.predict(pd.DataFrame(chunk[:, 1:], columns=FEATURES)), 2)
+        EngagementPrediction.objects.bulk_create(
+            [
+                EngagementPrediction(fact_id=fact_id, model_version=version, score=score, label=label, predicted=predicted)
+                for fact_id, score, label in zip(ids, scores.tolist(), score_labels(scores))
+            ],
+            update_conflicts=True,
+            unique_fields=["fact"],
+            update_fields=["model_version", "score", "label", "predicted"],
+        )
+        last_id = ids[-1]
+        scored += len(ids)
+        if job:
+            job.report(scored / total, f"Scored {scored} of {total} facts")
+    logger.info("Scored %d facts with %s", scored, version)
+    return {"model": model_name, "version": version.sha256, "scored": scored}
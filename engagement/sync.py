@@ -0,0 +1,54 @@
+from datetime import datetime
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import SyncState
+
+# Append-mostly entities and the timestamp fields that move forward when one of
+# their rows is created or changed. Catalog tables (sections, pages, slides,
+# questions) and per-slide read statuses are small and always applied in full.
+WATERMARK_FIELDS = {
+    "user_slide_sessions": ("expanded", "collapsed", "read"),
+    "attempts": ("viewed", "correct"),
+    "attempt_details": ("timestamp",),
+    "writing_interactions": ("timestamp",),
+}
+
+def parse_timestamp(value):
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if not isinstance(value, datetime):
+        return None
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.get_default_timezone())
+    return value
+
+def record_timestamp(entity, record):
+    stamps = [parse_timestamp(record.get(field)) for field in WATERMARK_FIELDS[entity]]
+    stamps = [stamp for stamp in stamps if stamp is not None]
+    return max(stamps) if stamps else None
+
+def load_watermarks():
+    return {
+        state.entity: (state.max_id, state.max_timestamp)
+        for state in SyncState.objects.filter(entity__in=WATERMARK_FIELDS)
+    }
+
+def save_watermarks(high_water):
+    stored = load_watermarks()
+    for entity, (max_id, max_timestamp) in high_water.items():
+        stored_id, stored_timestamp = stored.get(entity, (0, None))
+        if stored_timestamp and (max_timestamp is None or stored_timestamp > max_timestamp):
+            max_timestamp = stored_timestamp
+        SyncState.objects.update_or_create(
+            entity=entity,
+            defaults={"max_id": max(max_id, stored_id), "max_timestamp": max_timestamp},
+        )
+
+def watermark_params(watermarks):
+    # Sent upstream so the API can return only the delta; rows are filtered again on arrival.
+    params = {}
+    for entity, (max_id, max_timestamp) in watermarks.items():
+        params[f"{entity}_since_id"] = max_id
+        if max_timestamp:
+            params[f"{entity}_since"] = max_timestamp.isoformat()
+    return params
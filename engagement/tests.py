@@ -1,3 +1,1370 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import mmap
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
+import joblib
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import train_test_split
+from .models import (
+    ContentDimension, EngagementPrediction, Job, LatestWritingGrade, ModelVersion, PayloadSnapshot,
+    RevisionQuestionAttempt, RevisionQuestionAttemptDetail, StudyEngagementFact, SyncState, TextbookPage, TextbookSection, TextbookSlide, UserSlideRead, UserSlideReadSession,
+    WritingInteraction, WritingInteractionText, pack_text, unpack_text,
+)
+from .cube import build_olap_cube, refresh_olap_cube
+from .query_plans import capture_plans, find_full_scans
+from .rollups import engagement_rollup
+from .ingest import ingest_pages, ingest_payload, ingest_stream, refresh_latest_grades
+from .json_stream import iter_arrays
+from .jobs import run_job, submit_job
+from .sync import load_watermarks
+from .snapshots import replay_snapshots, snapshot_path
+from .textbook_client import TextbookClient
+from .batching import MicroBatcher
+from .compiled import CompiledModel, compile_model, load_compiled, save_compiled
+from . import cube, datasets, jobs, features, fitting, registry, scoring, training, tuning, views
 
-# Create your tests here.
+def sample_payload(attempts=3):
+    return {
+        "sections": [{"id": 1, "section_title": "Requirements"}],
+        "pages": [{"id": 1, "page_title": "Use Cases", "sections": [1]}],
+        "slides": [{"id": 1, "slide_title": "Actors", "pages": [1]}],
+        "user_slide_reads": [{"id": 1, "user": 7, "slide": 1, "slide_status": "read"}],
+        "user_slide_sessions": [
+            {"id": 1, "slide_read": 1, "expanded": "2025-05-01T10:00:00Z", "collapsed": "2025-05-01T10:01:00Z", "read": None},
+        ],
+        "questions": [{"id": 1, "textbook_page": 1}],
+        "attempts": [
+            {"id": i, "user": 7, "question": 1, "viewed": f"2025-05-01T11:00:{i:02d}Z", "correct": None}
+            for i in range(1, attempts + 1)
+        ],
+        "attempt_details": [],
+        "writing_interactions": [
+            {"id": 1, "user_id": 7, "page_id": 1, "user_input": "essay", "openai_response": "feedback",
+             "grade": None, "timestamp": "2025-05-01T12:00:00Z"},
+        ],
+    }
+
+def cohort_payload(students, pages=3, slides_per_page=4):
+    """A synthetic export where every student reads every slide and answers every question."""
+    slides = [(page, page * 10 + n) for page in range(1, pages + 1) for n in range(slides_per_page)]
+    reads = [(student, slide) for student in range(1, students + 1) for _, slide in slides]
+    return {
+        "sections": [{"id": 1, "section_title": "Design"}],
+        "pages": [{"id": page, "page_title": f"Page {page}", "sections": [1]} for page in range(1, pages + 1)],
+        "slides": [{"id": slide, "slide_title": f"Slide {slide}", "pages": [page]} for page, slide in slides],
+        "user_slide_reads": [
+            {"id": i, "user": student, "slide": slide, "slide_status": "read"}
+            for i, (student, slide) in enumerate(reads, 1)
+        ],
+        "user_slide_sessions": [
+            {"id": i, "slide_read": i, "expanded": "2025-05-01T10:00:00Z",
+             "collapsed": f"2025-05-01T10:0{i % 5}:30Z", "read": None}
+            for i in range(1, len(reads) + 1)
+        ],
+        "questions": [{"id": page, "textbook_page": page} for page in range(1, pages + 1)],
+        "attempts": [
+            {"id": student * 100 + page, "user": student, "question": page,
+             "viewed": "2025-05-01T11:00:00Z", "correct": "2025-05-01T11:00:20Z" if student % 2 else None}
+            for student in range(1, students + 1) for page in range(1, pages + 1)
+        ],
+        "attempt_details": [
+            {"id": student * 100 + page, "attempt": student * 100 + page, "is_correct": True,
+             "timestamp": "2025-05-01T11:00:40Z"}
+            for student in range(1, students + 1) for page in range(1, pages + 1) if student % 3 == 0
+        ],
+        "writing_interactions": [
+            {"id": student * 100 + page, "user_id": student, "page_id": page, "user_input": "essay",
+             "openai_response": "feedback", "grade": (student + page) % 4, "timestamp": "2025-05-01T12:00:00Z"}
+            for student in range(1, students + 1) for page in range(1, pages + 1)
+        ],
+    }
+
+class StubTextbookServer:
+    """Serves a fixed payload on localhost and records the query of every request.
+
+    ``pages`` maps the ``page`` query parameter to extra payloads, and the first
+    ``failures`` requests are answered with a 503.
+    """
+
+    def __init__(self, payload, pages=None, failures=0):
+        self.payload = payload
+        self.pages = pages or {}
+        self.failures = failures
+        self.queries = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                stub.queries.append(query)
+                if stub.failures:
+                    stub.failures -= 1
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                page = int(query.get("page", ["1"])[0])
+                body = json.dumps(stub.pages[page] if page > 1 else stub.payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/textbook/api/user-engagement/"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+class ImportTestCase(TestCase):
+    """Keeps payload snapshots written during a test in a throwaway directory."""
+
+    def setUp(self):
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        patcher = mock.patch("engagement.snapshots.SNAPSHOT_DIR", Path(snapshot_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sync(self, stub, incremental=True):
+        request = RequestFactory().post("/engagement/manual-import/")
+        with mock.patch.object(views, "DATA_API_URL", stub.url):
+            return views.fetch_data_from_textbook(request, "session", "token", stream=True, incremental=incremental)
+
+class IncrementalSyncTests(ImportTestCase):
+    def test_second_sync_sends_watermarks_and_applies_only_the_delta(self):
+        with StubTextbookServer(sample_payload(attempts=3)) as stub:
+            first = self.sync(stub)
+            self.assertEqual(first["attempts"]["inserted"], 3)
+            self.assertEqual(stub.queries[0], {})
+            self.assertEqual(SyncState.objects.get(entity="attempts").max_id, 3)
+
+            # Upstream ignores the watermark and resends everything plus one new attempt and a new grade
+            stub.payload = sample_payload(attempts=4)
+            stub.payload["writing_interactions"][0]["grade"] = "2.0"
+            second = self.sync(stub)
+
+        self.assertEqual(stub.queries[1]["attempts_since_id"], ["3"])
+        self.assertEqual(second["attempts"], {"inserted": 1, "updated": 0, "unchanged": 3, "skipped": 0})
+        self.assertEqual(second["user_slide_sessions"]["unchanged"], 1)
+        self.assertEqual(second["writing_interactions"]["updated"], 1)
+        self.assertEqual(WritingInteraction.objects.get(id=1).grade, 2)
+        self.assertEqual(RevisionQuestionAttempt.objects.count(), 4)
+        self.assertEqual(SyncState.objects.get(entity="attempts").max_id, 4)
+
+    def test_full_sync_rewrites_rows_below_the_watermark(self):
+        with StubTextbookServer(sample_payload()) as stub:
+            self.sync(stub)
+            stub.payload["sections"][0]["section_title"] = "Requirements Engineering"
+            stub.payload["attempts"][0]["correct"] = "2025-05-01T11:05:00Z"
+            stats = self.sync(stub, incremental=False)
+        self.assertEqual(stub.queries[1], {})
+        self.assertEqual(stats["sections"], {"inserted": 0, "updated": 1, "unchanged": 0, "skipped": 0})
+        self.assertEqual(stats["attempts"], {"inserted": 0, "updated": 1, "unchanged": 2, "skipped": 0})
+        self.assertEqual(TextbookSection.objects.get().section_title, "Requirements Engineering")
+
+    def test_watermark_stays_below_rows_skipped_for_a_missing_parent(self):
+        orphaned = sample_payload(attempts=3)
+        orphaned["questions"] = []
+        orphaned["attempts"].append({"id": 4, "user": 7, "question": 99, "viewed": "2025-05-01T10:30:00Z", "correct": None})
+        stats = ingest_payload(orphaned, watermarks=load_watermarks())
+        self.assertEqual(stats["attempts"]["skipped"], 4)
+        state = SyncState.objects.get(entity="attempts")
+        self.assertEqual(state.max_id, 0)
+        self.assertLess(state.max_timestamp, parse_datetime("2025-05-01T10:30:00Z"))
+
+        stats = ingest_payload(sample_payload(attempts=3), watermarks=load_watermarks())
+        self.assertEqual(stats["attempts"], {"inserted": 3, "updated": 0, "unchanged": 0, "skipped": 0})
+        self.assertEqual(RevisionQuestionAttempt.objects.count(), 3)
+        self.assertEqual(SyncState.objects.get(entity="attempts").max_id, 3)
+
+class TextbookClientTests(TestCase):
+    def paged_server(self, failures=0):
+        first = dict(sample_payload(attempts=2), total_pages=3)
+        pages = {
+            page: {"attempts": [{"id": 10 + page, "user": 7, "question": 1,
+                                 "viewed": "2025-05-02T09:00:00Z", "correct": None}]}
+            for page in (2, 3)
+        }
+        return StubTextbookServer(first, pages=pages, failures=failures)
+
+    def test_fetch_json_merges_pages_and_retries_server_errors(self):
+        client = TextbookClient(backoff_factor=0, max_workers=2)
+        with self.paged_server(failures=2) as stub:
+            data = client.fetch_json(stub.url, {"attempts_since_id": 0})
+        self.assertEqual([a["id"] for a in data["attempts"]], [1, 2, 12, 13])
+        self.assertEqual(len(stub.queries), 5)  # two 503s, then three pages
+        self.assertEqual(sorted(q["page"][0] for q in stub.queries if "page" in q), ["2", "3"])
+        self.assertTrue(all(q["attempts_since_id"] == ["0"] for q in stub.queries))
+        self.assertEqual(client.summary()["requests"], 3)
+        self.assertTrue(all(m.status == 200 and m.bytes > 0 for m in client.metrics))
+
+    def test_iter_pages_streams_every_page_into_one_import(self):
+        client = TextbookClient(backoff_factor=0)
+        with self.paged_server() as stub:
+            stats = ingest_pages(client.iter_pages(stub.url), batch_size=1)
+        self.assertEqual(stats["attempts"]["inserted"], 4)
+        self.assertEqual(RevisionQuestionAttempt.objects.count(), 4)
+        self.assertEqual(len(client.metrics), 3)
+
+class JobRunnerTests(TestCase):
+    def test_view_returns_job_id_and_status_endpoint_reports_progress(self):
+        ingest_payload(cohort_payload(students=1))
+        with mock.patch("engagement.jobs.get_executor") as executor, self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.get(reverse("engagement:populate_olap_cube"))
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["job_id"]
+        self.assertEqual(len(callbacks), 1)
+        _, job_id_arg, func, args, kwargs = executor.return_value.submit.call_args.args
+        self.assertEqual(job_id_arg, job_id)
+        self.assertEqual(Job.objects.get(id=job_id).status, Job.QUEUED)
+
+        run_job(job_id, func, args, kwargs)
+        status = self.client.get(reverse("engagement:job_status", args=[job_id])).json()
+        self.assertEqual(status["status"], Job.SUCCEEDED)
+        self.assertEqual(status["progress"], 1.0)
+        olap = self.client.get(reverse("engagement:check_olap_status")).json()
+        self.assertTrue(olap["olap_populated"])
+        self.assertEqual(olap["jobs"][0]["id"], job_id)
+
+    def test_manual_import_is_only_marked_done_by_its_job(self):
+        with mock.patch("engagement.jobs.get_executor"):
+            response = self.client.post(reverse("engagement:manual_import"), {"sessionid": "s", "csrftoken": "t"})
+        job = Job.objects.get(kind=Job.IMPORT)
+        self.assertEqual(response.cookies["import_job"].value, str(job.id))
+        self.assertNotIn("data_imported", response.cookies)
+        page = self.client.get(reverse("engagement:homepage")).content.decode()
+        self.assertIn(reverse("engagement:job_status", args=[0]), page)
+
+    def test_failed_job_records_the_error(self):
+        def broken(job=None):
+            job.report(0.5, "halfway")
+            raise ValueError("training data missing")
+
+        with mock.patch("engagement.jobs.get_executor"):
+            job = submit_job(Job.TRAIN_FOREST, broken)
+        job = run_job(job.id, broken)
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.message, "training data missing")
+        self.assertEqual(job.progress, 0.5)
+        self.assertIsNotNone(job.finished)
+
+    def test_result_that_cant_be_stored_fails_the_job(self):
+        def unserializable(job=None):
+            job.report(0.5, "halfway")
+            return {"students": {1, 2}}
+
+        with mock.patch("engagement.jobs.get_executor"):
+            job = submit_job(Job.SCORE, unserializable)
+        run_job(job.id, unserializable)
+        job = Job.objects.get(id=job.id)
+        self.assertEqual((job.status, job.progress, job.result), (Job.FAILED, 0.5, None))
+        self.assertIn("not JSON serializable", job.message)
+        self.assertIsNotNone(job.finished)
+
+    def test_jobs_of_an_earlier_process_are_failed_when_the_executor_starts(self):
+        earlier, current = Job.objects.create(kind=Job.IMPORT, status=Job.RUNNING), Job.objects.create(kind=Job.TUNE)
+        done = Job.objects.create(kind=Job.SCORE, status=Job.SUCCEEDED)
+        Job.objects.filter(id__in=[earlier.id, done.id]).update(created=jobs.PROCESS_STARTED - timedelta(minutes=5))
+        with mock.patch.object(jobs, "_executor", None), mock.patch("engagement.jobs.ThreadPoolExecutor"):
+            jobs.get_executor()
+        statuses = dict(Job.objects.values_list("id", "status"))
+        self.assertEqual(statuses, {earlier.id: Job.FAILED, current.id: Job.QUEUED, done.id: Job.SUCCEEDED})
+        self.assertIn("Interrupted", Job.objects.get(id=earlier.id).message)
+
+    def test_refresh_progress_is_reported_outside_the_transaction(self):
+        ingest_payload(cohort_payload(students=2))
+        depth = len(connection.atomic_blocks)  # The test's own transaction
+        depths = []
+        refresh_olap_cube(progress=lambda fraction, message: depths.append(len(connection.atomic_blocks)))
+        self.assertEqual(depths, [depth] * 3)
+
+class TextbookIngestorTests(TestCase):
+    def test_counts_inserted_updated_unchanged_and_skipped_rows(self):
+        stats = ingest_payload(sample_payload(attempts=3), batch_size=2)
+        self.assertEqual(stats["attempts"], {"inserted": 3, "updated": 0, "unchanged": 0, "skipped": 0})
+        self.assertEqual(stats["sections"]["inserted"], 1)
+        payload = sample_payload(attempts=4)
+        payload["attempts"][0]["correct"] = "2025-05-01T11:02:00Z"
+        payload["attempts"].append({"id": 5, "user": 7, "question": 99, "viewed": "2025-05-01T11:00:05Z", "correct": None})
+        stats = ingest_payload(payload, batch_size=2)
+        self.assertEqual(stats["attempts"], {"inserted": 1, "updated": 1, "unchanged": 2, "skipped": 1})
+        self.assertEqual(stats["sections"], {"inserted": 0, "updated": 0, "unchanged": 1, "skipped": 0})
+        self.assertEqual(RevisionQuestionAttempt.objects.count(), 4)
+        self.assertIsNotNone(RevisionQuestionAttempt.objects.get(id=1).correct)
+
+    def test_reimport_relinks_pages_and_slides(self):
+        payload = sample_payload()
+        payload["sections"].append({"id": 2, "section_title": "Design"})
+        payload["pages"].append({"id": 2, "page_title": "Patterns", "sections": [2]})
+        ingest_payload(payload)
+        self.assertEqual(list(TextbookSlide.objects.get(id=1).pages.values_list("id", flat=True)), [1])
+
+        # Links are replaced, not added to; a link to a row stored by an earlier import still resolves
+        ingest_payload({
+            "pages": [{"id": 1, "page_title": "Use Cases", "sections": [2]}, {"id": 2, "page_title": "Patterns"}],
+            "slides": [{"id": 1, "slide_title": "Actors", "pages": [2, 1, 2]}],
+        })
+        self.assertEqual(list(TextbookPage.objects.get(id=1).sections.values_list("id", flat=True)), [2])
+        self.assertEqual(sorted(TextbookSlide.objects.get(id=1).pages.values_list("id", flat=True)), [1, 2])
+        # A page sent without its sections keeps them
+        self.assertEqual(list(TextbookPage.objects.get(id=2).sections.values_list("id", flat=True)), [2])
+
+        # Unknown targets are dropped with a warning; with none left the old links stay
+        with self.assertLogs("engagement.ingest", "WARNING") as logs:
+            ingest_payload({"pages": [{"id": 1, "page_title": "Use Cases", "sections": [99]}]})
+        self.assertIn("Section ID 99 not found for Page ID 1", logs.output[0])
+        self.assertEqual(list(TextbookPage.objects.get(id=1).sections.values_list("id", flat=True)), [2])
+
+    def test_users_of_reads_and_attempts_are_created(self):
+        User.objects.create(id=7, username="alice")
+        payload = sample_payload(attempts=1)
+        payload["attempts"][0]["user"] = 8
+        payload["writing_interactions"].append(dict(payload["writing_interactions"][0], id=2, user_id=9))
+        stats = ingest_payload(payload)
+        self.assertEqual(stats["users"]["inserted"], 1)
+        self.assertEqual(dict(User.objects.values_list("id", "username")), {7: "alice", 8: "user_8"})
+        # Writing interactions don't create users, they are skipped
+        self.assertEqual(stats["writing_interactions"]["skipped"], 1)
+        self.assertEqual(list(WritingInteraction.objects.values_list("id", flat=True)), [1])
+
+    def test_rows_with_unknown_parents_are_skipped(self):
+        payload = sample_payload(attempts=1)
+        payload["user_slide_reads"].append({"id": 2, "user": 7, "slide": 99, "slide_status": "read"})
+        payload["user_slide_sessions"].append(dict(payload["user_slide_sessions"][0], id=2, slide_read=2))
+        payload["questions"].append({"id": 2, "textbook_page": 99})
+        payload["attempts"].append({"id": 2, "user": 7, "question": 2, "viewed": None, "correct": None})
+        payload["attempt_details"] = [
+            {"id": 1, "attempt": 1, "is_correct": True, "timestamp": "2025-05-01T11:00:40Z"},
+            {"id": 2, "attempt": 2, "is_correct": True, "timestamp": "2025-05-01T11:00:40Z"},
+        ]
+        stats = ingest_payload(payload)
+        for entity in ("user_slide_reads", "user_slide_sessions", "questions", "attempts", "attempt_details"):
+            self.assertEqual((stats[entity]["inserted"], stats[entity]["skipped"]), (1, 1), entity)
+        self.assertEqual(list(UserSlideRead.objects.values_list("id", flat=True)), [1])
+        self.assertEqual(list(RevisionQuestionAttemptDetail.objects.values_list("id", flat=True)), [1])
+
+class StreamingIngestTests(TestCase):
+    def test_arrays_that_arrive_before_their_parents_are_applied_after_them(self):
+        payload = sample_payload(attempts=3)
+        reordered = {entity: payload[entity] for entity in reversed(list(payload))}
+        body = json.dumps(reordered).encode()
+        stats = ingest_stream([body[i:i + 7] for i in range(0, len(body), 7)], batch_size=2)
+        self.assertEqual(stats["attempts"], {"inserted": 3, "updated": 0, "unchanged": 0, "skipped": 0})
+        self.assertEqual(stats["user_slide_sessions"]["inserted"], 1)
+        self.assertEqual(RevisionQuestionAttempt.objects.count(), 3)
+        self.assertEqual(SyncState.objects.get(entity="attempts").max_id, 3)
+
+    def test_missing_parents_are_only_skipped_after_every_array_arrived(self):
+        payload = sample_payload(attempts=3)
+        del payload["questions"]
+        stats = ingest_stream([json.dumps({"attempts": payload.pop("attempts"), **payload}).encode()])
+        self.assertEqual(stats["attempts"]["skipped"], 3)
+        self.assertFalse(SyncState.objects.filter(entity="attempts", max_id__gt=0).exists())
+
+class JSONStreamTests(TestCase):
+    def arrays(self, text, size, meta=None):
+        data = text.encode()
+        chunks = [data[i:i + size] for i in range(0, len(data), size)]
+        return [(key, list(records)) for key, records in iter_arrays(chunks, meta)]
+
+    def test_values_split_across_chunks(self):
+        text = json.dumps({
+            "rows": [{"title": "Ünïcödé “quotes” 😀 and \\ \"escapes\"", "n": 1234567890123, "x": -1.5e-7},
+                     {"title": "", "n": 0, "x": True, "y": None}, [1, [2, {"z": "]"}]], "tail"],
+        }, ensure_ascii=False)
+        expected = [("rows", json.loads(text)["rows"])]
+        for size in range(1, 12):
+            self.assertEqual(self.arrays(text, size), expected, size)
+
+    def test_unread_arrays_are_skipped_and_scalars_go_to_meta(self):
+        text = '{"count": 2, "skip": [[1, 2], {"a": "]}"}], "next": "page=2", "keep": [3, 4], "empty": []}'
+        for size in (1, 5, len(text)):
+            meta = {}
+            stream = iter_arrays([text.encode()[i:i + size] for i in range(0, len(text), size)], meta)
+            seen = []
+            for key, records in stream:
+                if key != "skip":
+                    seen.append((key, list(records)))
+            self.assertEqual(seen, [("keep", [3, 4]), ("empty", [])])
+            self.assertEqual(meta, {"count": 2, "next": "page=2"})
+
+    def test_str_chunks_and_malformed_input(self):
+        self.assertEqual([(k, list(r)) for k, r in iter_arrays(['{"a"', ': [1', ", 2]}"])], [("a", [1, 2])])
+        self.assertEqual(list(iter_arrays([b"{}"])), [])
+        with self.assertRaises(ValueError):
+            self.arrays('[1, 2]', 3)
+        with self.assertRaises(ValueError):
+            self.arrays('{"a": [1 2]}', 3)
+
+class SnapshotTests(ImportTestCase):
+    def test_identical_payload_is_skipped_and_snapshot_replays_offline(self):
+        with StubTextbookServer(sample_payload()) as stub:
+            first = self.sync(stub, incremental=False)
+            second = self.sync(stub, incremental=False)
+        self.assertEqual(first["attempts"]["inserted"], 3)
+        self.assertFalse(any(any(counts.values()) for counts in second.values()))
+        snapshot = PayloadSnapshot.objects.get()
+        self.assertIsNotNone(snapshot.imported)
+        self.assertTrue(snapshot_path(snapshot.sha256).exists())
+        self.assertLess(snapshot.compressed_size, snapshot.size)
+
+        # The stub server is gone; replay rebuilds the rows from disk alone
+        RevisionQuestionAttempt.objects.all().delete()
+        TextbookSection.objects.all().delete()
+        stats = replay_snapshots([snapshot.sha256])
+        self.assertEqual(stats["attempts"]["inserted"], 3)
+        self.assertEqual(TextbookSection.objects.get().section_title, "Requirements")
+
+    def test_replay_of_unknown_snapshot_fails(self):
+        with self.assertRaises(FileNotFoundError):
+            replay_snapshots(["0" * 64])
+
+class CubeBuildTests(TestCase):
+    def build_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            build_olap_cube()
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_data(self):
+        # Three students, so every cube input has rows to flag processed
+        ingest_payload(cohort_payload(students=3))
+        small = self.build_queries()
+        ContentDimension.objects.all().delete()
+        # Fact writes are batched by the backend's parameter limit; 90 facts still fit in one batch
+        ingest_payload(cohort_payload(students=30))
+        large = self.build_queries()
+        self.assertEqual(small, large)
+        self.assertEqual(StudyEngagementFact.objects.count(), 30 * 3)
+
+    def test_facts_use_each_students_own_activity(self):
+        ingest_payload(cohort_payload(students=3))
+        build_olap_cube()
+        facts = {
+            (fact.student_id, fact.content_dim.page_id): fact
+            for fact in StudyEngagementFact.objects.select_related("content_dim")
+        }
+        self.assertEqual(len(facts), 9)
+        self.assertEqual(facts[2, 1].score, 3)
+        self.assertEqual(facts[3, 1].score, 0)
+        self.assertEqual(facts[3, 2].overall_accuracy, 1.0)
+        self.assertEqual(facts[1, 2].overall_accuracy, 0)
+        self.assertEqual(facts[1, 1].slides_opened_ratio, 1.0)
+
+    def test_sharding_does_not_change_the_result(self):
+        ingest_payload(cohort_payload(students=7))
+        build_olap_cube(workers=1)
+        whole = sorted(StudyEngagementFact.objects.values_list(
+            "student_id", "content_dim__page_id", "total_slide_time", "overall_accuracy", "score"
+        ))
+        StudyEngagementFact.objects.all().delete()
+        counts = build_olap_cube(workers=1, shard_size=2)
+        sharded = sorted(StudyEngagementFact.objects.values_list(
+            "student_id", "content_dim__page_id", "total_slide_time", "overall_accuracy", "score"
+        ))
+        self.assertEqual(whole, sharded)
+        self.assertEqual(counts["facts_created"], 21)
+
+    def test_workers_are_spawned_not_forked(self):
+        ingest_payload(cohort_payload(students=4))
+        contexts = []
+
+        class InlinePool:
+            def __init__(self, max_workers, mp_context, initializer):
+                contexts.append(mp_context.get_start_method())
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                pass
+
+            def submit(self, fn, *args):
+                future = Future()
+                future.set_result(fn(*args))
+                return future
+
+        with mock.patch("engagement.cube.ProcessPoolExecutor", InlinePool):
+            self.assertEqual(build_olap_cube(workers=2, shard_size=2)["facts_created"], 12)
+        self.assertEqual(contexts, ["spawn"])
+
+    def test_page_filters_are_chunked_without_changing_the_cells(self):
+        ingest_payload(cohort_payload(students=4))
+        slide_page = cube.slide_pages()
+        total_slides = cube._count_by(TextbookSlide.pages.through.objects, "textbookpage_id")
+        whole = cube.shard_metrics([1, 2, 3, 4], slide_page, total_slides)
+        with mock.patch("engagement.cube.IN_CHUNK", 2), CaptureQueriesContext(connection) as queries:
+            chunked = cube.shard_metrics([1, 2, 3, 4], slide_page, total_slides, {1, 2, 3})
+        self.assertEqual(chunked, whole)
+        # 12 slides and 3 pages, two per query
+        reads = [q["sql"] for q in queries.captured_queries if 'FROM "engagement_userslideread"' in q["sql"]]
+        self.assertEqual(len(reads), 6)
+
+    def test_rebuild_updates_facts_in_place_and_drops_stale_ones(self):
+        ingest_payload(cohort_payload(students=3))
+        self.assertEqual(build_olap_cube()["facts_created"], 9)
+        ids = set(StudyEngagementFact.objects.values_list("id", flat=True))
+        WritingInteraction.objects.filter(user_id=1, page_id=1).update(grade=None)
+        refresh_latest_grades([(1, 1)])  # Edits made outside import have to refresh the lookup themselves
+        counts = build_olap_cube()
+        self.assertEqual((counts["facts_updated"], counts["facts_removed"]), (8, 1))
+        self.assertEqual(len(ids - set(StudyEngagementFact.objects.values_list("id", flat=True))), 1)
+
+    def fact_rows(self):
+        return sorted(StudyEngagementFact.objects.values_list(
+            "student_id", "content_dim__page_id", "total_slide_time", "slides_opened_ratio",
+            "overall_accuracy", "score",
+        ))
+
+    def test_refresh_only_recomputes_cells_with_unprocessed_inputs(self):
+        payload = cohort_payload(students=4)
+        ingest_payload(payload)
+        build_olap_cube()
+        self.assertEqual(refresh_olap_cube()["cells"], 0)
+        changed = {
+            "attempt_details": [{"id": 999, "attempt": 102, "is_correct": True, "timestamp": "2025-05-02T10:00:00Z"}],
+            "writing_interactions": [dict(payload["writing_interactions"][-1], grade=0)],
+        }
+        ingest_payload(changed)
+        counts = refresh_olap_cube()
+        self.assertEqual((counts["cells"], counts["facts_updated"], counts["facts_created"]), (2, 2, 0))
+        self.assertFalse(RevisionQuestionAttemptDetail.objects.filter(processed=False).exists())
+        self.assertFalse(WritingInteraction.objects.filter(processed=False).exists())
+        refreshed = self.fact_rows()
+        build_olap_cube()
+        self.assertEqual(refreshed, self.fact_rows())
+
+    def test_resent_unchanged_rows_stay_processed(self):
+        payload = cohort_payload(students=4)
+        ingest_payload(payload)
+        build_olap_cube()
+        # A delta sync resends every slide read (they have no watermark) along with one new attempt
+        delta = {name: payload[name] for name in ("sections", "pages", "slides", "user_slide_reads", "questions")}
+        delta["attempts"] = [dict(payload["attempts"][0], id=999, viewed="2025-05-02T10:00:00Z")]
+        stats = ingest_payload(delta)
+        self.assertEqual(stats["user_slide_reads"]["unchanged"], len(payload["user_slide_reads"]))
+        self.assertFalse(UserSlideRead.objects.filter(processed=False).exists())
+        self.assertEqual(refresh_olap_cube()["cells"], 1)
+
+        delta["user_slide_reads"][0] = dict(delta["user_slide_reads"][0], slide_status="unread")
+        self.assertEqual(ingest_payload(delta)["user_slide_reads"]["updated"], 1)
+        self.assertEqual(UserSlideRead.objects.filter(processed=False).count(), 1)
+
+    def test_build_reads_grades_without_touching_writing_interactions(self):
+        ingest_payload(cohort_payload(students=2))
+        with CaptureQueriesContext(connection) as queries:
+            build_olap_cube()
+        reads = [q["sql"] for q in queries.captured_queries if q["sql"].startswith("SELECT")]
+        # Only unprocessed interactions are read: before the shards, and again to flag the unchanged ones processed
+        interactions = [sql for sql in reads if "engagement_writinginteraction" in sql]
+        self.assertEqual(len(interactions), 2)
+        for sql in interactions:
+            self.assertIn('NOT "engagement_writinginteraction"."processed"', sql)
+            self.assertNotIn("engagement_writinginteractiontext", sql)
+
+    def test_build_leaves_rows_changed_during_it_for_the_next_refresh(self):
+        ingest_payload(cohort_payload(students=2))
+        compute_cells = cube._compute_cells
+
+        def reimport_during_build(*args):
+            cells = compute_cells(*args)
+            ingest_payload({"attempts": [{"id": 101, "user": 1, "question": 1, "viewed": "2025-05-03T09:00:00Z", "correct": None}]})
+            return cells
+
+        with mock.patch("engagement.cube._compute_cells", side_effect=reimport_during_build):
+            build_olap_cube()
+        self.assertEqual(list(RevisionQuestionAttempt.objects.filter(processed=False).values_list("id", flat=True)), [101])
+        self.assertFalse(UserSlideRead.objects.filter(processed=False).exists())
+        self.assertEqual(refresh_olap_cube()["cells"], 1)
+
+    def test_failed_build_leaves_inputs_for_the_next_refresh(self):
+        ingest_payload(cohort_payload(students=2))
+        with mock.patch("engagement.cube.rebuild_rollups", side_effect=RuntimeError("disk full")):
+            with self.assertRaises(RuntimeError):
+                build_olap_cube()
+        self.assertFalse(StudyEngagementFact.objects.exists())
+        self.assertEqual(UserSlideRead.objects.filter(processed=False).count(), 24)
+        self.assertEqual(refresh_olap_cube()["facts_created"], 6)
+
+    def test_refresh_removes_facts_that_no_longer_qualify(self):
+        ingest_payload(cohort_payload(students=2))
+        build_olap_cube()
+        WritingInteraction.objects.filter(user_id=2, page_id=3).update(grade=None, processed=False)
+        self.assertEqual(refresh_olap_cube()["facts_removed"], 1)
+        self.assertEqual(StudyEngagementFact.objects.count(), 5)
+
+class RollupTests(TestCase):
+    def setUp(self):
+        payload = cohort_payload(students=3)
+        payload["sections"].append({"id": 2, "section_title": "Testing"})
+        payload["pages"][0]["sections"] = [1, 2]
+        ingest_payload(payload)
+        build_olap_cube()
+
+    def expected(self, facts):
+        facts = list(facts)
+        slides = sum(fact.total_slides for fact in facts)
+        return {
+            "pages": len(facts),
+            "total_slide_time": sum(fact.total_slide_time for fact in facts),
+            "overall_accuracy": sum(fact.overall_accuracy * fact.total_slides for fact in facts) / slides,
+            "average_score": sum(fact.score for fact in facts) / len(facts),
+        }
+
+    def assertMatches(self, row, expected):
+        for name, value in expected.items():
+            self.assertAlmostEqual(row[name], value, msg=name)
+
+    def test_rollups_match_weighted_facts(self):
+        facts = StudyEngagementFact.objects.all()
+        [section] = engagement_rollup("section", student_id=3, section_id=1)
+        self.assertMatches(section, self.expected(facts.filter(student_id=3)))
+        [testing] = engagement_rollup("section", section_id=2)
+        self.assertEqual(testing["students"], 3)
+        self.assertMatches(testing, self.expected(facts.filter(content_dim__page_id=1)))
+        [subject] = engagement_rollup("subject")
+        self.assertMatches(subject, self.expected(facts))
+        pages = engagement_rollup("page", student_id=2, section_id=2)
+        self.assertEqual([row["page_id"] for row in pages], [1])
+
+    def test_refresh_keeps_rollups_in_sync(self):
+        WritingInteraction.objects.filter(user_id=1, page_id=1).update(grade=None, processed=False)
+        refresh_olap_cube()
+        facts = StudyEngagementFact.objects.all()
+        [subject] = engagement_rollup("subject", student_id=1)
+        self.assertMatches(subject, self.expected(facts.filter(student_id=1)))
+        [testing] = engagement_rollup("section", section_id=2)
+        self.assertEqual(testing["students"], 2)
+        self.assertEqual(engagement_rollup("section", student_id=1, section_id=2), [])
+
+    def test_view_rejects_unknown_levels(self):
+        response = self.client.get(reverse("engagement:engagement_rollups", args=["chapter"]))
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse("engagement:engagement_rollups", args=["section"]), {"student": 2})
+        self.assertEqual(len(response.json()["rows"]), 2)
+
+class ReadDurationTests(TestCase):
+    def setUp(self):
+        ingest_payload(cohort_payload(students=1, pages=2, slides_per_page=3))
+        start = parse_datetime("2025-05-01T10:00:00.750000+00:00")
+        offsets = [
+            (None, None), (0.2, None), (None, 59.9), (30.5, 400.25), (-5, None),
+            (None, -0.5), (179.999999, None), (3600, 10), (None, 181),
+        ]
+        reads = list(UserSlideRead.objects.order_by("id"))
+        for i, (collapsed, read) in enumerate(offsets):
+            UserSlideReadSession.objects.create(
+                slide_read=reads[i % len(reads)], expanded=start,
+                collapsed=start + timedelta(seconds=collapsed) if collapsed is not None else None,
+                read=start + timedelta(seconds=read) if read is not None else None,
+            )
+
+    def test_annotation_matches_python_method(self):
+        for cap in (None, 180):
+            sessions = UserSlideReadSession.objects.with_read_duration(cap=cap).order_by("id")
+            expected = [
+                min(s.read_duration(), cap) if cap else s.read_duration() for s in sessions
+            ]
+            self.assertEqual([s.duration for s in sessions], expected)
+
+    def test_slide_read_time_sums_capped_sessions_per_page(self):
+        slide_time, opened = views.calculate_slide_read_time()
+        expected = {}
+        for session in UserSlideReadSession.objects.select_related("slide_read"):
+            page_id = session.slide_read.slide.pages.first().id
+            expected[page_id] = expected.get(page_id, 0) + min(session.read_duration(), 180)
+        self.assertEqual(slide_time, expected)
+        self.assertEqual(opened, {1: {10, 11, 12}, 2: {20, 21, 22}})
+
+class FeatureFrameTests(TestCase):
+    def setUp(self):
+        payload = cohort_payload(students=4, pages=3)
+        rng = random.Random(12)
+        start = parse_datetime("2025-05-01T11:00:00+00:00")
+        payload["attempts"], payload["attempt_details"] = [], []
+        for attempt_id in range(1, 200):
+            viewed = start + timedelta(microseconds=rng.randrange(10 ** 9))
+            answer = timedelta(microseconds=rng.randrange(-10 ** 7, 2 * 10 ** 8))
+            payload["attempts"].append({
+                "id": attempt_id, "user": rng.randint(1, 4), "question": rng.randint(1, 3),
+                "viewed": viewed.isoformat() if rng.random() > 0.1 else None,
+                "correct": (viewed + answer).isoformat() if rng.random() > 0.3 else None,
+            })
+            if rng.random() < 0.3:
+                payload["attempt_details"].append({
+                    "id": attempt_id, "attempt": attempt_id, "is_correct": rng.random() > 0.5,
+                    "timestamp": viewed.isoformat(),
+                })
+        ingest_payload(payload)
+
+    def test_attempt_metrics_match_view_functions(self):
+        metrics = features.attempt_metrics(features.attempt_frame())
+        self.assertEqual(len(metrics), 12)
+        for (student_id, page_id), row in metrics.iterrows():
+            attempts = RevisionQuestionAttempt.objects.filter(user_id=student_id, question__textbook_page_id=page_id)
+            self.assertEqual(row["first_attempt_accuracy"], views.calculate_first_attempt_accuracy(attempts))
+            self.assertEqual(row["overall_accuracy"], views.calculate_overall_accuracy(attempts))
+            self.assertEqual(row["recall_fluency"], views.calculate_recall_fluency(attempts))
+
+    def test_scaling_curves_match_view_functions(self):
+        seconds = [None, -1, 0, 4.99, 5, 5.000001, 17.3, 32.5, 59.99, 60, 60.01, 600]
+        seconds += [5 + 55 * n / 2000 for n in range(2001)]
+        self.assertEqual(
+            list(features.scale_recall_fluency([np.nan if s is None else s for s in seconds])),
+            [views.scale_recall_fluency(s) for s in seconds],
+        )
+        totals = [(None, 3), (30, None), (30, 0), (30, 3), (31, 3), (95, 1), (540, 3), (541, 3), (1e6, 7)]
+        totals += [(n, 17) for n in range(0, 3200, 7)]
+        self.assertEqual(
+            list(features.scale_slide_time_with_slide_count(*zip(*[
+                (np.nan if t is None else t, np.nan if n is None else n) for t, n in totals
+            ]))),
+            [views.scale_slide_time_with_slide_count(t, n) for t, n in totals],
+        )
+
+    def test_fact_frame_matches_cube(self):
+        frame = features.fact_frame().set_index(["student_id", "page_id"])
+        # Columns named after a fact field must hold the cube's values for it
+        shared = [field.name for field in StudyEngagementFact._meta.fields if field.name in frame.columns]
+        self.assertEqual(shared, ["total_slide_time", "slides_opened_ratio", "total_slides", "score"])
+        build_olap_cube()
+        for fact in StudyEngagementFact.objects.select_related("content_dim"):
+            row = frame.loc[fact.student_id, fact.content_dim.page_id]
+            for name in shared:
+                self.assertEqual(row[name], getattr(fact, name), name)
+            self.assertEqual(
+                row["slide_time_score"], views.scale_slide_time_with_slide_count(fact.total_slide_time, fact.total_slides),
+            )
+            attempts = RevisionQuestionAttempt.objects.filter(
+                user_id=fact.student_id, question__textbook_page_id=fact.content_dim.page_id,
+            )
+            recall = views.calculate_recall_fluency(attempts)
+            self.assertEqual(row["calculated_first_attempt_accuracy"], views.calculate_first_attempt_accuracy(attempts))
+            self.assertEqual(row["calculated_overall_accuracy"], views.calculate_overall_accuracy(attempts))
+            self.assertEqual(row["calculated_recall_fluency"], recall)
+            self.assertEqual(row["recall_fluency_score"], views.scale_recall_fluency(recall))
+            self.assertEqual(row["total_questions_attempted"], attempts.count())
+        self.assertEqual(len(frame), StudyEngagementFact.objects.count())
+
+@skipUnless(connection.vendor == "sqlite", "Plans are checked with SQLite's EXPLAIN QUERY PLAN")
+class QueryPlanTests(TestCase):
+    """The hot paths must be served by indexes, not by reading whole tables."""
+
+    maxDiff = None
+
+    def setUp(self):
+        ingest_payload(cohort_payload(students=3))
+
+    def assertNoFullScans(self, func, *args, **kwargs):
+        self.assertEqual(find_full_scans(func, *args, **kwargs), {})
+
+    def test_page_metrics(self):
+        self.assertNoFullScans(views.compute_engagement_metrics, TextbookPage.objects.get(id=1))
+
+    def test_incremental_refresh(self):
+        build_olap_cube()
+        ingest_payload({"attempt_details": [
+            {"id": 999, "attempt": 102, "is_correct": True, "timestamp": "2025-05-02T10:00:00Z"},
+        ]})
+        self.assertNoFullScans(refresh_olap_cube)
+
+    def test_rollup_drill_down(self):
+        build_olap_cube()
+        self.assertNoFullScans(engagement_rollup, "subject", student_id=2)
+        self.assertNoFullScans(engagement_rollup, "section", student_id=2, subject="Software Engineering")
+        self.assertNoFullScans(engagement_rollup, "page", student_id=2, section_id=1)
+
+    def test_latest_grade_refresh(self):
+        keys = [(1, 1), (2, 3)]
+        self.assertNoFullScans(refresh_latest_grades, keys)
+        plans = [detail for _, plan in capture_plans(refresh_latest_grades, keys) for detail in plan]
+        self.assertTrue(any("writing_latest_grade_idx" in detail for detail in plans), plans)
+
+    def test_job_status_polling(self):
+        self.assertNoFullScans(self.client.get, reverse("engagement:check_olap_status"), {"kind": Job.IMPORT})
+
+    def test_detects_full_scans(self):
+        self.assertTrue(find_full_scans(lambda: list(WritingInteraction.objects.filter(page_id=1))))
+
+class LatestWritingGradeTests(TestCase):
+    def setUp(self):
+        self.payload = cohort_payload(students=2, pages=1)
+        ingest_payload(self.payload)
+
+    def interaction(self, interaction_id, grade, timestamp, user_id=1):
+        return {
+            "id": interaction_id, "user_id": user_id, "page_id": 1, "user_input": "essay",
+            "openai_response": "feedback", "grade": grade, "timestamp": timestamp,
+        }
+
+    def latest(self, user_id=1):
+        return LatestWritingGrade.objects.filter(user_id=user_id, page_id=1).values_list("interaction_id", "grade").first()
+
+    def test_backfilled_and_kept_current_at_import(self):
+        self.assertEqual(self.latest(), (101, 2))
+        ingest_payload({"writing_interactions": [self.interaction(500, 3, "2025-06-01T00:00:00Z")]})
+        self.assertEqual(self.latest(), (500, 3))
+        ingest_payload({"writing_interactions": [
+            self.interaction(501, 1, "2025-01-01T00:00:00Z"),  # Older than the current latest
+            self.interaction(502, None, "2025-07-01T00:00:00Z"),  # Newer but ungraded
+        ]})
+        self.assertEqual(self.latest(), (500, 3))
+
+    def test_falls_back_when_the_latest_loses_its_grade_or_moves(self):
+        ingest_payload({"writing_interactions": [self.interaction(500, 3, "2025-06-01T00:00:00Z")]})
+        ingest_payload({"writing_interactions": [self.interaction(500, None, "2025-06-01T00:00:00Z")]})
+        self.assertEqual(self.latest(), (101, 2))
+        ingest_payload({"writing_interactions": [self.interaction(101, 0, "2025-06-01T00:00:00Z", user_id=2)]})
+        self.assertIsNone(self.latest())
+        self.assertEqual(self.latest(user_id=2), (101, 0))
+
+class WritingTextTests(TestCase):
+    essay = "The observer pattern decouples subjects from the objects that react to them. " * 40
+
+    def setUp(self):
+        User.objects.create(id=7, username="user_7")
+        ingest_payload({"writing_interactions": [{
+            "id": 1, "user_id": 7, "page_id": 1, "user_input": self.essay,
+            "openai_response": "Good.", "grade": 3, "timestamp": "2025-05-01T12:00:00Z",
+        }]})
+
+    def test_text_is_stored_aside_and_loaded_on_demand(self):
+        interaction = WritingInteraction.objects.get(id=1)
+        with self.assertNumQueries(1):
+            self.assertEqual(interaction.user_input, self.essay)
+            self.assertEqual(interaction.openai_response, "Good.")
+        text = WritingInteractionText.objects.get(interaction_id=1)
+        self.assertLess(len(text.user_input_data), len(self.essay) // 4)  # Repetitive text compresses well
+        self.assertEqual(bytes(text.openai_response_data), b"tGood.")  # Too short to be worth compressing
+
+    def test_model_api_still_accepts_text(self):
+        interaction = WritingInteraction.objects.create(user_id=7, page_id=2, user_input="Draft", openai_response="")
+        interaction.openai_response = "Needs work"
+        interaction.save()
+        interaction = WritingInteraction.objects.select_related("text").get(id=interaction.id)
+        self.assertEqual((interaction.user_input, interaction.openai_response), ("Draft", "Needs work"))
+        with self.settings(WRITING_TEXT_COMPRESSION=False):
+            self.assertEqual(unpack_text(pack_text(self.essay)), self.essay)
+            self.assertEqual(pack_text(self.essay)[:1], b"t")
+
+    def test_admin_edits_text(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        url = reverse("admin:engagement_writinginteraction_change", args=[1])
+        self.assertContains(self.client.get(url), "observer pattern")
+        response = self.client.post(url, {
+            "user_id": 7, "page_id": 1, "user_input": "Rewritten", "openai_response": "Better.",
+            "grade": 3, "timestamp_0": "2025-05-01", "timestamp_1": "12:00:00",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(WritingInteraction.objects.get(id=1).user_input, "Rewritten")
+
+class WritingTextMigrationTests(TransactionTestCase):
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("engagement", target)])
+        return executor.loader.project_state(("engagement", target)).apps
+
+    def test_text_moves_back_when_migrating_backwards(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes("engagement")[0][1]
+        self.addCleanup(self.migrate, latest)
+        apps = self.migrate("0011_writing_interaction_text")
+        apps.get_model("engagement", "WritingInteraction").objects.create(id=1, user_id=7, page_id=1)
+        apps.get_model("engagement", "WritingInteractionText").objects.create(
+            interaction_id=1, user_input_data=pack_text("Essay " * 50), openai_response_data=pack_text("Good."),
+        )
+        apps = self.migrate("0010_latest_writing_grade")
+        interaction = apps.get_model("engagement", "WritingInteraction").objects.get(id=1)
+        self.assertEqual((interaction.user_input, interaction.openai_response), ("Essay " * 50, "Good."))
+        apps = self.migrate("0011_writing_interaction_text")
+        text = apps.get_model("engagement", "WritingInteractionText").objects.get(interaction_id=1)
+        self.assertEqual(unpack_text(text.user_input_data), "Essay " * 50)
+
+class TrainingDatasetTests(TestCase):
+    def setUp(self):
+        dataset_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(dataset_dir.cleanup)
+        self.dataset_dir = Path(dataset_dir.name)
+        for name, path in [("DATASET_DIR", self.dataset_dir), ("LEGACY_TRAINING_CSV", self.dataset_dir / "training_data.csv")]:
+            patcher = mock.patch(f"engagement.datasets.{name}", path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        ingest_payload(cohort_payload(students=4))
+        build_olap_cube()
+
+    def test_export_select_and_load_memory_mapped(self):
+        self.assertEqual(datasets.export_engagement(), 12)
+        exported = datasets.read_dataset(datasets.ENGAGEMENT)
+        self.assertEqual(exported["score"].dtype, np.int16)
+        self.assertEqual(datasets.select_training_set(), 12)
+        X, y = datasets.load_training_set()
+        self.assertEqual(list(X.columns), datasets.FEATURES)
+        for column in [X.to_numpy(), y.to_numpy()]:
+            while isinstance(column, np.ndarray):
+                column = column.base
+            self.assertIsInstance(column, mmap.mmap)
+        facts = StudyEngagementFact.objects.order_by("id")
+        self.assertEqual(list(y), [fact.score for fact in facts])
+        self.assertEqual(list(X["total_slide_time"]), [fact.total_slide_time for fact in facts])
+        self.assertEqual(list(X["recall_fluency"]), [fact.recall_fluency for fact in facts])
+
+    def test_rewrite_replaces_the_dataset_and_legacy_csv_is_converted(self):
+        datasets.export_engagement()
+        StudyEngagementFact.objects.filter(student_id=1).delete()
+        self.assertEqual(datasets.export_engagement(), 9)
+        self.assertEqual(sorted(path.name for path in self.dataset_dir.iterdir()), ["engagement"])
+
+        (self.dataset_dir / "training_data.csv").write_text(
+            ",".join(datasets.FEATURES + ["score"]) + "\n30,0.5,1.0,1.0,2.5,4,3\n"
+        )
+        X, y = datasets.load_training_set()
+        self.assertEqual(X.values.tolist(), [[30, 0.5, 1.0, 1.0, 2.5, 4]])
+        self.assertEqual(list(y), [3])
+
+class EngagementCsvDownloadTests(TestCase):
+    def download(self, students, **params):
+        StudyEngagementFact.objects.all().delete()
+        ingest_payload(cohort_payload(students=students))
+        build_olap_cube()
+        response = self.client.get(reverse("engagement:download_engagement_csv"), params)
+        with CaptureQueriesContext(connection) as queries:
+            body = b"".join(response.streaming_content)
+        return response, body, len(queries)
+
+    def test_streams_every_fact_in_one_query(self):
+        with mock.patch.object(views, "EXPORT_CHUNK_SIZE", 5):
+            _, small, small_queries = self.download(students=2)
+            response, body, queries = self.download(students=9)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual((small_queries, queries), (1, 1))
+        rows = body.decode().splitlines()
+        self.assertEqual(rows[0], ",".join(views.EXPORT_COLUMNS))
+        self.assertEqual(len(rows), 1 + StudyEngagementFact.objects.count())
+        fact = StudyEngagementFact.objects.order_by("id").select_related("content_dim__page").first()
+        self.assertEqual(rows[1].split(",")[:3], [str(fact.student_id), fact.content_dim.page.page_title, str(fact.total_slide_time)])
+
+    def test_gzip_on_the_fly(self):
+        _, plain, _ = self.download(students=3)
+        response, body, _ = self.download(students=3, gzip="1")
+        self.assertIn('student_engagement.csv.gz"', response["Content-Disposition"])
+        self.assertEqual(gzip.decompress(body), plain)
+
+    def test_homepage_labels_each_download(self):
+        page = self.client.get(reverse("engagement:homepage")).content.decode()
+        url = reverse("engagement:download_engagement_csv")
+        self.assertIn(f'<a href="{url}">Download as CSV</a>', page)
+        self.assertIn(f'<a href="{url}?gzip=1">Download as gzipped CSV (.csv.gz)</a>', page)
+
+class TrainingSetTestCase(TestCase):
+    """Writes a small random training set and keeps models, plots and reports in a throwaway directory."""
+
+    def setUp(self):
+        output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(output_dir.cleanup)
+        self.output_dir = Path(output_dir.name)
+        for patcher in [
+            mock.patch("engagement.datasets.DATASET_DIR", self.output_dir),
+            mock.patch("engagement.registry.REGISTRY_DIR", self.output_dir / "registry"),
+            mock.patch("engagement.training.REPORT", str(self.output_dir / "report.json")),
+            mock.patch("engagement.tuning.REPORT", str(self.output_dir / "tuning.json")),
+            mock.patch("engagement.training.plot_linear_visuals"),
+            mock.patch("engagement.training.save_tree_artifacts"),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        rng = np.random.default_rng(3)
+        frame = {name: rng.random(60) for name in datasets.FEATURES}
+        frame["score"] = (frame["slides_opened_ratio"] * 3).round()
+        datasets.write_dataset(datasets.TRAINING, pd.DataFrame(frame), matrix=datasets.FEATURES)
+
+class TrainingPipelineTests(TrainingSetTestCase):
+    def test_models_share_one_split_and_report(self):
+        report = training.train_all_models(max_workers=2)
+        self.assertEqual((report["rows"], report["train_rows"], report["test_rows"]), (60, 48, 12))
+        self.assertEqual(set(report["models"]), {"forest", "linear", "tree"})
+        X, y = datasets.load_training_set()
+        train_index, _ = train_test_split(np.arange(60), test_size=0.2, random_state=42)
+        linear = registry.load_model("linear")
+        expected = LinearRegression().fit(X.iloc[train_index], y.iloc[train_index])
+        np.testing.assert_allclose(linear.coef_, expected.coef_)
+        self.assertEqual(json.loads((self.output_dir / "report.json").read_text()), report)
+        self.assertEqual(training.train_all_models(models=["linear"], max_workers=1)["models"]["linear"]["coefficients"],
+                         report["models"]["linear"]["coefficients"])
+
+    def test_invalid_training_set_is_rejected(self):
+        frame = {name: np.ones(60) for name in datasets.FEATURES}
+        frame["score"] = np.full(60, np.nan)
+        with self.assertRaisesMessage(ValueError, "Column score has missing values"):
+            datasets.write_dataset(datasets.TRAINING, pd.DataFrame(frame))
+        frame["score"], frame["recall_fluency"] = np.ones(60), np.full(60, np.inf)
+        datasets.write_dataset(datasets.TRAINING, pd.DataFrame(frame), matrix=datasets.FEATURES)
+        with self.assertRaisesMessage(ValueError, "missing or infinite"):
+            training.train_all_models()
+        with self.assertRaisesMessage(ValueError, "Unknown models"):
+            training.train_all_models(models=["svm"])
+
+class TuningTests(TrainingSetTestCase):
+    def test_successive_halving_keeps_the_best_third(self):
+        report = tuning.tune_models(models=["tree"], cv=3)
+        rounds = report["models"]["tree"]["rounds"]
+        self.assertEqual([r["candidates"] for r in rounds], [24, 8, 3])
+        self.assertEqual([r["samples"] for r in rounds], [6, 18, 54])
+        for previous, current in zip(rounds, rounds[1:]):
+            kept = [entry["params"] for entry in previous["cv_mse"][:current["candidates"]]]
+            self.assertCountEqual([entry["params"] for entry in current["cv_mse"]], kept)
+        best = report["models"]["tree"]["best_params"]
+        self.assertEqual(best, rounds[-1]["cv_mse"][0]["params"])
+        model = registry.load_model("tree")
+        self.assertEqual(model.get_params()["max_depth"], best["max_depth"])
+        self.assertEqual(json.loads((self.output_dir / "tuning.json").read_text())["models"]["tree"]["best_params"], best)
+
+    def test_time_budget_stops_after_the_current_round(self):
+        report = tuning.tune_models(models=["tree"], cv=3, time_budget=1e-6)
+        self.assertEqual(len(report["models"]["tree"]["rounds"]), 1)
+        with self.assertRaisesMessage(ValueError, "No search space"):
+            tuning.tune_models(models=["linear"])
+
+class ModelRegistryTests(TrainingSetTestCase):
+    def test_training_registers_hashed_versions_with_metadata(self):
+        report = training.train_all_models(models=["linear"], max_workers=1)
+        version = ModelVersion.objects.get(active=True, name="linear")
+        self.assertEqual(report["models"]["linear"]["version"], version.sha256)
+        self.assertTrue(registry.artifact_path(version.sha256).exists())
+        self.assertEqual(version.features, datasets.FEATURES)
+        self.assertEqual(version.training_set_sha256, datasets.read_schema(datasets.TRAINING)["sha256"])
+        self.assertEqual(version.metrics["r2"], report["models"]["linear"]["r2"])
+        self.assertEqual(
+            sorted(p.name for p in (self.output_dir / "registry").iterdir()),
+            [f"{version.sha256}.joblib", f"{version.sha256}.npz"],
+        )
+
+    def test_activation_swaps_and_rolls_back(self):
+        first = registry.register_model("linear", LinearRegression().fit([[0], [1]], [0, 1]), features=["x"])
+        second = registry.register_model("linear", LinearRegression().fit([[0], [1]], [0, 2]), features=["x"])
+        self.assertEqual(list(ModelVersion.objects.filter(active=True)), [second])
+        self.assertEqual(round(registry.load_model("linear").coef_[0]), 2)
+        self.assertEqual(registry.rollback("linear"), first)
+        self.assertEqual(round(registry.load_model("linear").coef_[0]), 1)
+        self.assertEqual(ModelVersion.objects.filter(active=True).count(), 1)
+        with self.assertRaisesMessage(FileNotFoundError, "No forest model"), \
+                mock.patch.dict(registry.LEGACY_ARTIFACTS, {"forest": str(self.output_dir / "missing.joblib")}):
+            registry.load_model("forest")
+
+    def test_model_saved_before_the_registry_is_imported_once(self):
+        legacy_path = self.output_dir / "tree_model.joblib"
+        joblib.dump(LinearRegression().fit([[0], [1]], [0, 3]), legacy_path)
+        with mock.patch.dict(registry.LEGACY_ARTIFACTS, {"tree": str(legacy_path)}):
+            self.assertEqual(round(registry.load_model("tree").coef_[0]), 3)
+            self.assertEqual(round(registry.load_model("tree").coef_[0]), 3)
+        version = ModelVersion.objects.get()
+        self.assertEqual(version.metrics, {"imported_from": str(legacy_path)})
+        self.assertTrue(legacy_path.exists())
+
+    def test_registered_files_get_the_mode_the_umask_allows(self):
+        umask = os.umask(0o027)
+        self.addCleanup(os.umask, umask)
+        version = registry.register_model("linear", LinearRegression().fit([[0], [1]], [0, 1]), features=["x"])
+        for path in (registry.artifact_path(version.sha256), registry.compiled_path(version.sha256)):
+            self.assertEqual(path.stat().st_mode & 0o777, 0o640, path)
+
+class ReportPathTests(TestCase):
+    def test_reports_are_written_under_base_dir_whatever_the_cwd(self):
+        self.assertEqual(training.REPORT, Path(settings.BASE_DIR) / "training_report.json")
+        self.assertEqual(tuning.REPORT, Path(settings.BASE_DIR) / "tuning_report.json")
+
+class ModelCacheTests(TrainingSetTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.clear_model_cache()
+        self.addCleanup(registry.clear_model_cache)
+
+    def test_loaded_once_per_version(self):
+        first = registry.register_model("linear", LinearRegression().fit([[0], [1]], [0, 1]), features=["x"])
+        with mock.patch("engagement.registry.joblib.load", wraps=joblib.load) as load:
+            model = registry.load_model("linear")
+            self.assertIs(registry.load_model("linear"), model)
+            second = registry.register_model("linear", LinearRegression().fit([[0], [1]], [0, 2]), features=["x"])
+            self.assertEqual(round(registry.load_model("linear").coef_[0]), 2)
+            registry.load_model("linear")
+        # Twice to serve, once to compile the second version as it was registered
+        self.assertEqual(load.call_count, 3)
+        stats = registry.model_cache_stats()["linear"]
+        self.assertEqual((stats["hits"], stats["misses"], stats["version"]), (2, 2, second.sha256))
+        self.assertNotEqual(first.sha256, second.sha256)
+        self.assertEqual(self.client.get(reverse("engagement:model_cache_status")).json()["models"]["linear"]["hits"], 2)
+
+    def test_memory_mapped_load(self):
+        registry.register_model("linear", LinearRegression().fit(np.arange(20).reshape(10, 2), np.arange(10)))
+        with mock.patch("engagement.registry.MMAP_MODE", "r"):
+            model = registry.load_model("linear")
+        self.assertEqual(model.predict([[2, 3]]).round(6).tolist(), [1.0])
+
+    def test_tree_rules_are_reread_only_when_changed(self):
+        rules_path = self.output_dir / "tree_rules.txt"
+        rules_path.write_text("|--- first")
+        with mock.patch.object(views, "TREE_RULES_PATH", str(rules_path)), \
+                mock.patch.dict(views._tree_rules, {"mtime": None, "text": None}):
+            self.assertEqual(views.read_tree_rules(), "|--- first")
+            with mock.patch("builtins.open") as opened:
+                self.assertEqual(views.read_tree_rules(), "|--- first")
+            opened.assert_not_called()
+            rules_path.write_text("|--- second")
+            os.utime(rules_path, ns=(0, 10 ** 9))
+            self.assertEqual(views.read_tree_rules(), "|--- second")
+
+class CompiledModelTests(TrainingSetTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.clear_model_cache()
+        self.addCleanup(registry.clear_model_cache)
+        X, y = datasets.load_training_set()
+        X = pd.concat([X] * 20, ignore_index=True) * np.linspace(0.5, 1.5, len(X) * 20)[:, None]
+        y = pd.concat([y] * 20, ignore_index=True)
+        self.X_train, self.X_test, self.y_train, _ = train_test_split(X, y, test_size=0.3, random_state=0)
+
+    def test_predictions_match_scikit_learn_exactly(self):
+        for name in ("forest", "tree", "linear"):
+            model = fitting.ESTIMATORS[name]().fit(self.X_train, self.y_train)
+            f = io.BytesIO()
+            save_compiled(compile_model(model), f)
+            f.seek(0)
+            engine = load_compiled(f)
+            self.assertEqual(engine.predict(self.X_test).tolist(), model.predict(self.X_test).tolist(), name)
+            shuffled = self.X_test[self.X_test.columns[::-1]]
+            self.assertEqual(engine.predict(shuffled).tolist(), model.predict(self.X_test).tolist(), name)
+
+    def test_served_from_the_registry_without_scikit_learn(self):
+        model = fitting.ESTIMATORS["forest"]().fit(self.X_train, self.y_train)
+        version = registry.register_model("forest", model)
+        registry.compiled_path(version.sha256).unlink()
+        engine = registry.load_model("forest", compiled=True)
+        self.assertIsInstance(engine, CompiledModel)
+        self.assertIs(registry.load_model("forest", compiled=True), engine)
+        self.assertEqual(registry.model_cache_stats()["forest.compiled"]["hits"], 1)
+        rows = self.X_test.to_numpy()
+        script = (
+            "import sys, numpy as np; from engagement.compiled import load_compiled; "
+            f"print(load_compiled(sys.argv[1]).predict(np.array({rows.tolist()!r})).tolist()); "
+            "print('sklearn' in sys.modules)"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script, str(registry.compiled_path(version.sha256))],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        )
+        scores, imported = result.stdout.splitlines()
+        self.assertEqual(scores, str(model.predict(self.X_test).tolist()))
+        self.assertEqual(imported, "False")
+
+    def test_serving_hands_large_tree_batches_to_scikit_learn(self):
+        model = fitting.ESTIMATORS["forest"]().fit(self.X_train, self.y_train)
+        registry.register_model("forest", model)
+        _, serving = registry.load_serving("forest")
+        self.assertIs(registry.load_serving("forest")[1], serving)
+        small, large = self.X_test[:registry.COMPILED_MAX_ROWS], self.X_test[:registry.COMPILED_MAX_ROWS + 1]
+        self.assertEqual(serving.predict(small).tolist(), model.predict(small).tolist())
+        self.assertIsNone(serving._model)
+        self.assertEqual(serving.predict(large).tolist(), model.predict(large).tolist())
+        self.assertIsNotNone(serving._model)
+        registry.register_model("linear", fitting.ESTIMATORS["linear"]().fit(self.X_train, self.y_train))
+        _, serving = registry.load_serving("linear")
+        serving.predict(self.X_test)
+        self.assertIsNone(serving._model)
+
+class BatchScoringTests(TrainingSetTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.clear_model_cache()
+        self.addCleanup(registry.clear_model_cache)
+        ingest_payload(cohort_payload(students=5))
+        build_olap_cube()
+        X, y = datasets.load_training_set()
+        self.version = registry.register_model("forest", LinearRegression().fit(X * 40, y * 1.5))
+
+    def test_scores_every_fact_in_chunks_like_the_predict_form(self):
+        result = scoring.score_facts(chunk_size=4)
+        self.assertEqual(result, {"model": "forest", "version": self.version.sha256, "scored": 15})
+        model = registry.load_model("forest")
+        for fact in StudyEngagementFact.objects.select_related("prediction"):
+            features = [getattr(fact, name) for name in datasets.FEATURES]
+            score = round(model.predict(pd.DataFrame([features], columns=datasets.FEATURES))[0], 2)
+            self.assertEqual(fact.prediction.score, score)
+            self.assertEqual(fact.prediction.label, views.categorise_score(score)[0])
+            self.assertEqual(fact.prediction.model_version, self.version)
+
+    def test_labels_match_categorise_score_at_the_boundaries(self):
+        scores = [-1, 0.99, 1.0, 1.99, 2.0, 2.79, 2.8, 3.5]
+        self.assertEqual(list(scoring.score_labels(scores)), [views.categorise_score(s)[0] for s in scores])
+
+    def test_filtered_rescore_updates_in_place_and_dashboard_reads_results(self):
+        scoring.score_facts()
+        newer = registry.register_model("forest", LinearRegression().fit([[0] * 6, [1] * 6], [0, 3]))
+        self.assertEqual(scoring.score_facts(student_id=2)["scored"], 3)
+        self.assertEqual(EngagementPrediction.objects.count(), 15)
+        self.assertEqual(EngagementPrediction.objects.filter(model_version=newer).count(), 3)
+        rows = self.client.get(reverse("engagement:engagement_predictions"), {"student": 2}).json()["predictions"]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row["model_version"] for row in rows}, {newer.sha256})
+        self.assertEqual({row["student_id"] for row in rows}, {2})
+
+    def test_predictions_limit_is_positive_and_capped(self):
+        scoring.score_facts()
+        url = reverse("engagement:engagement_predictions")
+        for limit in (0, -1):
+            self.assertEqual(self.client.get(url, {"limit": limit}).status_code, 400, limit)
+        self.assertEqual(len(self.client.get(url, {"limit": 4}).json()["predictions"]), 4)
+        with mock.patch.object(views, "PREDICTIONS_LIMIT", 5):
+            self.assertEqual(len(self.client.get(url, {"limit": 10 ** 9}).json()["predictions"]), 5)
+
+class CountingModel:
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(len(X))
+        return X["total_slides"].to_numpy() * 2
+
+class PredictApiTests(TrainingSetTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.clear_model_cache()
+        self.addCleanup(registry.clear_model_cache)
+        ingest_payload(cohort_payload(students=5))
+        build_olap_cube()
+        X, y = datasets.load_training_set()
+        self.version = registry.register_model("forest", LinearRegression().fit(X * 40, y * 1.5))
+
+    def post(self, body):
+        return self.client.post(reverse("engagement:predict_api"), json.dumps(body), content_type="application/json")
+
+    def test_concurrent_calls_share_one_predict(self):
+        batcher = MicroBatcher(window=0.5)
+        model = CountingModel()
+        results = {}
+        def predict(n):
+            results[n] = batcher.predict("v1", model, [[0, 0, 0, 0, 0, n]] * n).tolist()
+        threads = [threading.Thread(target=predict, args=(n,)) for n in (1, 2, 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(model.calls, [6])
+        self.assertEqual(results, {1: [2.0], 2: [4.0, 4.0], 3: [6.0, 6.0, 6.0]})
+        self.assertEqual(batcher.stats, {"batches": 1, "requests": 3, "rows": 6})
+
+    def test_predict_errors_reach_every_caller(self):
+        batcher = MicroBatcher(window=0)
+        with self.assertRaises(ValueError):
+            batcher.predict("v1", CountingModel(), [[1, 2]])
+
+    def test_features_and_keys_match_the_predict_form(self):
+        fact = StudyEngagementFact.objects.select_related("content_dim").get(student_id=2, content_dim__page_id=3)
+        features = {name: getattr(fact, name) for name in datasets.FEATURES}
+        response = self.post({"instances": [features, list(features.values())], "keys": [{"student": 2, "page": 3}]})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["model"], body["version"]), ("forest", self.version.sha256))
+        score = round(registry.load_model("forest").predict(pd.DataFrame([features], columns=datasets.FEATURES))[0], 2)
+        expected = {
+            "score": score, "label": views.categorise_score(score)[0],
+            "hint": views.interpret_tree_path(fact.slides_opened_ratio, fact.recall_fluency),
+        }
+        self.assertEqual(body["predictions"], [expected] * 3)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get(reverse("engagement:predict_api")).status_code, 405)
+        self.assertEqual(self.post({"keys": [{"student": 99, "page": 1}]}).status_code, 404)
+        for body in [{}, {"instances": [[1, 2]]}, {"instances": [["a"] * 6]}, {"keys": [{"student": 1}]},
+                     {"model": "tree", "instances": [[0] * 6]}]:
+            self.assertEqual(self.post(body).status_code, 400, body)
+        registry.ModelVersion.objects.filter(name="forest").update(active=False)
+        with mock.patch.dict(registry.LEGACY_ARTIFACTS, clear=True):
+            self.assertEqual(self.post({"instances": [[0] * 6]}).status_code, 503)
+
+    def test_prediction_failures_are_json_errors(self):
+        for error, status in [(ValueError("X has 5 features"), 400), (FileNotFoundError("Model file is gone"), 503)]:
+            model = mock.Mock()
+            model.predict.side_effect = error
+            with mock.patch("engagement.registry.load_serving", return_value=(self.version, model)):
+                response = self.post({"instances": [[0] * 6]})
+            self.assertEqual(response.status_code, status, error)
+            self.assertIn(str(error), response.json()["error"])
+
+    def test_batch_timeout_is_a_json_503(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        model = mock.Mock()
+        model.predict.side_effect = lambda X: release.wait() and np.zeros(len(X))
+        with mock.patch("engagement.registry.load_serving", return_value=(self.version, model)), \
+                mock.patch("engagement.batching.batcher", MicroBatcher(window=0, timeout=0.05)):
+            response = self.post({"instances": [[0] * 6]})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {"error": "Prediction timed out, try again."})
+
+    def test_load_test_command_checks_its_latency_targets(self):
+        # The server threads can't see this test's transaction, so they get the model without the registry
+        served = mock.patch("engagement.registry.load_serving", return_value=(self.version, CountingModel()))
+        served.start()
+        self.addCleanup(served.stop)
+        out = io.StringIO()
+        call_command("loadtest_predict", clients=2, requests=4, p50=60000, p99=60000, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[1] for line in lines[:2]], ["batching=off", "batching=on"])
+        self.assertEqual(lines[2], "All latency targets met.")
+        with self.assertRaisesMessage(CommandError, "batching on: p99"):
+            call_command("loadtest_predict", clients=2, requests=4, batching="on", p99=0, stdout=io.StringIO())
+
+class StartupImportTests(TestCase):
+    def test_booting_django_does_not_load_the_ml_stack(self):
+        script = (
+            "import sys, django; django.setup(); import ml_project.urls; "
+            "print(sorted({name.split('.')[0] for name in sys.modules} & "
+            "{'numpy', 'pandas', 'sklearn', 'matplotlib', 'joblib', 'requests'}))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "ml_project.settings"},
+        )
+        self.assertEqual(result.stdout.strip(), "[]")
+
+    def test_plotting_modules_use_the_agg_backend_whatever_the_default(self):
+        # A GUI default would fail when plotting from a job thread; an unknown one fails on import
+        script = (
+            "import django; django.setup(); import matplotlib; "
+            "from engagement import linear_model, plot_linear_regression; print(matplotlib.get_backend())"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "ml_project.settings", "MPLBACKEND": "module://no_such_backend"},
+        )
+        self.assertEqual(result.stdout.strip().lower(), "agg")
@@ -0,0 +1,130 @@
+import json
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .json_stream import CHUNK_SIZE, iter_arrays
+logger = logging.getLogger(__name__)
+
+TIMEOUT = (5, 30)  # (connect, read between bytes) in seconds
+RETRIES = 3
+BACKOFF_FACTOR = 0.5  # waits 0.5s, 1s, 2s, ... between attempts
+MAX_WORKERS = 4
+POOL_SIZE = 8
+METRICS_KEPT = 500
+
+RequestMetric = namedtuple("RequestMetric", ["url", "status", "elapsed", "bytes"])
+
+class TextbookClient:
+    """HTTP client for the textbook data API.
+
+    Keeps one pooled session so repeated imports reuse their TCP/TLS
+    connections, retries connection errors and 429/5xx responses with
+    exponential backoff, and records latency and size of every request.
+
+    Paginated exports report ``total_pages`` at the top level of the first
+    response; the remaining pages are requested with a ``page`` parameter,
+    at most ``max_workers`` at a time, and handed back in page order.
+    """
+
+    def __init__(self, timeout=TIMEOUT, retries=RETRIES, backoff_factor=BACKOFF_FACTOR,
+                 max_workers=MAX_WORKERS, pool_size=POOL_SIZE):
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.metrics = deque(maxlen=METRICS_KEPT)
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _record(self, response, started, size):
+        metric = RequestMetric(response.url, response.status_code, time.perf_counter() - started, size)
+        self.metrics.append(metric)
+        logger.info("GET %s -> %s in %.3fs (%d bytes)", *metric)
+
+    def get(self, url, params=None, headers=None, cookies=None):
+        started = time.perf_counter()
+        response = self.session.get(url, params=params, headers=headers, cookies=cookies, timeout=self.timeout)
+        response.raise_for_status()
+        self._record(response, started, len(response.content))
+        return response
+
+    def stream_chunks(self, url, params=None, headers=None, cookies=None):
+        started = time.perf_counter()
+        response = self.session.get(
+            url, params=params, headers=headers, cookies=cookies, timeout=self.timeout, stream=True,
+        )
+        size = 0
+        with response:
+            response.raise_for_status()
+            try:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    size += len(chunk)
+                    yield chunk
+            finally:
+                self._record(response, started, size)
+
+    def remaining_pages(self, total_pages, url, params=None, headers=None, cookies=None):
+        pages = iter(range(2, (total_pages or 1) + 1))
+
+        def fetch(page):
+            return self.get(url, {**(params or {}), "page": page}, headers, cookies).content
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            window = deque(pool.submit(fetch, page) for page in islice(pages, self.max_workers))
+            while window:
+                body = window.popleft().result()
+                next_page = next(pages, None)
+                if next_page is not None:
+                    window.append(pool.submit(fetch, next_page))
+                yield body
+
+    def fetch_json(self, url, params=None, headers=None, cookies=None):
+        """Fetch the whole export and merge the arrays of every page into one dict."""
+        data = self.get(url, params, headers, cookies).json()
+        for body in self.remaining_pages(data.get("total_pages"), url, params, headers, cookies):
+            for key, value in json.loads(body).items():
+                if isinstance(value, list):
+                    data.setdefault(key, []).extend(value)
+        return data
+
+    def iter_pages(self, url, params=None, headers=None, cookies=None):
+        """Yield each page of the export as lazily parsed ``(key, records)`` pairs.
+
+        The first page is streamed straight off the socket. Every page has to be
+        consumed before the next is requested.
+        """
+        meta = {}
+        yield iter_arrays(self.stream_chunks(url, params, headers, cookies), meta)
+        for body in self.remaining_pages(meta.get("total_pages"), url, params, headers, cookies):
+            yield iter_arrays([body])
+
+    def summary(self):
+        metrics = list(self.metrics)
+        return {
+            "requests": len(metrics),
+            "bytes": sum(metric.bytes for metric in metrics),
+            "elapsed": round(sum(metric.elapsed for metric in metrics), 3),
+        }
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_textbook_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = TextbookClient()
+        return _client
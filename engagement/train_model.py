@@ -1,23 +1,16 @@
-import pandas as pd
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score
-import joblib
+from .datasets import FEATURES, TRAINING, load_training_set, read_schema
+from .registry import register_model
 
 def train_model():
     # Step 1: Load the data
-    df = pd.read_csv("training_data.csv")
-    print("Dataset shape:", df.shape)
+    X, y = load_training_set()
+    print("Dataset shape:", X.shape)
 
     # Step 2: Define features and target
-    features = [
-        "total_slide_time", "slides_opened_ratio", "first_attempt_accuracy",
-        "overall_accuracy", "recall_fluency", "total_slides"
-    ]
-    target = "score"
-
-    X = df[features]
-    y = df[target]
+    features = FEATURES
 
     # Step 3: Split the dataset
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -41,8 +34,10 @@ def train_model():
     print(f"Mean Squared Error (MSE): {mse:.2f}")
     print(f"R² Score: {r2:.2f}")
 
-    # Step 9: Save the trained model to disk
-    joblib.dump(model, "ml_model.joblib")
-    print("\nModel saved as ml_model.joblib")
+    # Step 9: Register the trained model and make it the active one
+    version = register_model(
+        "forest", model, metrics={"mse": mse, "r2": r2}, training_set_sha256=read_schema(TRAINING).get("sha256", ""),
+    )
+    print(f"\nModel registered as {version}")
 
     return {feature: round(importance, 4) for feature, importance in zip(features, importances)}
@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from sklearn.model_selection import train_test_split
+from .datasets import FEATURES, MATRIX, TARGET, TRAINING, dataset_path, load_training_set, read_schema
+from .fitting import ESTIMATORS, fit
+from .linear_model import plot_linear_visuals
+from .registry import load_model, register_file, staging_path
+from .tree_model import save_tree_artifacts
+logger = logging.getLogger(__name__)
+
+REPORT = Path(settings.BASE_DIR) / "training_report.json"
+TEST_SIZE = 0.2
+MIN_ROWS = 10
+
+def validate_training_set(X, y):
+    if list(X.columns) != FEATURES:
+        raise ValueError(f"Training set columns {list(X.columns)} do not match {FEATURES}.")
+    if len(X) < MIN_ROWS:
+        raise ValueError(f"Training set has {len(X)} rows; at least {MIN_ROWS} are needed.")
+    if not np.isfinite(X.to_numpy()).all() or not np.isfinite(y.to_numpy()).all():
+        raise ValueError("Training set contains missing or infinite values.")
+
+def train_all_models(models=tuple(ESTIMATORS), max_workers=None, job=None):
+    """Fit ``models`` on one shared train/test split in parallel worker processes.
+
+    The training set is loaded and validated once; each worker memory-maps
+    it, fits on the same rows and saves its model, which is then registered
+    and activated. Plots and the combined metrics report
+    (training_report.json) are written as the fits finish.
+    Without ``max_workers`` there is one worker per model, up to the CPU
+    count.
+    """
+    unknown = set(models) - set(ESTIMATORS)
+    if unknown:
+        raise ValueError(f"Unknown models: {sorted(unknown)}")
+    start = time.perf_counter()
+    X, y = load_training_set()
+    validate_training_set(X, y)
+    train_index, test_index = train_test_split(np.arange(len(X)), test_size=TEST_SIZE, random_state=42)
+    path = dataset_path(TRAINING)
+    training_set_sha256 = read_schema(TRAINING).get("sha256", "")
+    args = (str(path / MATRIX), str(path / f"{TARGET}.npy"), FEATURES, train_index, test_index)
+    report = {"rows": len(X), "train_rows": len(train_index), "test_rows": len(test_index), "models": {}}
+    workers = max_workers or min(len(models), os.cpu_count() or 1)
+    for done, (name, staged, metrics) in enumerate(_fit_all(models, args, workers), 1):
+        version = register_file(name, staged, metrics=metrics, training_set_sha256=training_set_sha256)
+        save_plots(name, X, y)
+        report["models"][name] = {**metrics, "version": version.sha256}
+        logger.info("Trained %s: %s", name, metrics)
+        if job:
+            job.report(done / (len(models) + 1), f"Trained {name}")
+    report["workers"] = workers
+    report["wall_seconds"] = round(time.perf_counter() - start, 3)
+    report["fit_seconds_total"] = round(sum(m["fit_seconds"] for m in report["models"].values()), 3)
+    with open(REPORT, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def _fit_all(models, args, workers):
+    # Each model is dumped to its staging file, which the caller registers; leftovers of failed fits are removed
+    staged = {name: staging_path(name) for name in models}
+    try:
+        if workers == 1:
+            # Starting a worker costs a fresh sklearn import; with one core it only adds to the wall time
+            for name in models:
+                yield name, staged[name], fit(name, *args, staged[name])
+            return
+        # Spawned, not forked: the parent may be a threaded job worker holding database connections
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+            futures = {pool.submit(fit, name, *args, staged[name]): name for name in models}
+            for future in as_completed(futures):
+                name = futures[future]
+                yield name, staged[name], future.result()
+    finally:
+        for path in staged.values():
+            if os.path.exists(path):
+                os.unlink(path)
+
+def save_plots(name, X, y):
+    if name == "linear":
+        model = load_model(name)
+        plot_linear_visuals(X, y, model, FEATURES, model.predict(X))
+    elif name == "tree":
+        save_tree_artifacts(load_model(name), FEATURES)
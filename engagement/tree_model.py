@@ -1,29 +1,27 @@
-import pandas as pd
 from sklearn.tree import DecisionTreeRegressor, plot_tree, export_text
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import joblib
 import os
+from .datasets import FEATURES, TRAINING, load_training_set, read_schema
+from .registry import register_model
 
 def train_and_visualise_tree():
-    df = pd.read_csv("training_data.csv")
-
-    features = [
-        "total_slide_time", "slides_opened_ratio", "first_attempt_accuracy",
-        "overall_accuracy", "recall_fluency", "total_slides"
-    ]
-    target = "score"
-
-    X = df[features]
-    y = df[target]
+    X, y = load_training_set()
+    features = FEATURES
 
     tree_model = DecisionTreeRegressor(max_depth=4, random_state=42)
     tree_model.fit(X, y)
 
-    # Save the model
-    joblib.dump(tree_model, "tree_model.joblib")
+    # Register the model and make it the active one
+    register_model("tree", tree_model, training_set_sha256=read_schema(TRAINING).get("sha256", ""))
+
+    save_tree_artifacts(tree_model, features)
+
+    print("Tree trained, saved, and visualized.")
+
 
+def save_tree_artifacts(tree_model, features):
     # Plot the tree
     plt.figure(figsize=(20, 10))
     plot_tree(tree_model, feature_names=features, filled=True, rounded=True)
@@ -37,5 +35,3 @@ def train_and_visualise_tree():
     RULES_PATH = os.path.join(os.path.dirname(__file__), "static", "images", "tree_rules.txt")
     with open(RULES_PATH, "w") as f:
         f.write(rules)
-
-    print("Tree trained, saved, and visualized.")
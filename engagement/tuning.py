@@ -0,0 +1,118 @@
+import json
+import logging
+import math
+import time
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from joblib import Parallel, delayed
+from sklearn.model_selection import KFold, ParameterGrid
+from .datasets import FEATURES, TRAINING, load_training_set, read_schema
+from .fitting import ESTIMATORS, fold_error, summary
+from .registry import register_model
+from .training import save_plots, validate_training_set
+logger = logging.getLogger(__name__)
+
+REPORT = Path(settings.BASE_DIR) / "tuning_report.json"
+SEARCH_SPACES = {
+    "forest": {
+        "max_depth": [None, 4, 8, 16],
+        "min_samples_leaf": [1, 5, 20],
+        "max_features": [1.0, "sqrt"],
+    },
+    "tree": {
+        "max_depth": [2, 3, 4, 6, 8, None],
+        "min_samples_leaf": [1, 5, 20, 50],
+    },
+}
+CV_FOLDS = 5
+FACTOR = 3  # Each round keeps the best third of the candidates on three times the rows
+
+def successive_halving(name, X, y, grid, cv=CV_FOLDS, factor=FACTOR, deadline=None, n_jobs=-1):
+    """Cross-validated successive halving over ``grid``; returns ``(best_params, rounds)``.
+
+    The first round scores every candidate on a small sample of rows; each
+    later round keeps the best 1/``factor`` and multiplies the sample by
+    ``factor``. The leader of the first round with at most ``factor``
+    candidates, or with every row, wins. Candidates
+    are ranked by mean fold MSE. Fold fits run on ``n_jobs`` processes. Once
+    ``deadline`` (a time.perf_counter() value) has passed no further round
+    is started, and the best candidate so far wins.
+    """
+    candidates = list(ParameterGrid(grid))
+    n_rounds = max(1, math.ceil(math.log(len(candidates), factor)))
+    rows = np.random.default_rng(42).permutation(len(X))
+    samples = min(len(X), max(cv * 2, len(X) // factor ** (n_rounds - 1)))
+    rounds = []
+    with Parallel(n_jobs=n_jobs) as parallel:
+        while True:
+            start = time.perf_counter()
+            sample = np.sort(rows[:samples])
+            folds = list(KFold(cv, shuffle=True, random_state=42).split(sample))
+            errors = parallel(
+                delayed(fold_error)(name, params, X, y, FEATURES, sample[train], sample[test])
+                for params in candidates for train, test in folds
+            )
+            scores = np.asarray(errors).reshape(len(candidates), cv).mean(axis=1)
+            ranked = [candidates[i] for i in np.argsort(scores, kind="stable")]
+            rounds.append({
+                "samples": len(sample),
+                "candidates": len(candidates),
+                "seconds": round(time.perf_counter() - start, 3),
+                "cv_mse": [
+                    {"params": params, "mse": float(score)}
+                    for params, score in sorted(zip(candidates, scores.tolist()), key=lambda pair: pair[1])
+                ],
+            })
+            logger.info("%s: %d candidates on %d rows", name, len(candidates), len(sample))
+            if len(candidates) <= factor or samples >= len(X):
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                logger.info("%s: time budget spent, stopping after %d rounds", name, len(rounds))
+                break
+            candidates = ranked[:math.ceil(len(candidates) / factor)]
+            samples = min(len(X), samples * factor)
+    return ranked[0], rounds
+
+def tune_models(models=tuple(SEARCH_SPACES), cv=CV_FOLDS, time_budget=None, n_jobs=-1, job=None):
+    """Search each model's hyperparameters and save the best, refitted on every row.
+
+    ``time_budget`` (seconds) is shared by all models; a search that runs
+    out stops after its current round. The chosen parameters, every
+    round's CV scores and the timings go to tuning_report.json, and each
+    model is registered and activated in place of the current one.
+    """
+    unknown = set(models) - set(SEARCH_SPACES)
+    if unknown:
+        raise ValueError(f"No search space for: {sorted(unknown)}")
+    start = time.perf_counter()
+    deadline = start + time_budget if time_budget else None
+    X, y = load_training_set()
+    validate_training_set(X, y)
+    matrix, target = X.to_numpy(), y.to_numpy()
+    training_set_sha256 = read_schema(TRAINING).get("sha256", "")
+    report = {"rows": len(X), "cv": cv, "time_budget": time_budget, "models": {}}
+    for done, name in enumerate(models, 1):
+        search_start = time.perf_counter()
+        params, rounds = successive_halving(
+            name, matrix, target, SEARCH_SPACES[name], cv=cv, deadline=deadline, n_jobs=n_jobs,
+        )
+        refit_start = time.perf_counter()
+        model = ESTIMATORS[name]().set_params(**params)
+        model.fit(X, y)
+        metrics = {
+            "best_params": params,
+            "cv_mse": rounds[-1]["cv_mse"][0]["mse"],
+            "search_seconds": round(refit_start - search_start, 3),
+            "refit_seconds": round(time.perf_counter() - refit_start, 3),
+            **summary(name, model, FEATURES),
+        }
+        version = register_model(name, model, metrics=metrics, training_set_sha256=training_set_sha256)
+        save_plots(name, X, y)
+        report["models"][name] = {**metrics, "version": version.sha256, "rounds": rounds}
+        if job:
+            job.report(done / (len(models) + 1), f"Tuned {name}")
+    report["wall_seconds"] = round(time.perf_counter() - start, 3)
+    with open(REPORT, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
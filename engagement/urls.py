@@ -9,12 +9,23 @@ urlpatterns = [
     path('auth-reminder/', views.auth_reminder, name='auth_reminder'),
     path('populate_olap_cube/', views.populate_olap_cube, name='populate_olap_cube'),
     path('check_olap_status/', views.check_olap_status, name='check_olap_status'),
+    path('rollups/<str:level>/', views.engagement_rollups, name='engagement_rollups'),
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('snapshots/', views.list_snapshots, name='list_snapshots'),
+    path('snapshots/<str:sha256>/replay/', views.replay_snapshot, name='replay_snapshot'),
     path("export-engagement/", views.export_engagement_csv, name="export_engagement_csv"),
+    path("export-engagement/download/", views.download_engagement_csv, name="download_engagement_csv"),
     path('clear-session/', views.clear_session, name='clear_session'),
     path("select-features/", views.select_features_and_target, name="select_features"),
     path("train-model/", views.run_model_training, name="train_model"),
     path("predict-form/", views.predict_form_view, name="predict_form"),
     path("train-tree/", views.train_decision_tree, name="train_tree"),
     path("train-linear/", views.train_linear_model_view, name="train_linear_model"),
+    path("train-all/", views.train_all_models_view, name="train_all_models"),
+    path("tune/", views.tune_models_view, name="tune_models"),
+    path("model-cache/", views.model_cache_status, name="model_cache_status"),
+    path("predictions/", views.engagement_predictions, name="engagement_predictions"),
+    path("predictions/score/", views.score_facts_view, name="score_facts"),
+    path("predict/", views.predict_api, name="predict_api"),
     path("plot-linear/", views.run_linear_plot_view, name="plot_linear"),
 ]
\ No newline at end of file
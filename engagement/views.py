@@ -1,12 +1,13 @@
 import re
 import csv
+import io
+import json
 import os
-import pandas as pd
-import requests
-from requests.exceptions import RequestException
+import zlib
+from itertools import islice
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.http import JsonResponse
 from django.contrib.sessions.models import Session
 from django.contrib import messages
@@ -14,7 +15,7 @@ from django.contrib.auth import logout
 from django.shortcuts import render, redirect
 from django.utils.timezone import now
 from datetime import timedelta
-from django.db.models import Avg, F, ExpressionWrapper, DurationField
+from django.db.models import Avg, F, ExpressionWrapper, DurationField, Sum
 from .models import (
     TextbookSection, TextbookPage, TextbookSlide, 
     RevisionQuestion, RevisionQuestionAttempt, RevisionQuestionAttemptDetail, 
@@ -22,24 +23,22 @@ from .models import (
     WritingInteraction, User,
     StudyEngagementFact,  
     ContentDimension, 
+    Job, PayloadSnapshot, EngagementPrediction,
+    read_duration_expression,
 )
-from engagement.train_model import train_model
-from .train_model import train_model
+from .snapshots import replay_snapshots, snapshot_pages
+from .cube import build_olap_cube, refresh_olap_cube, slide_pages
+from .rollups import LEVELS, engagement_rollup
+from .jobs import submit_job
+from .ingest import ingest_pages, ingest_payload
+from .sync import load_watermarks, watermark_params
 from django import forms
-from django import forms
-import joblib
-from .tree_model import train_and_visualise_tree
-from .linear_model import train_linear_model
-from .plot_linear_regression import plot_linear_relationships
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, r2_score
-import joblib
-import matplotlib.pyplot as plt
-import os
+# NumPy, pandas, scikit-learn, matplotlib and requests are imported by the views and jobs
+# that use them, so that starting Django (every manage.py command and worker) doesn't load them
 
 DATA_API_URL = "https://se.eforge.online/textbook/api/user-engagement/"
+STREAM_BATCH_SIZE = 1000
+SLIDE_READ_CAP = 180  # Most seconds a single session counts towards slide time
 
 class PredictionForm(forms.Form):
     page = forms.ModelChoiceField(
@@ -49,6 +48,12 @@ class PredictionForm(forms.Form):
         empty_label="Select a textbook page",
         label="Choose a Page"
     )
+    student = forms.ModelChoiceField(
+        queryset=User.objects.filter(studyengagementfact__isnull=False).distinct(),
+        required=False,
+        empty_label="Logged-in student",
+        label="Choose a Student"
+    )
     model_choice = forms.ChoiceField(
         choices=[
             ("random_forest", "Random Forest"),
@@ -60,58 +65,67 @@ class PredictionForm(forms.Form):
     )
 
 def populate_olap_cube(request):
-    student = User.objects.first()
-    if not student:
-        return JsonResponse({"error": "No user record found."}, status=400)
-    slides = UserSlideRead.objects.all()
-    questions = RevisionQuestionAttempt.objects.all()
-    processed_pages = set()
-    slide_time_per_page = {}
-    slides_opened_per_page = {}
-    for slide_read in slides:
-        page = slide_read.slide.pages.first() if slide_read.slide.pages.exists() else None
-        if not page:
-            continue
-        processed_pages.add(page.id)
-        slide_time = sum([session.read_duration() for session in slide_read.review_sessions.all()])
-        slide_time_per_page[page.id] = slide_time_per_page.get(page.id, 0) + slide_time
-        slides_opened_per_page.setdefault(page.id, set()).add(slide_read.slide.id)
-    for page_id in processed_pages:
-        page = TextbookPage.objects.get(id=page_id)
-        content_dim, _ = ContentDimension.objects.get_or_create(subject="Software Engineering", page=page)
-        if page.sections.exists():
-            content_dim.sections.set(page.sections.all())
-        total_slides = TextbookSlide.objects.filter(pages=page).count()
-        slides_opened = len(slides_opened_per_page.get(page.id, set()))
-        slides_opened_ratio = slides_opened / total_slides if total_slides > 0 else 0
-        total_slide_time = slide_time_per_page.get(page.id, 0)
-        page_questions = questions.filter(question__textbook_page=page)
-        total_questions = page_questions.count()
-        correct = page_questions.filter(details__is_correct=True).count()
-        first_attempt_accuracy = correct / total_questions if total_questions > 0 else 0
-        overall_accuracy = correct / total_questions if total_questions > 0 else 0
-        writing = WritingInteraction.objects.filter(page_id=page.id, grade__isnull=False).order_by('-timestamp').first()
-        if not writing:
-            continue
-        score = writing.grade
-        StudyEngagementFact.objects.update_or_create(
-            student=student,
-            content_dim=content_dim,
-            defaults={
-                "total_slide_time": total_slide_time,
-                "slides_opened_ratio": slides_opened_ratio,
-                "first_attempt_accuracy": first_attempt_accuracy,
-                "overall_accuracy": overall_accuracy,
-                "score": score,
-                "total_slides": total_slides,
-            }
-        )
-    request.session['olap_populated'] = True
-    return JsonResponse({"message": "OLAP cube populated for single-user environment."})
+    if not UserSlideRead.objects.exists():
+        return JsonResponse({"error": "No slide reads found for any student."}, status=400)
+    incremental = request.GET.get("incremental") == "1"
+    job = submit_job(Job.POPULATE_CUBE, populate_cube_job, incremental=incremental)
+    return JsonResponse(
+        {"message": f"OLAP cube population started (job {job.id}).", "job_id": job.id},
+        status=202
+    )
+
+def populate_cube_job(incremental=False, job=None):
+    progress = job.report if job else None
+    if incremental:
+        counts = refresh_olap_cube(progress=progress)
+        return {"message": f"OLAP cube refreshed for {counts['cells']} changed cells.", **counts}
+    counts = build_olap_cube(progress=progress)
+    return {"message": "OLAP cube populated for every student.", **counts}
 
 def check_olap_status(request):
-    olap_status = request.session.get('olap_populated', False)
-    return JsonResponse({"olap_populated": olap_status})
+    olap_status = request.session.get('olap_populated', False) or Job.objects.filter(
+        kind=Job.POPULATE_CUBE, status=Job.SUCCEEDED
+    ).exists()
+    jobs = Job.objects.order_by('-created')
+    if request.GET.get("kind"):
+        jobs = jobs.filter(kind=request.GET["kind"])
+    return JsonResponse({
+        "olap_populated": olap_status,
+        "jobs": [job.as_dict() for job in jobs[:10]],
+    })
+
+def engagement_rollups(request, level):
+    # e.g. rollups/subject/?student=3, then rollups/section/?student=3&subject=..., then rollups/page/?section=...
+    if level not in LEVELS:
+        return JsonResponse({"error": f"Unknown level '{level}', expected one of {', '.join(LEVELS)}."}, status=400)
+    try:
+        filters = fact_filters(request)
+    except ValueError:
+        return JsonResponse({"error": "student and section must be integer ids."}, status=400)
+    rows = engagement_rollup(level, **filters)
+    return JsonResponse({"level": level, "rows": rows})
+
+def fact_filters(request):
+    # ?student=, ?section= and ?subject= narrow rollups, scoring and predictions alike
+    return {
+        "student_id": int(request.GET["student"]) if request.GET.get("student") else None,
+        "section_id": int(request.GET["section"]) if request.GET.get("section") else None,
+        "subject": request.GET.get("subject") or None,
+    }
+
+def job_status(request, job_id):
+    try:
+        job = Job.objects.get(id=job_id)
+    except Job.DoesNotExist:
+        return JsonResponse({"error": f"Job {job_id} not found."}, status=404)
+    return JsonResponse(job.as_dict())
+
+def job_started(request, job, step):
+    # Hand back the job id straight away; progress is polled from job_status
+    if request.headers.get("Accept") == "application/json":
+        return JsonResponse({"job_id": job.id, "status": job.status}, status=202)
+    messages.success(request, f"{step} started in the background (job {job.id}).")
+    return redirect("engagement:homepage")
 
 def calculate_total_questions_attempted(new_questions_for_page):
     total_attempts = new_questions_for_page.count()
@@ -168,23 +182,23 @@ def get_new_questions_for_page(page):
     new_questions = RevisionQuestionAttempt.objects.filter(question__in=page_questions, processed=False)
     return new_questions
 
-def calculate_slide_read_time():    
+def calculate_slide_read_time():
     slide_time_per_page = {}
     slides_opened_per_page = {}
-    slides = UserSlideRead.objects.all()  
-    for slide in slides:
-        page = slide.slide.pages.first() if slide.slide.pages.exists() else None
-        if page is None:
+    slide_page = slide_pages()
+    reads = UserSlideRead.objects.values("slide_id").annotate(
+        read_time=Sum(read_duration_expression("review_sessions__", cap=SLIDE_READ_CAP))
+    ).values_list("slide_id", "read_time")
+    for slide_id, slide_read_time in reads:
+        page_id = slide_page.get(slide_id)
+        if page_id is None:
             continue
-        slide_read_time = sum([
-            min(session.read_duration(), 180) for session in slide.review_sessions.all()
-        ])
-        if page.id not in slide_time_per_page:
-            slide_time_per_page[page.id] = 0 
-        slide_time_per_page[page.id] += slide_read_time  
-        if page.id not in slides_opened_per_page:
-            slides_opened_per_page[page.id] = set()
-        slides_opened_per_page[page.id].add(slide.slide.id)  
+        if page_id not in slide_time_per_page:
+            slide_time_per_page[page_id] = 0
+        slide_time_per_page[page_id] += slide_read_time or 0
+        if page_id not in slides_opened_per_page:
+            slides_opened_per_page[page_id] = set()
+        slides_opened_per_page[page_id].add(slide_id)
     return slide_time_per_page, slides_opened_per_page
 
 def scale_recall_fluency(seconds):
@@ -208,13 +222,22 @@ def scale_slide_time_with_slide_count(total_seconds, num_slides):
     else:
         return round(((seconds_per_slide - min_time) / (max_time - min_time)) * 0.2, 4)
 
-def fetch_data_from_textbook(request, sessionid=None, csrftoken=None):  
+def fetch_data_from_textbook(request, sessionid=None, csrftoken=None, stream=False, incremental=False):  
     if not sessionid:
         sessionid = request.headers.get("X-Session-ID")
     if not csrftoken:
         csrftoken = request.headers.get("X-CSRFToken")
     if not sessionid:
         return render(request, "engagement/auth_reminder.html")
+    from requests.exceptions import RequestException
+    try:
+        return import_textbook_data(sessionid, csrftoken, stream=stream, incremental=incremental)
+    except RequestException as e:
+        print(f"API Down or Connection Error: {str(e)}")
+        return render(request, "engagement/auth_reminder.html")
+
+def import_textbook_data(sessionid, csrftoken, stream=False, incremental=False, progress=None):
+    from .textbook_client import get_textbook_client
     headers = {
         "X-Requested-With": "XMLHttpRequest",
         "X-Session-ID": sessionid,  
@@ -224,163 +247,55 @@ def fetch_data_from_textbook(request, sessionid=None, csrftoken=None):
         "sessionid": sessionid,
         "csrftoken": csrftoken,
     }
-    try:
-        response = requests.get(DATA_API_URL, headers=headers, cookies=cookies, timeout=5)
-        response.raise_for_status()  
-    except RequestException as e:
-        print(f"API Down or Connection Error: {str(e)}")
-        return render(request, "engagement/auth_reminder.html")
-    if response.status_code == 403: 
-        return render(request, "engagement/auth_reminder.html")
-        return None
-    if response.status_code == 200:
-        data = response.json()
-        user_mapping = {}
-        for user_id in {item["user"] for item in data.get('user_slide_reads', [])} | {item["user"] for item in data.get('attempts', [])}:
-            user_obj, created = User.objects.get_or_create(id=user_id, defaults={"username": f"user_{user_id}"})
-            user_mapping[user_id] = user_obj
-            if created:
-                print(f"Created new User: {user_obj.username} (ID: {user_id})")
-        section_mapping = {}
-        for section_data in data.get('sections', []):
-            section_obj, _ = TextbookSection.objects.update_or_create(
-                id=section_data['id'], 
-                defaults={"section_title": section_data['section_title']}
-            )
-            section_mapping[section_data['id']] = section_obj  
-        page_mapping = {}
-        for page_data in data.get('pages', []):
-            page_obj, _ = TextbookPage.objects.update_or_create(
-                id=page_data['id'], 
-                defaults={"page_title": page_data['page_title']}
-            )
-            page_mapping[page_data['id']] = page_obj  
-
-            # Ensure the page is linked to the correct sections
-            if 'sections' in page_data:  # Check if the API provides section links
-                linked_sections = []
-                for section_id in page_data['sections']:  # Iterate through section IDs
-                    if section_id in section_mapping:
-                        linked_sections.append(section_mapping[section_id])
-                    else:
-                        print(f"Warning: Section ID {section_id} not found for Page ID {page_data['id']}")
-
-                if linked_sections:
-                    page_obj.sections.set(linked_sections)  # Properly link sections to page
-
-        slide_mapping = {}
-        for slide_data in data.get('slides', []):
-            slide_obj, _ = TextbookSlide.objects.update_or_create(
-                id=slide_data['id'], 
-                defaults={"slide_title": slide_data['slide_title']}
-            )
-            slide_mapping[slide_data['id']] = slide_obj  
-
-            # Ensure the slide is linked to the correct pages
-            if 'pages' in slide_data:  # Check if pages are included in API data
-                linked_pages = []
-                for page_id in slide_data['pages']:
-                    if page_id in page_mapping:
-                        linked_pages.append(page_mapping[page_id])
-                    else:
-                        print(f"Warning: Page ID {page_id} not found for Slide ID {slide_data['id']}")
-
-                if linked_pages:
-                    slide_obj.pages.set(linked_pages)  # Properly link pages to slide
-
-        user_slide_mapping = {}
-        for user_slide_data in data.get('user_slide_reads', []):
-            slide_id = user_slide_data['slide']
-            user_id = user_slide_data['user']
-            if slide_id not in slide_mapping:
-                print(f"Skipping UserSlideRead {user_slide_data['id']}: Slide {slide_id} not found.")
-                continue  
-            user_obj = User.objects.filter(id=user_id).first()
-            if not user_obj:
-                print(f"Skipping UserSlideRead {user_slide_data['id']}: User {user_id} not found.")
-                continue 
-            slide_read_obj, _ = UserSlideRead.objects.update_or_create(
-                id=user_slide_data['id'], 
-                defaults={
-                    "user": user_obj, 
-                    "slide": slide_mapping[slide_id],  
-                    "slide_status": user_slide_data['slide_status']
-                }
-            )
-            user_slide_mapping[user_slide_data['id']] = slide_read_obj
-        for session_data in data.get('user_slide_sessions', []):
-            if session_data['slide_read'] in user_slide_mapping:
-                UserSlideReadSession.objects.update_or_create(
-                    id=session_data['id'], 
-                    defaults={
-                        "slide_read": user_slide_mapping[session_data['slide_read']],
-                        "expanded": session_data['expanded'],
-                        "collapsed": session_data['collapsed'],
-                        "read": session_data['read']
-                    }
-                )
-            else:
-                print(f"Skipping UserSlideReadSession {session_data['id']}: No matching UserSlideRead found.")
-        question_mapping = {}
-        for question_data in data.get('questions', []):
-            page_id = question_data.get('textbook_page')
-            if page_id in page_mapping:
-                question_obj, _ = RevisionQuestion.objects.update_or_create(
-                    id=question_data['id'], 
-                    defaults={"textbook_page": page_mapping[page_id]}  
-                )
-                question_mapping[question_data['id']] = question_obj
-        attempt_mapping = {}
-        for attempt_data in data.get('attempts', []):
-            user_id = attempt_data.get('user')
-            question_id = attempt_data.get('question')
-            if question_id in question_mapping and User.objects.filter(id=user_id).exists():
-                attempt_obj, _ = RevisionQuestionAttempt.objects.update_or_create(
-                    id=attempt_data['id'], 
-                    defaults={
-                        "user_id": user_id,
-                        "question": question_mapping[question_id],
-                        "viewed": attempt_data['viewed'],
-                        "correct": attempt_data['correct']
-                    }
-                )
-                attempt_mapping[attempt_data['id']] = attempt_obj
-        for detail_data in data.get('attempt_details', []):
-            attempt_id = detail_data.get('attempt')
-            if attempt_id in attempt_mapping:
-                RevisionQuestionAttemptDetail.objects.update_or_create(
-                    id=detail_data['id'], 
-                    defaults={
-                        "attempt": attempt_mapping[attempt_id],
-                        "is_correct": detail_data['is_correct'],
-                        "timestamp": detail_data['timestamp']
-                    }
-                )
-        for interaction_data in data.get('writing_interactions', []):
-            if User.objects.filter(id=interaction_data['user_id']).exists():
-                grade_raw = interaction_data.get('grade')
-                print(f"Raw grade: {interaction_data.get('grade')} (type: {type(interaction_data.get('grade'))})")
-                try:
-                    grade_clean = int(float(grade_raw))  # handles "1", 1.0, "1.0"
-                except (TypeError, ValueError):
-                    grade_clean = None
-                print(f"Clean grade: {grade_clean}")
-                print(f"[Client] Received grade for ID {interaction_data['id']}: {interaction_data.get('grade')}")
-                WritingInteraction.objects.update_or_create(
-                    id=interaction_data['id'],
-                    defaults={
-                        "user_id": interaction_data['user_id'],
-                        "page_id": interaction_data['page_id'],
-                        "user_input": interaction_data['user_input'],
-                        "openai_response": interaction_data['openai_response'],
-                        "grade": grade_clean,
-                        "timestamp": interaction_data['timestamp']
-                    }
-                )
-        return data  
+    # Incremental syncs only ask for (and only apply) rows past the stored high-water marks
+    watermarks = load_watermarks() if incremental else None
+    params = watermark_params(watermarks) if watermarks else None
+    client = get_textbook_client()
+    if stream:
+        # Each page is saved to the snapshot store, then parsed and written batch by batch from disk
+        skipped = []
+        pages = snapshot_pages(client, DATA_API_URL, params, headers, cookies, skipped)
+        stats = ingest_pages(pages, STREAM_BATCH_SIZE, watermarks, progress=progress)
+        if skipped:
+            print(f"Skipped {len(skipped)} snapshot(s) identical to an earlier import.")
+        data = stats  # The payload is never held whole, so hand back the import counts instead
     else:
-        print(f"Error {response.status_code}: {response.text}")
-        return None
+        data = client.fetch_json(DATA_API_URL, params, headers, cookies)
+        stats = ingest_payload(data, watermarks=watermarks, progress=progress)
+    for entity, counts in stats.items():
+        print(f"{entity}: " + ", ".join(f"{count} {outcome}" for outcome, count in counts.items()))
+    print(f"Textbook API (recent requests): {client.summary()}")
+    return data  
+
+def import_job(sessionid, csrftoken, incremental=True, job=None):
+    return import_textbook_data(
+        sessionid, csrftoken, stream=True, incremental=incremental,
+        progress=job.report if job else None
+    )
+
+def list_snapshots(request):
+    snapshots = PayloadSnapshot.objects.order_by('-fetched')[:50]
+    return JsonResponse({"snapshots": [
+        {
+            "sha256": snapshot.sha256,
+            "size": snapshot.size,
+            "compressed_size": snapshot.compressed_size,
+            "fetched": snapshot.fetched.isoformat(),
+            "imported": snapshot.imported.isoformat() if snapshot.imported else None,
+        }
+        for snapshot in snapshots
+    ]})
+
+def replay_snapshot(request, sha256):
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required."}, status=405)
+    if not PayloadSnapshot.objects.filter(sha256=sha256).exists():
+        return JsonResponse({"error": f"Snapshot {sha256} not found."}, status=404)
+    job = submit_job(Job.IMPORT, replay_job, [sha256])
+    return job_started(request, job, "Snapshot replay")
+
+def replay_job(sha256s, job=None):
+    return replay_snapshots(sha256s, STREAM_BATCH_SIZE, progress=job.report if job else None)
 
 def homepage(request):
     return render(request, "engagement/homepage.html")
@@ -391,14 +306,11 @@ def manual_import(request):
     if not sessionid:
         messages.error(request, "No session found. Please log in to the textbook first.")
         return redirect("homepage")
-    data = fetch_data_from_textbook(request, sessionid, csrftoken)
-    if data:
-        messages.success(request, "Data manually imported successfully.")
-        response = redirect("engagement:homepage")
-        response.set_cookie("data_imported", "true")  
-    else:
-        messages.error(request, "Manual import failed.")
-        response = redirect("engagement:homepage")
+    full_sync = request.POST.get("full_sync") == "true"
+    job = submit_job(Job.IMPORT, import_job, sessionid, csrftoken, incremental=not full_sync)
+    response = job_started(request, job, "Data import")
+    # The homepage polls this job and only marks the data imported once it has succeeded
+    response.set_cookie("import_job", str(job.id))
     return response
 
 def auth_reminder(request):
@@ -425,87 +337,95 @@ def clear_session(request):
     return redirect("engagement:auth_reminder")
 
 def export_engagement_csv(request):
-    file_path = os.path.join(settings.BASE_DIR, "student_engagement.csv")
-    row_count = 0
-    with open(file_path, mode="w", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow([
-            "student_id", "page", "total_slide_time", "slides_opened_ratio",
-            "first_attempt_accuracy", "overall_accuracy", "recall_fluency",
-            "total_slides", "score"
-        ])
-
-        for record in StudyEngagementFact.objects.all():
-            writer.writerow([
-                record.student.id,
-                str(record.content_dim.page),
-                record.total_slide_time,
-                record.slides_opened_ratio,
-                record.first_attempt_accuracy,
-                record.overall_accuracy,
-                record.recall_fluency,
-                record.total_slides,
-                record.score,
-            ])
-            row_count += 1
+    from .datasets import export_engagement
+    row_count = export_engagement()
     messages.success(request, "Step 3 complete: Engagement data exported to server.")
     response = redirect("engagement:homepage")
     response.set_cookie("step3_complete", "true", max_age=10)
     response.set_cookie("row_count", str(row_count), max_age=10)
     return response
 
+EXPORT_COLUMNS = [
+    "student_id", "page", "total_slide_time", "slides_opened_ratio",
+    "first_attempt_accuracy", "overall_accuracy", "recall_fluency",
+    "total_slides", "score",
+]
+EXPORT_CHUNK_SIZE = 2000
+PREDICTIONS_LIMIT = 1000
+PREDICT_API_MODELS = {"forest": "forest", "random_forest": "forest", "linear": "linear", "linear_regression": "linear"}
+PREDICT_API_MAX_ROWS = 1000
+
+def engagement_csv_chunks():
+    # One query with the page join done up front, fetched from the cursor in chunks
+    rows = StudyEngagementFact.objects.order_by("id").values_list(
+        "student_id", "content_dim__page__page_title", *EXPORT_COLUMNS[2:],
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    while chunk := list(islice(rows, EXPORT_CHUNK_SIZE)):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip header and trailer
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+    yield compressor.flush()
+
+def download_engagement_csv(request):
+    """Stream every engagement fact as CSV, gzipped on the fly with ``?gzip=1``."""
+    chunks = engagement_csv_chunks()
+    filename = "student_engagement.csv"
+    content_type = "text/csv"
+    if request.GET.get("gzip") == "1":
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        content_type = "application/gzip"
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
 @csrf_exempt 
 def select_features_and_target(request):
     if request.method == "POST":
+        from .datasets import select_training_set
         try:
-            df = pd.read_csv("student_engagement.csv")
-            features = [
-                "total_slide_time", "slides_opened_ratio", "first_attempt_accuracy",
-                "overall_accuracy", "recall_fluency", "total_slides"
-            ]
-            target = "score"
             # Save features and target to disk for use in training step
-            df[features + [target]].to_csv("training_data.csv", index=False)
+            select_training_set()
             return JsonResponse({"message": "Step 2 Complete: Features &Target Selected."})
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
 
 def run_model_training(request):
-    try:
-        importances = train_model()
-        importance_text = ", ".join([f"{k}: {v}" for k, v in importances.items()])
-        messages.success(request, f"Step 5 complete: Model trained. Importances: {importance_text}")
-        response = redirect("engagement:homepage")
-        response.set_cookie("step5_complete", "true", max_age=10)
-        print("Step 5: Model trained.")
-        return response
-    except Exception as e:
-        messages.error(request, f"Error in model training: {str(e)}")
-        return redirect("engagement:homepage")
+    job = submit_job(Job.TRAIN_FOREST, train_forest_job)
+    return job_started(request, job, "Step 5: Model training")
 
-class PredictionForm(forms.Form):
-    page = forms.ModelChoiceField(
-        queryset=ContentDimension.objects.filter(
-            studyengagementfact__isnull=False
-        ).distinct(),
-        empty_label="Select a textbook page",
-        label="Choose a Page"
-    )
+def train_forest_job(job=None):
+    from .train_model import train_model
+    importances = train_model()
+    print("Step 5: Model trained.")
+    return {"importances": importances}
 
 def predict_form_view(request):
+    from .registry import load_serving
     prediction_result = None
     form = PredictionForm(request.POST or None)
     tree_rules_text = None
     if request.method == "POST" and form.is_valid():
         page = form.cleaned_data["page"].page
-        student = User.objects.first()  # replace with actual logged-in student
+        student = form.cleaned_data["student"] or (request.user if request.user.is_authenticated else None)
         content_dim = form.cleaned_data["page"]
         model_choice = form.cleaned_data["model_choice"]
         try:
-            if model_choice == "linear_regression":
-                model = joblib.load("linear_model.joblib")
-            else:
-                model = joblib.load("ml_model.joblib")
+            if student is None:
+                raise ValueError("Choose a student to predict for.")
+            _, model = load_serving("linear" if model_choice == "linear_regression" else "forest")
             engagement = StudyEngagementFact.objects.get(student=student, content_dim=content_dim)
             features = [
                 engagement.total_slide_time,
@@ -549,12 +469,13 @@ def categorise_score(score):
         return "Excellent", "Outstanding! Clear, structured, and insightful writing. Great job!"
 
 def train_decision_tree(request):
-    try:
-        train_and_visualise_tree()
-        messages.success(request, "Step 6 complete: Decision tree trained and visualised.")
-    except Exception as e:
-        messages.error(request, f"Error running tree visualiser: {e}")
-    return redirect("engagement:homepage")
+    job = submit_job(Job.TRAIN_TREE, train_tree_job)
+    return job_started(request, job, "Step 6: Decision tree training")
+
+def train_tree_job(job=None):
+    from .tree_model import train_and_visualise_tree
+    train_and_visualise_tree()
+    return {"message": "Decision tree trained and visualised."}
 
 def interpret_tree_path(slides_opened_ratio, recall_fluency, total_slide_time=None, accuracy=None):
     if slides_opened_ratio <= 0.45:
@@ -588,16 +509,27 @@ def interpret_tree_path(slides_opened_ratio, recall_fluency, total_slide_time=No
         "to achieve your best results."
     )
 
+TREE_RULES_PATH = os.path.join(os.path.dirname(__file__), "static", "images", "tree_rules.txt")
+_tree_rules = {"mtime": None, "text": None}
+
 def read_tree_rules():
-    import os
-    rules_path = os.path.join(os.path.dirname(__file__), "static", "images", "tree_rules.txt")
+    # Read again only when the file changes, i.e. after the tree is retrained
     try:
-        with open(rules_path, "r") as f:
-            return f.read()
+        mtime = os.stat(TREE_RULES_PATH).st_mtime_ns
     except FileNotFoundError:
-        return None 
+        return None
+    if _tree_rules["mtime"] != mtime:
+        with open(TREE_RULES_PATH, "r") as f:
+            _tree_rules["text"] = f.read()
+        _tree_rules["mtime"] = mtime
+    return _tree_rules["text"]
+
+def model_cache_status(request):
+    from .registry import model_cache_stats
+    return JsonResponse({"models": model_cache_stats()})
 
 def run_linear_plot_view(request):
+    from .plot_linear_regression import plot_linear_relationships
     try:
         plot_linear_relationships()
         messages.success(request, "Linear regression plots generated.")
@@ -606,12 +538,150 @@ def run_linear_plot_view(request):
     return redirect("engagement:homepage")
 
 def train_linear_model_view(request):
+    job = submit_job(Job.TRAIN_LINEAR, train_linear_job)
+    return job_started(request, job, "Step 7: Linear regression training")
+
+def train_linear_job(job=None):
+    from .linear_model import train_linear_model
+    return {"coefficients": train_linear_model()}
+
+def train_all_models_view(request):
+    job = submit_job(Job.TRAIN_ALL, train_all_job)
+    return job_started(request, job, "Training all models")
+
+def train_all_job(job=None):
+    from .training import train_all_models
+    return train_all_models(job=job)
+
+def tune_models_view(request):
+    budget = request.GET.get("budget")
     try:
-        coefs = train_linear_model()
-        messages.success(request, "Linear Regression trained. Coefficients: " + ", ".join([f"{k}: {v}" for k, v in coefs.items()]))
-        response = redirect("engagement:homepage")
-        response.set_cookie("step6_linear_complete", "true", max_age=10)
-        return response
-    except Exception as e:
-        messages.error(request, f"Error training linear regression model: {str(e)}")
-        return redirect("engagement:homepage")
\ No newline at end of file
+        time_budget = float(budget) if budget else None
+    except ValueError:
+        return JsonResponse({"error": f"Invalid budget: {budget}"}, status=400)
+    job = submit_job(Job.TUNE, tune_job, time_budget=time_budget)
+    return job_started(request, job, "Hyperparameter tuning")
+
+def tune_job(time_budget=None, job=None):
+    from .tuning import tune_models
+    return tune_models(time_budget=time_budget, job=job)
+
+def score_facts_view(request):
+    try:
+        filters = fact_filters(request)
+    except ValueError:
+        return JsonResponse({"error": "student and section must be integer ids."}, status=400)
+    model_name = "linear" if request.GET.get("model") == "linear_regression" else "forest"
+    job = submit_job(Job.SCORE, score_job, model_name, **filters)
+    return job_started(request, job, "Batch scoring")
+
+def score_job(model_name, job=None, **filters):
+    from .scoring import score_facts
+    return score_facts(model_name, job=job, **filters)
+
+def engagement_predictions(request):
+    from .scoring import filter_facts
+    try:
+        filters = fact_filters(request)
+        limit = int(request.GET.get("limit", PREDICTIONS_LIMIT))
+    except ValueError:
+        return JsonResponse({"error": "student, section and limit must be integers."}, status=400)
+    if limit < 1:
+        return JsonResponse({"error": "limit must be positive."}, status=400)
+    limit = min(limit, PREDICTIONS_LIMIT)
+    facts = filter_facts(StudyEngagementFact.objects.all(), **filters)
+    rows = EngagementPrediction.objects.filter(fact__in=facts).order_by("fact_id").values(
+        "fact__student_id", "fact__content_dim__page_id", "score", "label", "model_version__sha256", "predicted",
+    )[:limit]
+    return JsonResponse({"predictions": [
+        {
+            "student_id": row["fact__student_id"], "page_id": row["fact__content_dim__page_id"],
+            "score": row["score"], "label": row["label"], "model_version": row["model_version__sha256"],
+            "predicted": row["predicted"].isoformat(),
+        }
+        for row in rows
+    ]})
+
+def prediction_rows(body):
+    """The feature matrix for a predict_api body, in the order its instances and then its keys were given."""
+    import numpy as np
+    from .datasets import FEATURES
+    instances = body.get("instances", [])
+    keys = body.get("keys", [])
+    if not isinstance(instances, list) or not isinstance(keys, list):
+        raise ValueError("instances and keys must be lists.")
+    if not instances and not keys:
+        raise ValueError("Give instances (feature vectors) or keys (student and page ids) to predict.")
+    if len(instances) + len(keys) > PREDICT_API_MAX_ROWS:
+        raise ValueError(f"At most {PREDICT_API_MAX_ROWS} predictions per request.")
+    rows = []
+    for instance in instances:
+        if isinstance(instance, dict):
+            instance = [instance.get(feature) for feature in FEATURES]
+        if not isinstance(instance, list) or len(instance) != len(FEATURES):
+            raise ValueError(f"Each instance needs the {len(FEATURES)} features {', '.join(FEATURES)}.")
+        rows.append(instance)
+    try:
+        pairs = [(int(key["student"]), int(key["page"])) for key in keys]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Each key needs integer student and page ids.")
+    if pairs:
+        students, pages = zip(*pairs)
+        facts = StudyEngagementFact.objects.filter(student_id__in=students, content_dim__page_id__in=pages)
+        found = {
+            (row[0], row[1]): row[2:]
+            for row in facts.values_list("student_id", "content_dim__page_id", *FEATURES)
+        }
+        missing = [pair for pair in pairs if pair not in found]
+        if missing:
+            raise StudyEngagementFact.DoesNotExist(", ".join(f"student {student} page {page}" for student, page in missing))
+        rows.extend(found[pair] for pair in pairs)
+    try:
+        X = np.array(rows, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("Features must be numbers.")
+    if not np.isfinite(X).all():
+        raise ValueError("Features must be finite numbers.")
+    return X
+
+@csrf_exempt
+def predict_api(request):
+    """Score, label and hint for each feature vector or (student, page) key in a JSON body.
+
+    Concurrent requests are predicted together by the batcher, one
+    vectorized call per model version.
+    """
+    import numpy as np
+    from .batching import batcher
+    from .datasets import FEATURES
+    from .registry import load_serving
+    from .scoring import score_labels
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required."}, status=405)
+    try:
+        body = json.loads(request.body)
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object.")
+        model_name = PREDICT_API_MODELS.get(body.get("model", "forest"))
+        if model_name is None:
+            raise ValueError(f"Unknown model, expected one of {', '.join(PREDICT_API_MODELS)}.")
+        X = prediction_rows(body)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except StudyEngagementFact.DoesNotExist as e:
+        return JsonResponse({"error": f"No engagement for {e}."}, status=404)
+    try:
+        version, model = load_serving(model_name)
+        scores = np.round(batcher.predict(version.sha256, model, X), 2)
+    except ValueError as e:
+        return JsonResponse({"error": f"Can't predict these features: {e}"}, status=400)
+    except FileNotFoundError as e:
+        return JsonResponse({"error": str(e)}, status=503)
+    except TimeoutError:
+        return JsonResponse({"error": "Prediction timed out, try again."}, status=503)
+    ratios = X[:, FEATURES.index("slides_opened_ratio")].tolist()
+    fluencies = X[:, FEATURES.index("recall_fluency")].tolist()
+    return JsonResponse({"model": model_name, "version": version.sha256, "predictions": [
+        {"score": score, "label": label, "hint": interpret_tree_path(ratio, fluency)}
+        for score, label, ratio, fluency in zip(scores.tolist(), score_labels(scores), ratios, fluencies)
+    ]})
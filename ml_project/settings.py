@@ -121,3 +121,15 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Store WritingInteraction essay and response text zlib-compressed when that is smaller
+WRITING_TEXT_COMPRESSION = True
+
+# Memory-map the arrays of cached models ("r") so forked workers share them; None loads them into memory
+MODEL_MMAP_MODE = None
+
+# Seconds the prediction API waits for concurrent requests to predict together; 0 predicts each on its own
+PREDICT_BATCH_WINDOW = 0.003
+
+# Seconds a prediction API request waits for its batch before answering 503
+PREDICT_TIMEOUT = 10